@@ -1,28 +1,106 @@
+import click
 from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+import compression
+import idempotency
+import instrumentation
+import metrics
+import order_summary
+import profiling
+import serializers
+import warmup
 from config import Config
+from db_pool import configure_database, init_pool_metrics
 from models import db
+from routes.admin_routes import admin_bp
 from routes.auth_routes import auth_bp
+from routes.metrics_routes import metrics_bp
 from routes.order_routes import order_bp
 from routes.product_routes import product_bp
+from s3_outbox import s3_deletion_worker
 
 load_dotenv()  # This will load variables from the .env file
-app = Flask(__name__)
-CORS(app)
 
-# Configure Database
-app.config["SQLALCHEMY_DATABASE_URI"] = Config().SQLALCHEMY_DATABASE_URI
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = Config().SQLALCHEMY_TRACK_MODIFICATIONS
-db.init_app(app)
 
-# Register Blueprints
-app.register_blueprint(auth_bp, url_prefix="/auth")
-app.register_blueprint(product_bp, url_prefix="/products")
-app.register_blueprint(order_bp, url_prefix="/orders")
+def create_app():
+    """Build the application. Background threads are started separately by start_worker."""
+    app = Flask(__name__)
+    CORS(app)
 
-if __name__ == "__main__":
+    # Take the client address from X-Forwarded-For when running behind trusted proxies
+    if Config().TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config().TRUSTED_PROXIES)
+
+    # Record per-route request metrics
+    instrumentation.init_app(app)
+
+    # Profile requests flagged by admins
+    profiling.init_app(app)
+
+    # Encode JSON with orjson when it is installed
+    serializers.init_app(app)
+
+    # Compress responses according to Accept-Encoding
+    compression.init_app(app)
+
+    # Configure Database
+    configure_database(app)
+    db.init_app(app)
+    init_pool_metrics(app, db)
+
+    # Process queued S3 deletions in the background
+    s3_deletion_worker.init_app(app)
+
+    # Register the order summary backfill command
+    order_summary.init_app(app)
+
+    # Register the idempotency key purge command
+    idempotency.init_app(app)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create the database tables that do not exist yet."""
+        db.create_all()
+        click.echo("Created database tables")
+
+    # Register Blueprints
+    app.register_blueprint(auth_bp, url_prefix="/auth")
+    app.register_blueprint(product_bp, url_prefix="/products")
+    app.register_blueprint(order_bp, url_prefix="/orders")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
+    app.register_blueprint(metrics_bp)
+    return app
+
+
+def start_worker(app):
+    """
+    Per-process setup, run in each worker after forking: drop the database connections and metric counts
+    inherited from the parent, warm this process's pools and clients, and start the background threads.
+    """
+    metrics.REGISTRY.reset_counts()
     with app.app_context():
-        db.create_all()  # Create tables if not using migrations
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    warmup.warm_worker(app)
+    start_background_jobs(app)
+
+
+def start_background_jobs(app):
+    # Process queued S3 deletions in the background
+    s3_deletion_worker.start()
+
+    # Purge expired idempotency keys
+    idempotency.start_cleanup(app)
+
+    # Share this process's metrics with the other workers
+    metrics.start_snapshots()
+
+
+if __name__ == "__main__":
+    # Development server; see wsgi.py and gunicorn.conf.py for production
+    app = create_app()
+    start_worker(app)
     app.run(debug=True)
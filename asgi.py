@@ -0,0 +1,80 @@
+import time
+
+from dotenv import load_dotenv
+from quart import Quart, Response, g, request
+
+import async_clients
+import serializers
+from app import create_app, start_background_jobs
+from async_db import async_db
+from async_middleware import admin_required, cognito_required
+from instrumentation import REQUEST_LATENCY, REQUESTS
+from metrics import render_metrics
+from routes.async_auth_routes import async_auth_bp
+from routes.async_order_routes import async_order_bp
+from routes.async_product_routes import async_product_bp
+from warmup import warm_shared
+
+try:
+    from quart_cors import cors
+except ImportError:  # CORS headers are optional behind a proxy that sets them
+    cors = None
+
+load_dotenv()  # This will load variables from the .env file
+
+# The sync app runs the background jobs (S3 deletions, idempotency key cleanup)
+sync_app = create_app()
+
+# Async variants of the auth, product and order routes; run with `hypercorn asgi:app`
+app = Quart(__name__)
+if cors is not None:
+    app = cors(app, allow_origin="*")
+
+# Encode JSON with orjson when it is installed
+serializers.init_app(app)
+
+# Configure the async database engines
+async_db.init_app(app)
+
+
+@app.before_serving
+async def startup():
+    await async_clients.startup()
+    warm_shared(sync_app)
+    start_background_jobs(sync_app)
+
+
+@app.after_serving
+async def shutdown():
+    await async_clients.shutdown()
+    await async_db.dispose()
+
+
+# Record per-route request metrics
+@app.before_request
+async def start_request():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def finish_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        blueprint = request.blueprint or ""
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - started, blueprint=blueprint, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(blueprint=blueprint, endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+@cognito_required
+@admin_required
+async def get_metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+# Register Blueprints
+app.register_blueprint(async_auth_bp, url_prefix="/auth")
+app.register_blueprint(async_product_bp, url_prefix="/products")
+app.register_blueprint(async_order_bp, url_prefix="/orders")
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+
+import httpx
+from aiobotocore.session import get_session
+
+from aws_clients import client_config, instrument_client
+from config import Config
+from instrumentation import record_outbound_call
+
+_exit_stack = None
+_lock = asyncio.Lock()
+_session = None
+_clients = {}
+_http_client = None
+
+
+async def startup():
+    """Open the shared HTTP client. Call once the event loop is running."""
+    global _exit_stack, _session, _http_client
+    _exit_stack = AsyncExitStack()
+    _session = get_session()
+    _http_client = await _exit_stack.enter_async_context(
+        httpx.AsyncClient(
+            timeout=Config().JWKS_FETCH_TIMEOUT,
+            limits=httpx.Limits(max_connections=Config().AWS_MAX_POOL_CONNECTIONS),
+        )
+    )
+
+
+async def shutdown():
+    """Close every client and its connection pool"""
+    global _exit_stack, _http_client
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+    _exit_stack = None
+    _http_client = None
+    _clients.clear()
+
+
+def http_client():
+    return _http_client
+
+
+async def get_client(service, region_name=None, aws_access_key_id=None, aws_secret_access_key=None):
+    """Return a shared aiobotocore client for a service, creating it on first use"""
+    key = (service, region_name, aws_access_key_id)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    async with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # Empty strings mean "not configured", so fall back to the default credential chain
+            client = await _exit_stack.enter_async_context(
+                _session.create_client(
+                    service,
+                    region_name=region_name or None,
+                    aws_access_key_id=aws_access_key_id or None,
+                    aws_secret_access_key=aws_secret_access_key or None,
+                    config=client_config(),
+                )
+            )
+            instrument_client(client)
+            _clients[key] = client
+        return client
+
+
+async def get_s3_client():
+    return await get_client(
+        "s3",
+        region_name=Config().S3_REGION_NAME,
+        aws_access_key_id=Config().AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=Config().AWS_SECRET_ACCESS_KEY,
+    )
+
+
+async def fetch_jwks(url):
+    """Fetch a JSON Web Key Set (JWKS) without blocking the event loop"""
+    started = time.perf_counter()
+    try:
+        response = await _http_client.get(url)
+    finally:
+        record_outbound_call("http:jwks", time.perf_counter() - started)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,60 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from config import Config
+from db_pool import POOL_IN_USE, POOL_SIZE, engine_options
+
+# Async drivers used in place of each backend's sync driver
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_uri(uri):
+    """Rewrite a database URI to use the backend's async driver"""
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def async_engine_options(uri):
+    # Async engines need the asyncio-aware pool, so keep the pool settings but not the pool class
+    options = engine_options(uri)
+    options.pop("poolclass", None)
+    return options
+
+
+class AsyncDatabase:
+    """Async engines for the primary database and the optional read replica."""
+
+    def __init__(self):
+        self.engines = {}
+        self._sessionmakers = {}
+
+    def init_app(self, app=None):
+        binds = {"primary": Config().SQLALCHEMY_DATABASE_URI, "replica": Config().SQLALCHEMY_REPLICA_DATABASE_URI}
+        for name, uri in binds.items():
+            if not uri:
+                continue
+            engine = create_async_engine(async_uri(uri), **async_engine_options(uri))
+            self.engines[name] = engine
+            # ORM objects stay usable after commit, as responses are built from them
+            self._sessionmakers[name] = async_sessionmaker(engine, expire_on_commit=False)
+
+            pool = engine.sync_engine.pool
+            label = f"async_{name}"
+            POOL_IN_USE.set_function(lambda pool=pool: pool.checkedout(), engine=label)
+            POOL_SIZE.set_function(lambda pool=pool: pool.checkedin() + pool.checkedout(), engine=label)
+
+    def session(self, replica=False):
+        """Return a new AsyncSession, on the read replica if requested and configured"""
+        if replica and "replica" in self._sessionmakers:
+            return self._sessionmakers["replica"]()
+        return self._sessionmakers["primary"]()
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+async_db = AsyncDatabase()
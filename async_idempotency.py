@@ -0,0 +1,131 @@
+import asyncio
+import time
+from datetime import datetime
+from functools import wraps
+
+from quart import jsonify, make_response, request
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from async_db import async_db
+from config import Config
+from idempotency import (
+    IDEMPOTENCY_HEADER, IDEMPOTENT_REQUESTS, IN_FLIGHT_ERROR, INVALID_KEY_ERROR, MISMATCH_ERROR, POLL_INTERVAL,
+    hash_request, is_abandoned, is_retryable, is_valid_key, key_query, new_key, new_lease, release_statement,
+    store_statement, take_over_statement,
+)
+from models import IdempotencyKey
+
+
+def idempotent(func):
+    """
+    Async variant of idempotency.idempotent, storing keys through the async database sessions.
+    Duplicates poll the database while the original request is in flight.
+    """
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return await func(*args, **kwargs)
+        if not is_valid_key(key):
+            return jsonify({"error": INVALID_KEY_ERROR}), 400
+
+        user_sub = request.user
+        request_hash = hash_request(request.method, request.path, await request.get_data())
+
+        record, claimed = await claim_key(user_sub, key, request_hash)
+        if not claimed:
+            return await replay(record, user_sub, key, request_hash)
+
+        record_id, locked_until = record.id, record.locked_until
+        try:
+            response = await make_response(await func(*args, **kwargs))
+        except BaseException:
+            # Also release the key when the request is cancelled, e.g. by the client disconnecting
+            await execute(release_statement(record_id, locked_until))
+            raise
+        if is_retryable(response.status_code):
+            await execute(release_statement(record_id, locked_until))
+        else:
+            body = await response.get_data(as_text=True)
+            await execute(store_statement(record_id, locked_until, response.status_code, body))
+        record_outcome("executed")
+        return response
+
+    return wrapper
+
+
+async def claim_key(user_sub, key, request_hash):
+    """Async variant of idempotency.claim_key"""
+    now, locked_until = new_lease()
+    async with async_db.session() as session:
+        existing = (await session.execute(key_query(user_sub, key))).scalar_one_or_none()
+        if existing is not None and existing.expires_at <= now:
+            # An expired key starts over
+            await session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == existing.id))
+            await session.commit()
+            existing = None
+        if existing is not None:
+            if not (is_abandoned(existing, now) and existing.request_hash == request_hash):
+                return existing, False
+            taken = (await session.execute(take_over_statement(existing, locked_until))).rowcount
+            await session.commit()
+            if taken:
+                record_outcome("taken_over")
+            return await load_key(user_sub, key), bool(taken)
+
+        record = new_key(user_sub, key, request_hash, now, locked_until)
+        session.add(record)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another request claimed the key first
+            await session.rollback()
+            return await load_key(user_sub, key), False
+        return record, True
+
+
+async def load_key(user_sub, key):
+    # A new session per read, so a repeated read sees other requests' commits
+    async with async_db.session() as session:
+        return (await session.execute(key_query(user_sub, key))).scalar_one_or_none()
+
+
+async def execute(statement):
+    async with async_db.session() as session:
+        await session.execute(statement)
+        await session.commit()
+
+
+async def replay(record, user_sub, key, request_hash):
+    """Async variant of idempotency.replay"""
+    if record is not None and record.request_hash != request_hash:
+        record_outcome("mismatch")
+        return jsonify({"error": MISMATCH_ERROR}), 422
+
+    deadline = time.monotonic() + Config().IDEMPOTENCY_WAIT_TIMEOUT
+    while record is not None and record.response_status is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or is_abandoned(record, datetime.utcnow()):
+            # An abandoned key is taken over by the retry
+            break
+        await asyncio.sleep(min(POLL_INTERVAL, remaining))
+        record = await load_key(user_sub, key)
+
+    if record is None or record.response_status is None:
+        # The original request released the key, or is still running
+        record_outcome("conflict")
+        response = jsonify({"error": IN_FLIGHT_ERROR})
+        response.headers["Retry-After"] = "1"
+        return response, 409
+
+    record_outcome("replayed")
+    response = await make_response(record.response_body, record.response_status)
+    response.mimetype = "application/json"
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def record_outcome(outcome):
+    IDEMPOTENT_REQUESTS.inc(endpoint=request.endpoint or "unmatched", outcome=outcome)
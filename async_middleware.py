@@ -0,0 +1,112 @@
+import asyncio
+from functools import wraps
+
+import jwt
+from jwt import InvalidTokenError
+from quart import jsonify, request
+
+from async_clients import fetch_jwks
+from jwks_cache import jwks_key_store
+from middleware import bearer_token, validate_token
+from rate_limit import TOO_MANY_REQUESTS, check, retry_after_header
+from token_cache import token_cache
+
+_fetch_lock = asyncio.Lock()
+
+
+def cognito_required(func):
+    """Async variant of middleware.cognito_required for the ASGI routes"""
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        authorization = request.headers.get("Authorization")
+        if not authorization:
+            return jsonify({"error": "Authorization token is missing"}), 401
+
+        try:
+            token = bearer_token(authorization)
+
+            # Reuse the claims of an already verified token, otherwise verify it
+            decoded_access_token = token_cache.get(token)
+            if decoded_access_token is None:
+                # Fetch the signing key without blocking, so verifying it below does no I/O
+                await prefetch_signing_key(token)
+                decoded_access_token = validate_token(token)
+                if decoded_access_token:
+                    token_cache.put(token, decoded_access_token)
+
+            request.user = decoded_access_token["sub"]
+            request.user_groups = decoded_access_token.get("cognito:groups", [])
+        except Exception as e:
+            return jsonify({"error": str(e)}), 401
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+async def prefetch_signing_key(token):
+    """Load the JWKS into jwks_key_store if the token's key ID is unknown and a refetch is allowed"""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except InvalidTokenError:
+        return  # validate_token reports the malformed token
+    if jwks_key_store.cached_key(kid) is not None:
+        return
+
+    _, fetch = jwks_key_store.lookup(kid)
+    if not fetch:
+        return
+    async with _fetch_lock:
+        # Another request may have loaded the keys while this one waited
+        if jwks_key_store.cached_key(kid) is not None:
+            return
+        try:
+            jwks_key_store.load(await fetch_jwks(jwks_key_store.url))
+        except Exception as e:
+            jwks_key_store.record_failure(e)
+            if not jwks_key_store.has_keys():
+                raise
+
+
+def rate_limit(name, limit, window, key):
+    """Async variant of rate_limit.rate_limit, where key is a coroutine function"""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            retry_after = check(name, limit, window, await key())
+            if retry_after:
+                response = jsonify({"error": TOO_MANY_REQUESTS})
+                response.headers["Retry-After"] = retry_after_header(retry_after)
+                return response, 429
+            return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def client_ip():
+    return request.remote_addr
+
+
+async def current_user():
+    # Set by cognito_required
+    return getattr(request, "user", None)
+
+
+async def login_username():
+    data = await request.get_json(silent=True)
+    username = data.get("username") if isinstance(data, dict) else None
+    return username.lower() if isinstance(username, str) and username else None
+
+
+def admin_required(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        user_groups = getattr(request, "user_groups", [])
+        if "admin" not in user_groups:
+            return jsonify({"error": "Admin privileges required"}), 403
+        return await func(*args, **kwargs)
+
+    return wrapper
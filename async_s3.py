@@ -0,0 +1,122 @@
+import asyncio
+import os
+import tempfile
+import uuid
+
+from werkzeug.utils import secure_filename
+
+from async_clients import get_s3_client
+from async_db import async_db
+from config import Config
+from models import S3DeletionOutbox
+from s3_outbox import image_object_keys, s3_deletion_worker
+from s3_utils import IMAGE_VARIANTS, InvalidImageError, get_image_executor, resize_image, s3_url, variant_key, verify_image
+
+# Background uploads, referenced so they are not garbage collected while running
+_tasks = set()
+_upload_slots = None
+
+
+class AsyncImageUpload:
+    """A product image upload running as a background task on the event loop"""
+
+    def __init__(self, key, url, task):
+        self.key = key
+        self.url = url
+        self.task = task
+
+    def discard(self):
+        """Remove the uploaded objects once the upload has finished (or right away if it already has)"""
+        self.task.add_done_callback(lambda _: spawn(enqueue_discarded_upload(self.key)))
+
+
+async def upload_image_to_s3(file, bucket_name=Config().S3_BUCKET_NAME):
+    """
+    Async variant of s3_utils.upload_image_to_s3.
+    Starts uploading a product image and its resized variants, and returns an AsyncImageUpload.
+    """
+    original_filename = secure_filename(file.filename)
+    unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
+
+    # The request's file is closed when the request ends, so spool it to disk
+    fd, path = tempfile.mkstemp(prefix="upload-")
+    os.close(fd)
+    await file.save(path)
+
+    # Reject files the resizer cannot read before any product points at them
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, verify_image, path)
+    except InvalidImageError:
+        os.remove(path)
+        raise
+
+    if not Config().S3_ASYNC_UPLOADS:
+        await process_image_upload(path, unique_filename, file.content_type, bucket_name)
+        task = asyncio.get_running_loop().create_future()
+        task.set_result(None)
+        return AsyncImageUpload(unique_filename, s3_url(unique_filename, bucket_name), task)
+
+    # Wait for a free slot so queued uploads (and their temp files) stay bounded
+    slots = upload_slots()
+    await slots.acquire()
+    task = spawn(process_image_upload(path, unique_filename, file.content_type, bucket_name))
+    task.add_done_callback(lambda _: slots.release())
+    task.add_done_callback(log_upload_failure)
+    return AsyncImageUpload(unique_filename, s3_url(unique_filename, bucket_name), task)
+
+
+async def process_image_upload(path, key, content_type, bucket_name):
+    """Upload the original image, then generate and upload its variants"""
+    variant_paths = {}
+    try:
+        await put_file(path, bucket_name, key, content_type)
+
+        # Resizing is CPU bound, so it runs in the shared worker processes
+        loop = asyncio.get_running_loop()
+        variant_paths = await loop.run_in_executor(get_image_executor(), resize_image, path, IMAGE_VARIANTS)
+        await asyncio.gather(*(
+            put_file(variant_path, bucket_name, variant_key(key, variant), "image/jpeg")
+            for variant, variant_path in variant_paths.items()
+        ))
+    finally:
+        for temp_path in [path, *variant_paths.values()]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+async def put_file(path, bucket_name, key, content_type):
+    s3 = await get_s3_client()
+    with open(path, "rb") as body:
+        await s3.put_object(Bucket=bucket_name, Key=key, Body=body, ContentType=content_type)
+
+
+async def enqueue_discarded_upload(file_key):
+    """Async variant of s3_outbox.enqueue_discarded_upload"""
+    try:
+        async with async_db.session() as session:
+            session.add_all(S3DeletionOutbox(object_key=key) for key in image_object_keys(file_key))
+            await session.commit()
+    except Exception as e:
+        print(f"Failed to queue the discarded image {file_key} for deletion: {e}")
+        return
+    s3_deletion_worker.notify()
+
+
+def upload_slots():
+    # Created on first use, inside the running event loop
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.BoundedSemaphore(Config().S3_UPLOAD_QUEUE_SIZE)
+    return _upload_slots
+
+
+def spawn(coroutine):
+    task = asyncio.ensure_future(coroutine)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def log_upload_failure(task):
+    if not task.cancelled() and task.exception():
+        print(f"Failed to upload image: {task.exception()}")
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+
+from config import Config
+from instrumentation import record_outbound_call
+from metrics import Counter, Histogram
+
+AWS_CALL_LATENCY = Histogram("aws_call_duration_seconds", "Latency of AWS API calls", ["service", "operation"])
+AWS_CALL_RETRIES = Counter("aws_call_retries_total", "Retries made by AWS API calls", ["service", "operation"])
+AWS_CALL_ERRORS = Counter("aws_call_errors_total", "AWS API calls that failed", ["service", "operation"])
+
+_lock = threading.Lock()
+_pid = None
+_session = None
+_clients = {}
+
+
+def get_client(service, region_name=None, aws_access_key_id=None, aws_secret_access_key=None):
+    """
+    Return a shared boto3 client for a service, creating it on first use.
+    Clients are rebuilt after a fork, since their connection pools cannot be shared between processes.
+    """
+    global _pid, _session
+
+    key = (service, region_name, aws_access_key_id)
+    if _pid == os.getpid():
+        client = _clients.get(key)
+        if client is not None:
+            return client
+
+    with _lock:
+        if _pid != os.getpid():
+            # boto3 takes a while to import, so it is only loaded once a client is needed
+            import boto3
+
+            _pid = os.getpid()
+            _session = boto3.session.Session()
+            _clients.clear()
+
+        client = _clients.get(key)
+        if client is None:
+            # Empty strings mean "not configured", so fall back to the default credential chain
+            client = _session.client(
+                service,
+                region_name=region_name or None,
+                aws_access_key_id=aws_access_key_id or None,
+                aws_secret_access_key=aws_secret_access_key or None,
+                config=client_config(),
+            )
+            instrument_client(client)
+            _clients[key] = client
+        return client
+
+
+def instrument_client(client):
+    """Record the latency, retries and errors of every call made by a client"""
+    client.meta.events.register("before-call", _start_call)
+    client.meta.events.register("after-call", _finish_call)
+    client.meta.events.register("after-call-error", _fail_call)
+
+
+def client_config():
+    from botocore.config import Config as BotocoreConfig
+
+    return BotocoreConfig(
+        max_pool_connections=Config().AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=Config().AWS_CONNECT_TIMEOUT,
+        read_timeout=Config().AWS_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={"mode": Config().AWS_RETRY_MODE, "total_max_attempts": Config().AWS_MAX_ATTEMPTS},
+    )
+
+
+def _start_call(model, context, **kwargs):
+    context["call_metrics"] = (model.service_model.service_name, model.name, time.perf_counter())
+
+
+def _finish_call(http_response, parsed, context, **kwargs):
+    service, operation = _record_call(context)
+    retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    if retries:
+        AWS_CALL_RETRIES.inc(retries, service=service, operation=operation)
+    if http_response.status_code >= 300:
+        AWS_CALL_ERRORS.inc(service=service, operation=operation)
+
+
+def _fail_call(context, **kwargs):
+    service, operation = _record_call(context)
+    AWS_CALL_ERRORS.inc(service=service, operation=operation)
+
+
+def _record_call(context):
+    service, operation, started = context["call_metrics"]
+    seconds = time.perf_counter() - started
+    AWS_CALL_LATENCY.observe(seconds, service=service, operation=operation)
+    record_outbound_call(f"aws:{service}", seconds)
+    return service, operation
@@ -0,0 +1,134 @@
+"""
+Load test of POST /auth/login against a Cognito stand-in that answers after a fixed delay, served by gunicorn
+(sync workers with threads) and by hypercorn (asgi.py). Needs requirements-async.txt.
+    python benchmarks/bench_async_login.py [workers] [cognito delay in seconds]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import aiohttp
+
+from common import ROOT, create_app, free_port, percentile
+
+CONCURRENCY = (10, 100, 500)
+
+
+class SlowCognito(ThreadingHTTPServer):
+    """Answers every InitiateAuth call with tokens after delay seconds"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, delay):
+        self.delay = delay
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(delay)
+                body = json.dumps({"AuthenticationResult": {"AccessToken": "a", "IdToken": "i", "ExpiresIn": 3600}})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-amz-json-1.1")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        Thread(target=self.serve_forever, daemon=True).start()
+
+
+def start_server(command, port, env):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{command[2]} did not start")
+
+
+def stop_server(process):
+    process.terminate()
+    process.wait(timeout=30)
+
+
+async def load(url, requests, concurrency):
+    """Send requests logins, concurrency at a time; returns (requests per second, sorted latencies, errors)"""
+    samples = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    # aiohttp rather than httpx: with hundreds of connections httpx itself becomes the bottleneck
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async def login():
+            nonlocal errors
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{url}/auth/login", json={"username": "user", "password": "secret"}) as response:
+                        await response.read()
+                        errors += response.status != 200
+                except aiohttp.ClientError:  # Connections dropped by an overloaded server
+                    errors += 1
+                samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    return requests / elapsed, sorted(samples), errors
+
+
+def main(workers=2, delay=0.2):
+    workers = int(workers)
+    create_app()
+    cognito = SlowCognito(float(delay))
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "COGNITO_CLIENT_ID": "client",
+        "COGNITO_CLIENT_SECRET": "secret",
+        "AWS_ENDPOINT_URL": f"http://127.0.0.1:{cognito.server_port}",
+        "AWS_MAX_POOL_CONNECTIONS": str(max(CONCURRENCY)),
+        "IDEMPOTENCY_CLEANUP_INTERVAL": "0",
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+    }
+    servers = [
+        (f"gunicorn, {workers} workers x {env.get('GUNICORN_THREADS', 8)} threads",
+         [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"]),
+        (f"hypercorn asgi:app, {workers} workers",
+         [sys.executable, "-m", "hypercorn", "asgi:app", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]),
+    ]
+
+    print(f"POST /auth/login, Cognito answering after {float(delay) * 1000:.0f} ms")
+    for label, command in servers:
+        process = start_server(command, port, env)
+        try:
+            asyncio.run(load(url, 20, 10))  # Warm up the workers' clients
+            for concurrency in CONCURRENCY:
+                throughput, samples, errors = asyncio.run(load(url, concurrency * 4, concurrency))
+                print(f"  {label:<36} concurrency {concurrency:>3}: {throughput:7.1f} req/s   "
+                      f"p50 {percentile(samples, 0.5) * 1000:6.0f} ms   p99 {percentile(samples, 0.99) * 1000:6.0f} ms"
+                      f"   {errors} errors")
+        finally:
+            stop_server(process)
+    cognito.shutdown()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
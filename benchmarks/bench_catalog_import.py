@@ -0,0 +1,82 @@
+"""
+Catalog import and export throughput in rows per second: the batched import (one insert and one update per
+batch) at several batch sizes against committing one ORM insert per row, plus the streamed CSV export.
+    python benchmarks/bench_catalog_import.py [rows]
+"""
+import io
+import sys
+import time
+
+from common import StubJWKSServer, create_app
+
+# The per-row baseline is slow enough that a sample of the rows gives its rate
+PER_ROW_SAMPLE = 2000
+
+
+def catalog_csv(rows):
+    return ("name,description,price,stock,image_key\n" + "".join(
+        f"Product {i},Description of product {i},{i % 1000}.99,{i % 50},image{i}.png\n" for i in range(rows)
+    )).encode()
+
+
+def per_row_import(rows):
+    """Insert each parsed row with its own ORM insert and commit"""
+    from catalog_io import parse_row
+    from models import Product, db
+
+    for _, row in rows:
+        db.session.add(Product(**parse_row(row)))
+        db.session.commit()
+
+
+def timed(func, rows):
+    started = time.perf_counter()
+    func()
+    return rows / (time.perf_counter() - started)
+
+
+def main(rows=20000):
+    from catalog_io import import_products, read_csv
+    from models import Product, db
+
+    rows = int(rows)
+    server = StubJWKSServer()
+    app = create_app(server)
+    headers = {"Authorization": f"Bearer {server.token(groups=['admin'])}"}
+    client = app.test_client()
+    body = catalog_csv(rows)
+
+    def reset():
+        with app.app_context():
+            Product.query.delete()
+            db.session.commit()
+
+    print(f"Import of {rows} new products from CSV, rows per second")
+    with app.app_context():
+        sample = catalog_csv(PER_ROW_SAMPLE)
+        rate = timed(lambda: per_row_import(read_csv(io.BytesIO(sample))), PER_ROW_SAMPLE)
+    print(f"  {'one insert and commit per row':<40} {rate:10.0f}   ({PER_ROW_SAMPLE} rows)")
+    for batch_size in (100, 1000, 5000):
+        reset()
+        with app.app_context():
+            rate = timed(lambda: import_products(read_csv(io.BytesIO(body)), batch_size), rows)
+        print(f"  {f'batched, {batch_size} rows per batch':<40} {rate:10.0f}")
+
+    def post_import(data, written):
+        report = client.post("/products/import", data=data, content_type="text/csv", headers=headers).get_json()
+        assert report[written] == rows, report
+
+    print("Through the routes, default batch size")
+    reset()
+    rate = timed(lambda: post_import(body, "inserted"), rows)
+    print(f"  {'POST /products/import, new products':<40} {rate:10.0f}")
+    export = []
+    rate = timed(lambda: export.append(client.get("/products/export", headers=headers).get_data()), rows)
+    print(f"  {'GET /products/export':<40} {rate:10.0f}")
+    rate = timed(lambda: post_import(export[0], "updated"), rows)
+    print(f"  {'POST /products/import, updates':<40} {rate:10.0f}")
+    server.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,45 @@
+"""
+p50/p99 latency of POST /orders/ by number of line items, with the SQL statements each order runs.
+    python benchmarks/bench_create_order.py [orders per size]
+"""
+import sys
+
+from sqlalchemy import event
+
+from common import StubJWKSServer, create_app, latencies, percentile, seed_products
+
+
+def main(orders=200):
+    from models import db
+
+    server = StubJWKSServer()
+    app = create_app(server)
+    seed_products(app, 100)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {server.token()}"}
+
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    print(f"POST /orders/, {orders} orders per size")
+    for lines in (1, 10, 100):
+        body = {"items": [{"product_id": product_id, "quantity": 1} for product_id in range(1, lines + 1)]}
+
+        def order():
+            response = client.post("/orders/", json=body, headers=headers)
+            assert response.status_code == 201, response.get_json()
+
+        order()  # Warm up, and count the statements of one order
+        statements.clear()
+        order()
+        count = len(statements)
+
+        samples = latencies(order, orders)
+        print(f"  {lines:>3} lines: p50 {percentile(samples, 0.5) * 1000:7.2f} ms   "
+              f"p99 {percentile(samples, 0.99) * 1000:7.2f} ms   {count} statements")
+    server.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""
+GET /products/search over a synthetic catalog: the in-process inverted index used without MySQL FULLTEXT (its
+build on the first search, then each query) against a LIKE scan and against what clients did before, downloading
+the whole catalog to filter it themselves. The LIKE scan does not rank, so it stops at the first page of matches
+and is only slow for rare terms; the index scores every match, so it is slowest for terms most products contain.
+    python benchmarks/bench_search.py [products]
+"""
+import os
+import random
+import sys
+import time
+
+from common import create_app, latencies, percentile
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "an", "el", "or", "ut", "bri", "dal", "fen", "gor"]
+VOCABULARY_SIZE = 5000
+
+
+def vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed_catalog(app, count):
+    """Insert count products whose words follow a Zipf-like distribution, as in real text"""
+    from sqlalchemy import insert
+
+    from models import Product, db
+
+    rng = random.Random(0)
+    words = vocabulary(rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    with app.app_context():
+        for start in range(0, count, 10000):
+            db.session.execute(insert(Product), [
+                {
+                    "name": " ".join(rng.choices(words, weights, k=3)).capitalize(),
+                    "description": " ".join(rng.choices(words, weights, k=20)),
+                    "price": 10,
+                    "stock": 10,
+                }
+                for _ in range(start, min(start + 10000, count))
+            ])
+        db.session.commit()
+    return words
+
+
+def like_search(terms, limit):
+    """Every term as a substring of the name or description, by a scan of the table"""
+    from sqlalchemy import or_, select
+
+    from models import Product, db
+    from serializers import PRODUCT_COLUMNS
+
+    statement = select(*PRODUCT_COLUMNS).filter_by(deleted=False)
+    for term in terms:
+        statement = statement.where(or_(Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%")))
+    return db.session.execute(statement.order_by(Product.id).limit(limit)).all()
+
+
+def client_side_search(client, count, terms):
+    """Download the whole catalog and keep the products containing every term"""
+    products = client.get(f"/products/?limit={count}").get_json()
+    return [
+        product for product in products
+        if all(term in f"{product['name']} {product['description']}".lower() for term in terms)
+    ]
+
+
+def main(count=100_000):
+    count = int(count)
+    # Let one page hold the whole catalog, as the client-side search needs; read when the app is imported
+    os.environ["PRODUCTS_MAX_PAGE_SIZE"] = str(count)
+    app = create_app()
+    words = seed_catalog(app, count)
+    client = app.test_client()
+
+    started = time.perf_counter()
+    client.get(f"/products/search?q={words[0]}")
+    print(f"{count} products, index built on the first search in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = {
+        "common word": words[0],
+        "rare word": words[-1],
+        "prefix": words[len(words) // 2][:3],
+        "two words": f"{words[1]} {words[2]}",
+    }
+    print("Per query, p50 / p99 ms")
+    for label, query in queries.items():
+        index = latencies(lambda: client.get(f"/products/search?q={query}&limit=20"), 200)
+        with app.app_context():
+            like = latencies(lambda: like_search(query.split(), 20), 10)
+        download = latencies(lambda: client_side_search(client, count, query.split()), 3)
+        print(f"  {label:<12} {f'({query})':<22} index {percentile(index, 0.5) * 1000:7.2f} / "
+              f"{percentile(index, 0.99) * 1000:7.2f}   LIKE scan {percentile(like, 0.5) * 1000:8.1f} / "
+              f"{percentile(like, 0.99) * 1000:8.1f}   whole catalog download {percentile(download, 0.5) * 1000:8.0f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
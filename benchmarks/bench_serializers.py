@@ -0,0 +1,117 @@
+"""
+Serialization throughput of product and order listings: the hand-built dicts over ORM objects and the standard
+library encoder that the routes used before serializers.py, against the shared serializers over Core rows and the
+orjson provider. Each run selects the rows and encodes the JSON body, as a list route does.
+    python benchmarks/bench_serializers.py [products] [orders]
+"""
+import sys
+from datetime import datetime
+
+from common import create_app, measure, seed_products
+
+
+def product_dict(product):
+    """The product listing entry as product_routes.py built it by hand"""
+    from s3_utils import image_variant_urls
+
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "price": float(product.price),
+        "stock": product.stock,
+        "image_url": product.image_url,
+        "image_variants": image_variant_urls(product.image_url),
+    }
+
+
+def order_dict(order):
+    """The order history entry as order_routes.py built it by hand"""
+    return {
+        "order_id": order.id,
+        "total": float(order.total),
+        "created_at": order.created_at.isoformat(),
+        "items": [
+            {
+                "product_id": item.product_id,
+                "product_name": item.product.name,
+                "quantity": item.quantity,
+                "price": float(item.price),
+                "subtotal": float(item.quantity * item.price),
+            }
+            for item in order.items
+        ],
+    }
+
+
+def seed_orders(app, count, items=5):
+    from sqlalchemy import insert
+
+    from models import CustomerOrder, OrderItem, db
+
+    with app.app_context():
+        db.session.execute(insert(CustomerOrder), [
+            {"user_sub": "user-1", "total": 10 * items, "created_at": datetime(2024, 1, 1)} for _ in range(count)
+        ])
+        db.session.execute(insert(OrderItem), [
+            {"order_id": order_id, "product_id": product_id, "quantity": 1, "price": 10}
+            for order_id in range(1, count + 1) for product_id in range(1, items + 1)
+        ])
+        db.session.commit()
+
+
+def main(products=2000, orders=500):
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy import select
+
+    from models import CustomerOrder, OrderItem, Product, db
+    from routes.order_routes import order_items_query, serialize_order_rows
+    from serializers import ORDER_COLUMNS, PRODUCT_COLUMNS, OrjsonProvider, orjson, serialize_product
+
+    app = create_app()
+    seed_products(app, products, image_url="https://test-bucket.s3.amazonaws.com/product.png")
+    seed_orders(app, orders)
+
+    def session_read(read):
+        """Read in a fresh session, as each request does, so the identity map starts empty"""
+        def run():
+            with app.app_context():
+                return read()
+        return run
+
+    def order_rows():
+        rows = db.session.execute(select(*ORDER_COLUMNS)).all()
+        return serialize_order_rows(rows, db.session.execute(order_items_query(rows)))
+
+    encoders = [("stdlib json", DefaultJSONProvider(app).dumps)]
+    if orjson is not None:
+        encoders.append(("orjson", OrjsonProvider(app).dumps))
+
+    cases = [
+        (f"{products} products", [
+            ("ORM + hand-built dicts", lambda: [product_dict(product) for product in Product.query.all()]),
+            ("ORM + serializers", lambda: [serialize_product(product) for product in Product.query.all()]),
+            ("Core rows + serializers",
+             lambda: [serialize_product(row) for row in db.session.execute(select(*PRODUCT_COLUMNS))]),
+        ]),
+        (f"{orders} orders of 5 items", [
+            ("ORM + hand-built dicts", lambda: [
+                order_dict(order) for order in CustomerOrder.query.options(
+                    db.selectinload(CustomerOrder.items).joinedload(OrderItem.product))
+            ]),
+            ("Core rows + serializers", order_rows),
+        ]),
+    ]
+
+    for title, readers in cases:
+        print(f"{title}, median per listing")
+        baseline = None
+        for label, read in readers:
+            for encoder, dumps in encoders:
+                seconds = measure(session_read(lambda: dumps(read())), repeat=15)
+                baseline = baseline or seconds
+                print(f"  {label + ', ' + encoder:<45} {seconds * 1000:10.3f} ms   x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,126 @@
+"""
+gunicorn boot cost: time from launch to the first served request, the latency of the first request on each worker,
+and the resident (RSS) and proportional (PSS, shared pages split between processes) memory of the master and each
+worker. Reads /proc, so it runs on Linux only.
+    python benchmarks/bench_startup.py [workers]
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from common import ROOT, create_app, free_port, seed_products
+
+
+def memory(pid):
+    """(RSS, PSS) of a process in MB"""
+    sizes = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        next(smaps)  # The address range line
+        for line in smaps:
+            name, value = line.split()[:2]
+            sizes[name] = int(value) / 1024
+    return sizes["Rss:"], sizes["Pss:"]
+
+
+def children(pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    # The parent pid is the second field after the parenthesised command name
+                    if int(stat.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except OSError:
+                pass
+    return pids
+
+
+def get(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=10) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def boot(command, port, env, workers):
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                get(f"http://127.0.0.1:{port}/products/1")
+                break
+            except OSError:
+                if process.poll() is not None or time.perf_counter() - started > 120:
+                    raise RuntimeError(f"{command} did not start")
+                time.sleep(0.01)
+        first_request = time.perf_counter() - started
+
+        # Wait for every worker to be up, then send each one a request for a product it has not served yet
+        while len(children(process.pid)) < workers:
+            time.sleep(0.05)
+        time.sleep(2)
+        first_latencies = [
+            get(f"http://127.0.0.1:{port}/products/{product_id}") for product_id in range(2, 2 + 4 * workers)
+        ]
+
+        master = memory(process.pid)
+        worker_memory = [memory(pid) for pid in children(process.pid)]
+        return first_request, max(first_latencies), master, worker_memory
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main(workers=4):
+    from sqlalchemy import insert
+
+    from models import ProductSalesSummary, db
+
+    workers = int(workers)
+    app = create_app()
+    seed_products(app, 1000)
+    with app.app_context():
+        # Top sellers for the warm-up to load into the product cache
+        db.session.execute(insert(ProductSalesSummary), [
+            {"product_id": product_id, "units_sold": 1000 - product_id, "revenue": 10 * (1000 - product_id)}
+            for product_id in range(1, 101)
+        ])
+        db.session.commit()
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "IDEMPOTENCY_CLEANUP_INTERVAL": "0",
+        # There is no Cognito here, so the JWKS warm-up step fails fast instead of loading the keys
+        "JWKS_FETCH_TIMEOUT": "1",
+    }
+    gunicorn = [sys.executable, "-m", "gunicorn"]
+    setups = [
+        ("gunicorn.conf.py, warm-up on", gunicorn + ["-c", "gunicorn.conf.py"], {"WARMUP_ENABLED": "true"}),
+        ("gunicorn.conf.py, warm-up off", gunicorn + ["-c", "gunicorn.conf.py"], {"WARMUP_ENABLED": "false"}),
+        # gunicorn would otherwise load ./gunicorn.conf.py; without it every worker imports and warms the app itself
+        ("wsgi:app without preload", gunicorn + [
+            "-c", os.devnull, "wsgi:app", "--workers", str(workers), "--threads", "8", "--bind", f"127.0.0.1:{port}",
+        ], {"WARMUP_ENABLED": "true"}),
+    ]
+
+    print(f"gunicorn, {workers} workers")
+    for label, command, settings in setups:
+        first_request, slowest_first, (master_rss, _), worker_memory = boot(command, port, {**env, **settings}, workers)
+        rss = sum(sizes[0] for sizes in worker_memory) / len(worker_memory)
+        pss = sum(sizes[1] for sizes in worker_memory) / len(worker_memory)
+        print(f"  {label:<30} first request after {first_request * 1000:5.0f} ms, slowest cold request "
+              f"{slowest_first * 1000:4.0f} ms; master RSS {master_rss:4.0f} MB; per worker RSS {rss:4.0f} MB, "
+              f"PSS {pss:4.0f} MB")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,68 @@
+"""
+Peak memory of listing the whole catalog by catalog size: GET /products/ built as one page (as every listing was
+before streaming), streamed as a JSON array (?stream=true) and as NDJSON. Each listing runs in a fresh process and
+reports how far it raised the process's peak RSS. Reads /proc, so it runs on Linux only.
+    python benchmarks/bench_streaming.py [catalog sizes...]
+"""
+import os
+import subprocess
+import sys
+
+from common import create_app, seed_products
+
+MODES = {
+    "one page": "",
+    "stream=true": "&stream=true",
+    "format=ndjson": "&format=ndjson",
+}
+
+
+def peak_rss():
+    """
+    Peak resident memory of this process in MB. Read from VmHWM rather than ru_maxrss, which Linux carries over
+    from the parent through fork and exec.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def list_catalog(database_uri, size, mode):
+    """Child process: list the catalog once, printing the body size and the peak RSS before and after"""
+    os.environ.update({"SQLALCHEMY_DATABASE_URI": database_uri, "PRODUCTS_MAX_PAGE_SIZE": str(size)})
+    from app import create_app as create
+
+    client = create().test_client()
+    client.get("/products/?limit=10")  # Import and warm everything the listing touches
+    before = peak_rss()
+
+    response = client.get(f"/products/?limit={size}{MODES[mode]}", buffered=False)
+    body = sum(len(chunk) for chunk in response.iter_encoded())
+    response.close()
+    print(body, before, peak_rss())
+
+
+def main(*sizes):
+    from config import Config
+
+    sizes = [int(size) for size in sizes] or [10_000, 50_000, 200_000]
+    print("GET /products/ of the whole catalog, peak RSS growth of the process")
+    for size in sizes:
+        app = create_app()
+        seed_products(app, size, description="d" * 200)
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", Config().SQLALCHEMY_DATABASE_URI, str(size), mode],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            body, before, peak = map(float, output.split()[-3:])
+            print(f"  {size:>7} products, {mode:<14} body {body / 2 ** 20:6.1f} MB   "
+                  f"peak RSS {peak:6.1f} MB (+{peak - before:5.1f} MB)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        list_catalog(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main(*sys.argv[1:])
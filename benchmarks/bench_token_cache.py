@@ -0,0 +1,33 @@
+"""
+Authenticated request cost with the verified-token cache on and off.
+    python benchmarks/bench_token_cache.py [requests]
+"""
+import sys
+
+from common import StubJWKSServer, create_app, measure, report
+
+
+def main(requests=500):
+    from token_cache import token_cache
+
+    server = StubJWKSServer()
+    app = create_app(server)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {server.token()}"}
+    # Load the JWKS first, so only the signature verification differs
+    client.get("/orders/summary", headers=headers)
+
+    rows = []
+    for enabled in (False, True):
+        token_cache.enabled = enabled
+        token_cache.clear()
+        rows.append((
+            f"GET /orders/summary, token cache {'on' if enabled else 'off'}",
+            measure(lambda: client.get("/orders/summary", headers=headers), number=requests),
+        ))
+    report(f"{requests} requests with one bearer token, median per request", rows)
+    server.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
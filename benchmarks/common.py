@@ -0,0 +1,85 @@
+"""
+Shared setup of the benchmark scripts. Importing it applies the test settings (SQLite, no warm-up, no rate limits)
+before any app module is imported, so the scripts run without MySQL, Cognito or AWS.
+"""
+import os
+import socket
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+from conftest import DATABASE_PATH, StubJWKSServer  # noqa: E402,F401  (sets the environment)
+
+
+def create_app(jwks_server=None):
+    """A fresh app on an empty SQLite database, verifying tokens against jwks_server"""
+    from app import create_app as create
+    from jwks_cache import jwks_key_store
+    from models import db
+
+    if jwks_server is not None:
+        jwks_key_store._url = jwks_server.url
+    app = create()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def free_port():
+    """A local TCP port for a benchmarked server to bind"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure(func, repeat=5, number=1):
+    """Run func number times per round; returns the median seconds per call over repeat rounds"""
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - started) / number)
+    return statistics.median(rounds)
+
+
+def latencies(func, number):
+    """Call func number times; returns the sorted seconds of each call"""
+    samples = []
+    for _ in range(number):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return sorted(samples)
+
+
+def percentile(samples, fraction):
+    """The value below which fraction of the sorted samples fall"""
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def seed_products(app, count, **values):
+    """Insert count products in one statement; values override the defaults"""
+    from sqlalchemy import insert
+
+    from models import Product, db
+
+    with app.app_context():
+        db.session.execute(insert(Product), [
+            {"name": f"Product {i}", "description": f"Description of product {i}", "price": 10, "stock": 10 ** 6,
+             **values}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def report(title, rows, unit="ms", scale=1000):
+    """Print (label, seconds) rows, with each row's speed-up over the first"""
+    print(title)
+    baseline = rows[0][1]
+    for label, seconds in rows:
+        print(f"  {label:<40} {seconds * scale:10.3f} {unit}   x{baseline / seconds:5.1f}")
@@ -0,0 +1,292 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import Response, stream_with_context
+from sqlalchemy import insert, select, update
+
+from config import Config
+from models import Product, db
+from product_cache import product_cache
+from product_search import search_index
+from s3_outbox import enqueue_image_deletion, s3_deletion_worker
+from s3_utils import s3_url
+from serializers import PRODUCT_COLUMNS
+
+# Columns accepted by the import; a row with an id updates that product, a row without one creates a product
+IMPORT_COLUMNS = ("id", "name", "description", "price", "stock", "image_url", "image_key")
+REQUIRED_COLUMNS = ("name", "price", "stock")
+
+MAX_NAME_LENGTH = 255
+MAX_PRICE = Decimal("99999999.99")  # DECIMAL(10, 2)
+CENTS = Decimal("0.01")
+
+# Per-row errors reported back, so a bad file cannot grow the response without bound
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """The file itself cannot be read, as opposed to one of its rows"""
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv(stream):
+    """
+    Yield (line number, row) from a CSV stream with a header line.
+    In a row with an id, empty cells leave the column unchanged, like a missing key in NDJSON; clearing a column
+    takes an NDJSON null. In a new product's row, empty cells are read as null.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8-sig", newline=""))
+    if reader.fieldnames is None:
+        raise ImportFormatError("The file is empty")
+    unknown = set(reader.fieldnames) - set(IMPORT_COLUMNS)
+    if unknown:
+        raise ImportFormatError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    for row in reader:
+        if row.get("id"):
+            yield reader.line_num, {column: value for column, value in row.items() if value not in ("", None)}
+        else:
+            yield reader.line_num, {column: value if value != "" else None for column, value in row.items()}
+
+
+def read_ndjson(stream):
+    """Yield (line number, row) from an NDJSON stream, one object per line; a missing key leaves the column unchanged"""
+    for line_number, line in enumerate(io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f"Invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else RowError("Each line must be a JSON object")
+
+
+def parse_row(row):
+    """Validate an imported row and return the Product column values it sets"""
+    if isinstance(row, RowError):
+        raise row
+
+    unknown = set(row) - set(IMPORT_COLUMNS)
+    if unknown:
+        raise RowError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    values = {}
+    if row.get("id") is not None:
+        values["id"] = parse_int(row["id"], "id")
+        if values["id"] <= 0:
+            raise RowError("id must be a positive integer")
+    elif any(row.get(column) is None for column in REQUIRED_COLUMNS):
+        raise RowError(f"New products require {', '.join(REQUIRED_COLUMNS)}")
+
+    if "name" in row:
+        name = row["name"]
+        if not isinstance(name, str) or not name.strip():
+            raise RowError("name must be a non-empty string")
+        if len(name) > MAX_NAME_LENGTH:
+            raise RowError(f"name must be at most {MAX_NAME_LENGTH} characters")
+        values["name"] = name
+
+    if "description" in row:
+        if row["description"] is not None and not isinstance(row["description"], str):
+            raise RowError("description must be a string")
+        values["description"] = row["description"]
+
+    if "price" in row:
+        try:
+            price = Decimal(str(row["price"]))
+        except (InvalidOperation, ValueError):
+            raise RowError("price must be a number") from None
+        if isinstance(row["price"], bool) or not price.is_finite():
+            raise RowError("price must be a number")
+        price = price.quantize(CENTS)
+        if not 0 <= price <= MAX_PRICE:
+            raise RowError(f"price must be between 0 and {MAX_PRICE}")
+        values["price"] = price
+
+    if "stock" in row:
+        values["stock"] = parse_int(row["stock"], "stock")
+        if values["stock"] < 0:
+            raise RowError("stock must not be negative")
+
+    if row.get("image_url") is not None and row.get("image_key") is not None:
+        raise RowError("Give either image_url or image_key, not both")
+    if row.get("image_key") is not None:
+        values["image_url"] = s3_url(parse_image_key(row["image_key"]))
+    elif "image_url" in row:
+        values["image_url"] = parse_image_url(row["image_url"])
+    elif "image_key" in row:
+        values["image_url"] = None
+
+    return values
+
+
+def parse_int(value, column):
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise RowError(f"{column} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{column} must be an integer") from None
+
+
+def parse_image_key(key):
+    if not isinstance(key, str) or not key or "/" in key:
+        raise RowError("image_key must be the key of an object at the root of the bucket")
+    return key
+
+
+def parse_image_url(url):
+    """Images are only accepted from the product bucket, whose objects (and variants) the outbox may delete later"""
+    if url is None:
+        return None
+    base_url = s3_url("")
+    if not isinstance(url, str) or not url.startswith(base_url):
+        raise RowError(f"image_url must be an object of {base_url}")
+    return s3_url(parse_image_key(url[len(base_url):]))
+
+
+def import_products(rows, batch_size=None):
+    """
+    Validate rows as they are read and write them in transactions of batch_size rows:
+    one insert for the new products and one update for the existing ones.
+    Returns a report of the rows written and the rows rejected, by line number.
+    A batch that fails to commit rejects its rows; the batches before it stay committed.
+    """
+    batch_size = batch_size or Config().PRODUCT_IMPORT_BATCH_SIZE
+    report = {"inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = []
+    try:
+        for line, row in rows:
+            try:
+                batch.append((line, parse_row(row)))
+            except RowError as e:
+                record_error(report, line, str(e))
+                continue
+            if len(batch) >= batch_size:
+                write_batch(batch, report)
+                batch = []
+        if batch:
+            write_batch(batch, report)
+    except (ImportFormatError, csv.Error, UnicodeDecodeError) as e:
+        # Rows already committed stay imported; the report says where reading stopped
+        report["error"] = str(e)
+    finally:
+        if report["inserted"] or report["updated"]:
+            # A bulk write changes too many products to update the search index one by one
+            search_index.invalidate()
+            s3_deletion_worker.notify()
+    # Rows are rejected while parsing or when their batch is written, so sort the errors back into file order
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
+
+
+def write_batch(batch, report):
+    """Write one batch in a single transaction"""
+    product_ids = {values["id"] for _, values in batch if "id" in values}
+    images = {}
+    if product_ids:
+        images = dict(db.session.execute(
+            select(Product.id, Product.image_url).where(Product.id.in_(product_ids)).filter_by(deleted=False)
+        ).all())
+
+    now = datetime.utcnow()
+    new_rows = []
+    changed_rows = []
+    replaced_images = set()
+    lines = []
+    for line, values in batch:
+        if "id" not in values:
+            new_rows.append(values)
+        elif values["id"] not in images:
+            record_error(report, line, f"Product with ID {values['id']} not found")
+            continue
+        else:
+            old_image = images[values["id"]]
+            if "image_url" in values and old_image and values["image_url"] != old_image:
+                replaced_images.add(old_image)
+                images[values["id"]] = values["image_url"]
+            changed_rows.append({**values, "updated_at": now})
+        lines.append(line)
+
+    # Queue the replaced images for deletion with the rest of the batch, unless a product still shows them
+    for image_url in unreferenced_images(replaced_images, images, new_rows):
+        enqueue_image_deletion(image_url)
+
+    try:
+        if new_rows:
+            db.session.execute(insert(Product), new_rows)
+        if changed_rows:
+            db.session.execute(update(Product), changed_rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for line in lines:
+            record_error(report, line, f"Batch failed: {e}")
+        return
+
+    report["inserted"] += len(new_rows)
+    report["updated"] += len(changed_rows)
+    product_cache.invalidate(*(values["id"] for values in changed_rows))
+
+
+def unreferenced_images(image_urls, batch_images, new_rows):
+    """
+    The image_urls that no product shows once the batch is written. Imported rows may point several products at
+    the same key, so a replaced image can still be in use by a product in or outside the batch.
+    batch_images maps the batch's existing products to their image after the batch.
+    """
+    if not image_urls:
+        return set()
+    in_use = set(batch_images.values())
+    in_use.update(values.get("image_url") for values in new_rows)
+    in_use.update(db.session.execute(
+        select(Product.image_url).where(Product.image_url.in_(image_urls), Product.id.notin_(list(batch_images)))
+    ).scalars())
+    return image_urls - in_use
+
+
+def record_error(report, line, error):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line, "error": error})
+    else:
+        report["errors_truncated"] = True
+
+
+def export_rows(batch_size):
+    """Every product that is not deleted, as rows of PRODUCT_COLUMNS fetched batch_size at a time"""
+    return iter(db.session.execute(
+        select(*PRODUCT_COLUMNS)
+        .filter_by(deleted=False)
+        .order_by(Product.id)
+        .execution_options(yield_per=batch_size)
+    ))
+
+
+def csv_response(rows, filename):
+    """Stream rows of PRODUCT_COLUMNS as CSV, in the format accepted by the import"""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(column.key for column in PRODUCT_COLUMNS)
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            # One chunk per batch of rows rather than per row
+            if count % Config().PRODUCT_IMPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -0,0 +1,204 @@
+import gzip
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request
+
+from config import Config
+from metrics import Counter, Histogram, StatsCollector
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html", "text/csv"}
+
+COMPRESSED_RESPONSES = Counter(
+    "http_compressed_responses_total", "Responses sent compressed, by response cache result",
+    ["blueprint", "endpoint", "encoding", "cache"],
+)
+COMPRESSION_INPUT_BYTES = Counter(
+    "http_compression_input_bytes_total", "Response bytes before compression", ["blueprint", "endpoint", "encoding"]
+)
+COMPRESSION_OUTPUT_BYTES = Counter(
+    "http_compression_output_bytes_total", "Response bytes after compression", ["blueprint", "endpoint", "encoding"]
+)
+COMPRESSION_TIME = Histogram(
+    "http_compression_duration_seconds", "Time spent compressing a response body", ["blueprint", "endpoint", "encoding"]
+)
+
+# A serialized response body, with the custom (X-*) headers sent along with it
+CachedBody = namedtuple("CachedBody", ["body", "mimetype", "headers"])
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized response bodies keyed by (ETag, content encoding),
+    bounded by the total size of the cached bodies.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (etag, encoding) -> CachedBody
+
+    def get(self, etag, encoding):
+        with self._lock:
+            entry = self._entries.get((etag, encoding))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((etag, encoding))
+            self.hits += 1
+            return entry
+
+    def set(self, etag, encoding, entry):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self.bytes -= len(previous.body)
+            self._entries[(etag, encoding)] = entry
+            self.bytes += len(entry.body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted.body)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def init_app(app):
+    """Compress eligible responses according to the request's Accept-Encoding"""
+    app.after_request(compress_response)
+
+
+def supported_encodings():
+    """Encodings this server can produce, in order of preference"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding():
+    """Pick the supported encoding with the highest quality in Accept-Encoding, or None"""
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body, encoding):
+    """Compress body, recording the time and byte counts for the current route"""
+    started = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=Config().BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=Config().GZIP_LEVEL, mtime=0)
+
+    labels = route_labels()
+    COMPRESSION_TIME.observe(time.perf_counter() - started, encoding=encoding, **labels)
+    COMPRESSION_INPUT_BYTES.inc(len(body), encoding=encoding, **labels)
+    COMPRESSION_OUTPUT_BYTES.inc(len(compressed), encoding=encoding, **labels)
+    return compressed
+
+
+def route_labels():
+    return {"blueprint": request.blueprint or "", "endpoint": request.endpoint or "unmatched"}
+
+
+def compress_response(response):
+    # Compressible responses vary by Accept-Encoding even when this one is sent uncompressed
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if (
+        not Config().COMPRESSION_ENABLED
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.status_code in (204, 304)
+        or (response.content_length or 0) < Config().COMPRESSION_MIN_SIZE
+    ):
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    compressed = compress(body, encoding)
+    if len(compressed) >= len(body):
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The identity body is sent with the same strong ETag; only a weak one may cover both
+        response.set_etag(etag, weak=True)
+    COMPRESSED_RESPONSES.inc(encoding=encoding, cache="none", **route_labels())
+    return response
+
+
+def cached_response(etag, render):
+    """
+    Return the response for a cacheable representation identified by etag.
+    render() builds the uncompressed 200 response and is only called when its body is not cached;
+    the compressed bytes are cached per encoding, so repeat requests skip serialization and compression.
+    """
+    encoding = negotiate_encoding() if Config().COMPRESSION_ENABLED else None
+    entry = response_cache.get(etag, encoding) if encoding else None
+    cache = "hit"
+
+    if entry is None:
+        cache = "miss"
+        entry = response_cache.get(etag, "identity")
+        if entry is None:
+            response = render()
+            if response.status_code != 200:
+                return response
+            entry = CachedBody(
+                response.get_data(),
+                response.mimetype,
+                [(name, value) for name, value in response.headers if name.startswith("X-")],
+            )
+            response_cache.set(etag, "identity", entry)
+
+        if encoding and len(entry.body) >= Config().COMPRESSION_MIN_SIZE:
+            entry = entry._replace(body=compress(entry.body, encoding))
+            response_cache.set(etag, encoding, entry)
+        else:
+            encoding = None
+
+    response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+    response.headers.extend(entry.headers)
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        COMPRESSED_RESPONSES.inc(encoding=encoding, cache=cache, **route_labels())
+    return response
+
+
+response_cache = ResponseCache(Config().RESPONSE_CACHE_BYTES)
+StatsCollector("response_cache", response_cache.stats, "Serialized response body cache")
@@ -7,14 +7,118 @@ class Config:
     COGNITO_CLIENT_ID = os.getenv("COGNITO_CLIENT_ID", "")
     COGNITO_CLIENT_SECRET = os.getenv("COGNITO_CLIENT_SECRET", "")
 
+    # JWKS cache (seconds)
+    JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", 3600))
+    JWKS_REFETCH_INTERVAL = int(os.getenv("JWKS_REFETCH_INTERVAL", 60))
+    JWKS_FETCH_TIMEOUT = int(os.getenv("JWKS_FETCH_TIMEOUT", 5))
+
+    # Verified access token cache
+    TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
     # SQLAlchemy Database Configuration
     SQLALCHEMY_DATABASE_URI = os.getenv(
         "SQLALCHEMY_DATABASE_URI", ""
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = os.getenv("SQLALCHEMY_TRACK_MODIFICATIONS", False)
+    SQLALCHEMY_REPLICA_DATABASE_URI = os.getenv("SQLALCHEMY_REPLICA_DATABASE_URI", "")
+
+    # Connection pool (recycle below MySQL's wait_timeout)
+    SQLALCHEMY_POOL_SIZE = int(os.getenv("SQLALCHEMY_POOL_SIZE", 10))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 20))
+    SQLALCHEMY_POOL_TIMEOUT = int(os.getenv("SQLALCHEMY_POOL_TIMEOUT", 10))
+    SQLALCHEMY_POOL_RECYCLE = int(os.getenv("SQLALCHEMY_POOL_RECYCLE", 1800))
+    SQLALCHEMY_POOL_PRE_PING = os.getenv("SQLALCHEMY_POOL_PRE_PING", "true").lower() == "true"
+
+    # Product listing page sizes
+    PRODUCTS_PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", 50))
+    PRODUCTS_MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", 200))
+
+    # Order history page sizes
+    ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", 50))
+    ORDERS_MAX_PAGE_SIZE = int(os.getenv("ORDERS_MAX_PAGE_SIZE", 200))
+
+    # Rows written per transaction by the bulk product import (and per chunk by the export)
+    PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv("PRODUCT_IMPORT_BATCH_SIZE", 1000))
+
+    # Product cache ("local" or "redis")
+    PRODUCT_CACHE_BACKEND = os.getenv("PRODUCT_CACHE_BACKEND", "local")
+    PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 300))
+    PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", 10000))
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Stock reservation for new orders ("conditional" or "skip_locked")
+    ORDER_STOCK_LOCKING = os.getenv("ORDER_STOCK_LOCKING", "conditional")
+
+    # Rate limits (token buckets: requests per window in seconds, 0 disables a limit)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")
+    RATE_LIMIT_STORE_SIZE = int(os.getenv("RATE_LIMIT_STORE_SIZE", 100000))
+    LOGIN_IP_RATE_LIMIT = int(os.getenv("LOGIN_IP_RATE_LIMIT", 20))
+    LOGIN_IP_RATE_LIMIT_WINDOW = int(os.getenv("LOGIN_IP_RATE_LIMIT_WINDOW", 60))
+    LOGIN_USERNAME_RATE_LIMIT = int(os.getenv("LOGIN_USERNAME_RATE_LIMIT", 5))
+    LOGIN_USERNAME_RATE_LIMIT_WINDOW = int(os.getenv("LOGIN_USERNAME_RATE_LIMIT_WINDOW", 60))
+    ORDER_RATE_LIMIT = int(os.getenv("ORDER_RATE_LIMIT", 10))
+    ORDER_RATE_LIMIT_WINDOW = int(os.getenv("ORDER_RATE_LIMIT_WINDOW", 60))
+
+    # Number of reverse proxies in front of the app whose X-Forwarded-For entries are trusted
+    TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+
+    # Idempotency-Key handling for POST /orders/ (seconds)
+    IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 86400))
+    IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+    IDEMPOTENCY_CLEANUP_INTERVAL = int(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL", 3600))
+
+    # Directory where each worker process writes its metrics for /metrics to report them together, empty to
+    # report only the serving process's metrics; and the seconds between each worker's writes
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_SNAPSHOT_INTERVAL = int(os.getenv("METRICS_SNAPSHOT_INTERVAL", 5))
+
+    # HTTP caching (Cache-Control max-age in seconds)
+    PRODUCTS_MAX_AGE = int(os.getenv("PRODUCTS_MAX_AGE", 30))
+    PRODUCT_MAX_AGE = int(os.getenv("PRODUCT_MAX_AGE", 60))
+    ORDER_MAX_AGE = int(os.getenv("ORDER_MAX_AGE", 86400))
+
+    # Response compression (gzip, or brotli when the brotli package is installed)
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+    RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+
+    # Warm-up at boot (top-selling products loaded into the product cache)
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_PRODUCTS = int(os.getenv("WARMUP_PRODUCTS", 100))
+
+    # Log requests slower than this many milliseconds with their SQL statements (0 disables)
+    SLOW_REQUEST_LOG_MS = int(os.getenv("SLOW_REQUEST_LOG_MS", 0))
+
+    # Request profiling (fraction of flagged admin requests that are profiled)
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+    # AWS client connection settings
+    AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 50))
+    AWS_CONNECT_TIMEOUT = int(os.getenv("AWS_CONNECT_TIMEOUT", 5))
+    AWS_READ_TIMEOUT = int(os.getenv("AWS_READ_TIMEOUT", 30))
+    AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive")
+    AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", 5))
 
     # S3 Configurations
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
     S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "")
-    S3_REGION_NAME = os.getenv("S3_REGION_NAME", "")
\ No newline at end of file
+    S3_REGION_NAME = os.getenv("S3_REGION_NAME", "")
+    S3_ASYNC_UPLOADS = os.getenv("S3_ASYNC_UPLOADS", "true").lower() == "true"
+    S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", 4))
+    S3_UPLOAD_QUEUE_SIZE = int(os.getenv("S3_UPLOAD_QUEUE_SIZE", 32))
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+    # S3 deletion outbox worker (seconds)
+    S3_DELETION_WORKER = os.getenv("S3_DELETION_WORKER", "true").lower() == "true"
+    S3_DELETION_POLL_INTERVAL = int(os.getenv("S3_DELETION_POLL_INTERVAL", 30))
+    S3_DELETION_MAX_ATTEMPTS = int(os.getenv("S3_DELETION_MAX_ATTEMPTS", 10))
+    S3_ORPHAN_MIN_AGE = int(os.getenv("S3_ORPHAN_MIN_AGE", 86400))
@@ -13,12 +13,21 @@ CREATE TABLE Product (
     deleted BOOLEAN DEFAULT FALSE                       -- Soft delete flag
 );
 
+-- Indexes for the keyset-paginated product listing
+CREATE INDEX ix_product_deleted_id ON Product (deleted, id);
+CREATE INDEX ix_product_deleted_price_id ON Product (deleted, price, id);
+CREATE INDEX ix_product_deleted_name ON Product (deleted, name);
+
+-- Full-text index for product search
+CREATE FULLTEXT INDEX ix_product_fulltext ON Product (name, description);
+
 -- Create the CustomerOrder table
 CREATE TABLE CustomerOrder (
     id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY, -- Primary key
     user_sub VARCHAR(255) NOT NULL,             -- User identifier (e.g., Cognito user ID)
     total DECIMAL(10, 2) NOT NULL,              -- Total order price
-    created_at TIMESTAMP DEFAULT NOW()          -- Creation timestamp
+    created_at TIMESTAMP DEFAULT NOW(),         -- Creation timestamp
+    INDEX ix_customerorder_user_created_id (user_sub, created_at, id) -- Keyset-paginated order history
 );
 
 -- Create the OrderItem table
@@ -31,3 +40,45 @@ CREATE TABLE OrderItem (
     FOREIGN KEY (order_id) REFERENCES CustomerOrder (id) ON DELETE CASCADE, -- Cascade delete if order is deleted
     FOREIGN KEY (product_id) REFERENCES Product (id)                        -- Product reference
 );
+
+-- Create the UserOrderSummary table, maintained when orders are created
+CREATE TABLE UserOrderSummary (
+    user_sub VARCHAR(255) PRIMARY KEY,          -- User identifier (e.g., Cognito user ID)
+    order_count INT NOT NULL DEFAULT 0,         -- Number of orders placed
+    lifetime_total DECIMAL(12, 2) NOT NULL DEFAULT 0, -- Sum of all order totals
+    last_order_at TIMESTAMP NULL                -- Creation timestamp of the latest order
+);
+
+-- Create the ProductSalesSummary table, maintained when orders are created
+CREATE TABLE ProductSalesSummary (
+    product_id INT UNSIGNED PRIMARY KEY,        -- Foreign key to Product table
+    units_sold INT NOT NULL DEFAULT 0,          -- Units sold across all orders
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,  -- Revenue across all orders
+    FOREIGN KEY (product_id) REFERENCES Product (id) -- Product reference
+);
+
+-- Create the IdempotencyKey table, storing responses of POST /orders/ by Idempotency-Key
+CREATE TABLE IdempotencyKey (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY, -- Primary key
+    user_sub VARCHAR(255) NOT NULL,             -- User who sent the key
+    idempotency_key VARCHAR(255) NOT NULL,      -- Client-supplied Idempotency-Key header
+    request_hash CHAR(64) NOT NULL,             -- SHA-256 of the method, path and body
+    response_status INT,                        -- Stored response status, NULL while the request is in flight
+    response_body TEXT,                         -- Stored response body
+    locked_until TIMESTAMP NULL,                -- End of the in-flight request's lease, after which another may take over
+    created_at TIMESTAMP DEFAULT NOW(),         -- Creation timestamp
+    expires_at TIMESTAMP NOT NULL,              -- Time after which the key may be purged
+    UNIQUE KEY uq_idempotencykey_user_key (user_sub, idempotency_key),
+    INDEX ix_idempotencykey_expires_at (expires_at)
+);
+
+-- Create the S3DeletionOutbox table
+CREATE TABLE S3DeletionOutbox (
+    id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,         -- Primary key
+    object_key VARCHAR(255) NOT NULL,                   -- S3 object key to delete
+    attempts INT NOT NULL DEFAULT 0,                    -- Failed delete attempts so far
+    last_error TEXT,                                    -- Error from the last failed attempt
+    next_attempt_at TIMESTAMP DEFAULT NOW(),            -- Earliest time to retry
+    created_at TIMESTAMP DEFAULT NOW(),                 -- Creation timestamp
+    INDEX ix_s3deletionoutbox_next_attempt_at (next_attempt_at)
+);
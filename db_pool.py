@@ -0,0 +1,125 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+from metrics import Counter, Gauge, Histogram
+
+REPLICA_BIND_KEY = "replica"
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    ["engine"],
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Connection checkouts that timed out because the pool was exhausted",
+    ["engine"],
+)
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections currently checked out of the pool", ["engine"])
+POOL_SIZE = Gauge("db_pool_connections_open", "Connections currently open in the pool", ["engine"])
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    label = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(engine=self.label)
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, engine=self.label)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+def engine_options(uri):
+    """Return the SQLAlchemy engine options for a database URI"""
+    # SQLite (used for local runs) keeps Flask-SQLAlchemy's default pool
+    if not uri or uri.startswith("sqlite"):
+        return {}
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": Config().SQLALCHEMY_POOL_SIZE,
+        "max_overflow": Config().SQLALCHEMY_MAX_OVERFLOW,
+        "pool_timeout": Config().SQLALCHEMY_POOL_TIMEOUT,
+        "pool_recycle": Config().SQLALCHEMY_POOL_RECYCLE,
+        "pool_pre_ping": Config().SQLALCHEMY_POOL_PRE_PING,
+    }
+
+
+def configure_database(app):
+    """Set the pool options and the optional read replica bind on the app config"""
+    app.config["SQLALCHEMY_DATABASE_URI"] = Config().SQLALCHEMY_DATABASE_URI
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = Config().SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(Config().SQLALCHEMY_DATABASE_URI)
+
+    replica_uri = Config().SQLALCHEMY_REPLICA_DATABASE_URI
+    if replica_uri:
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND_KEY: {"url": replica_uri, **engine_options(replica_uri)}}
+
+
+def init_pool_metrics(app, db):
+    """Label each engine's pool and export its in-use and open connection gauges"""
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            label = bind_key or "primary"
+            if isinstance(engine.pool, InstrumentedQueuePool):
+                engine.pool.label = label
+            POOL_IN_USE.set_function(lambda engine=engine: engine.pool.checkedout(), engine=label)
+            POOL_SIZE.set_function(lambda engine=engine: engine.pool.checkedin() + engine.pool.checkedout(), engine=label)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the read replica inside views marked with read_replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and has_app_context()
+            and g.get("use_replica")
+            and REPLICA_BIND_KEY in self._db.engines
+        ):
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(func):
+    """Route the queries of a read-only view to the read replica, if one is configured"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.use_replica = False
+
+    return wrapper
+
+
+@contextmanager
+def primary_database():
+    """Temporarily send queries to the primary inside a read_replica view"""
+    previous = g.get("use_replica", False)
+    g.use_replica = False
+    try:
+        yield
+    finally:
+        g.use_replica = previous
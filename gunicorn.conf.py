@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# Import and warm the app once in the master, so workers fork with it already loaded and share its memory
+preload_app = True
+
+
+def on_starting(server):
+    from metrics import clear_snapshots
+
+    clear_snapshots()
+
+
+def post_fork(server, worker):
+    from app import start_worker
+
+    start_worker(worker.app.wsgi())
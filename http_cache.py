@@ -0,0 +1,59 @@
+import hashlib
+from datetime import timezone
+
+from flask import request, make_response
+
+
+def make_etag(*parts):
+    """Build a strong ETag value from the given parts"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def page_validators(key, rows):
+    """
+    Return (ETag, Last-Modified) of a page of rows with an updated_at column.
+    Revalidate pages with the ETag only; Last-Modified misses rows that left the page.
+    The ETag covers every value of every row, so it changes when a row enters or leaves the page or any listed
+    column changes, even within the one-second precision of updated_at.
+    """
+    last_modified = max((row.updated_at for row in rows if row.updated_at), default=None)
+    return make_etag(key, *(tuple(row) for row in rows)), last_modified
+
+
+def is_not_modified(etag, last_modified=None, req=None):
+    """
+    Check the request's If-None-Match / If-Modified-Since headers against the current validators.
+    req defaults to the current Flask request. If-None-Match uses the weak comparison, so the weak ETag of a
+    compressed representation validates the same resource.
+    """
+    req = req if req is not None else request
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+
+    if last_modified and req.if_modified_since:
+        return as_utc(last_modified).replace(microsecond=0) <= req.if_modified_since
+    return False
+
+
+def not_modified_response(etag, last_modified=None, cache_control=None):
+    response = make_response("", 304)
+    set_cache_headers(response, etag, last_modified, cache_control)
+    # Echo the ETag the client holds: weak if it cached a compressed representation
+    if request.if_none_match.is_weak(etag):
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def set_cache_headers(response, etag, last_modified=None, cache_control=None):
+    # A strong ETag identifies exact bytes, so the compressed and identity bodies cannot share one
+    response.set_etag(etag, weak="Content-Encoding" in response.headers)
+    if last_modified:
+        response.last_modified = as_utc(last_modified)
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def as_utc(value):
+    # Timestamps are stored as naive UTC datetimes
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
@@ -0,0 +1,286 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import current_app, jsonify, make_response, request
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from metrics import Counter
+from models import IdempotencyKey, db
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Seconds between checks of a duplicate that is in flight in another process
+POLL_INTERVAL = 0.1
+# Rows deleted per statement by the cleanup job
+PURGE_BATCH_SIZE = 1000
+
+INVALID_KEY_ERROR = f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters"
+MISMATCH_ERROR = f"{IDEMPOTENCY_HEADER} was already used with a different request"
+IN_FLIGHT_ERROR = f"A request with this {IDEMPOTENCY_HEADER} is still being processed, please retry"
+
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total", "Requests carrying an Idempotency-Key, by outcome", ["endpoint", "outcome"]
+)
+
+_in_flight = {}  # (user_sub, key) -> threading.Event set when the request finishes in this process
+_in_flight_lock = threading.Lock()
+
+
+def idempotent(func):
+    """
+    Honour an Idempotency-Key header on a view behind cognito_required.
+    The first request with a key runs the view and stores its response; duplicates wait for it
+    to finish and get the stored response replayed, without running the view again.
+    Server errors and 409 conflicts are not stored, so those requests can be retried with the same key.
+    A request holds its key for IDEMPOTENCY_LOCK_TIMEOUT seconds; if its worker dies, a retry after that takes over.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return func(*args, **kwargs)
+        if not is_valid_key(key):
+            return jsonify({"error": INVALID_KEY_ERROR}), 400
+
+        user_sub = request.user
+        request_hash = hash_request(request.method, request.path, request.get_data())
+
+        record, claimed = claim_key(user_sub, key, request_hash)
+        if not claimed:
+            return replay(record, user_sub, key, request_hash)
+
+        record_id, locked_until = record.id, record.locked_until
+        event = threading.Event()
+        with _in_flight_lock:
+            _in_flight[(user_sub, key)] = event
+        try:
+            response = make_response(func(*args, **kwargs))
+            store_response(record_id, locked_until, response)
+            record_outcome("executed")
+            return response
+        except Exception:
+            release_key(record_id, locked_until)
+            raise
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop((user_sub, key), None)
+            event.set()
+
+    return wrapper
+
+
+def claim_key(user_sub, key, request_hash):
+    """
+    Insert an in-flight row for the key in its own transaction, or take over one whose lease has run out.
+    Returns (row, True) if this request claimed the key, or (existing row, False).
+    """
+    now, locked_until = new_lease()
+    existing = load_key(user_sub, key)
+    if existing is not None and existing.expires_at <= now:
+        # An expired key starts over
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == existing.id))
+        db.session.commit()
+        existing = None
+    if existing is not None:
+        if is_abandoned(existing, now) and existing.request_hash == request_hash:
+            return take_over_key(existing, locked_until)
+        return existing, False
+
+    record = new_key(user_sub, key, request_hash, now, locked_until)
+    db.session.add(record)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request claimed the key first
+        db.session.rollback()
+        return load_key(user_sub, key), False
+    return record, True
+
+
+def is_valid_key(key):
+    return 0 < len(key) <= MAX_KEY_LENGTH
+
+
+def hash_request(method, path, body):
+    """SHA-256 of the method, path and body, telling a duplicate apart from a different request reusing the key"""
+    return hashlib.sha256(b"|".join([method.encode(), path.encode(), body])).hexdigest()
+
+
+def new_lease():
+    """Return (now, end of a new claim's lease)"""
+    # Whole seconds, as the lease end identifies the claim and MySQL DATETIME drops fractions
+    now = datetime.utcnow().replace(microsecond=0)
+    return now, now + timedelta(seconds=Config().IDEMPOTENCY_LOCK_TIMEOUT)
+
+
+def new_key(user_sub, key, request_hash, now, locked_until):
+    return IdempotencyKey(
+        user_sub=user_sub,
+        idempotency_key=key,
+        request_hash=request_hash,
+        locked_until=locked_until,
+        expires_at=now + timedelta(seconds=Config().IDEMPOTENCY_KEY_TTL),
+    )
+
+
+def key_query(user_sub, key):
+    return select(IdempotencyKey).filter_by(user_sub=user_sub, idempotency_key=key)
+
+
+def is_abandoned(record, now):
+    """Whether the request holding an in-flight key has outlived its lease, e.g. because its worker died"""
+    return record.response_status is None and record.locked_until is not None and record.locked_until <= now
+
+
+def take_over_key(record, locked_until):
+    """Renew the lease of an abandoned key for this request, unless another request renewed it first"""
+    taken = db.session.execute(take_over_statement(record, locked_until)).rowcount
+    db.session.commit()
+    if not taken:
+        return load_key(record.user_sub, record.idempotency_key), False
+    record_outcome("taken_over")
+    return load_key(record.user_sub, record.idempotency_key), True
+
+
+def take_over_statement(record, locked_until):
+    return (
+        update(IdempotencyKey)
+        .where(IdempotencyKey.id == record.id, IdempotencyKey.response_status.is_(None),
+               IdempotencyKey.locked_until == record.locked_until)
+        .values(locked_until=locked_until)
+    )
+
+
+def load_key(user_sub, key):
+    # End the current transaction first, so a repeated read sees other requests' commits
+    db.session.rollback()
+    return db.session.execute(key_query(user_sub, key)).scalar_one_or_none()
+
+
+def replay(record, user_sub, key, request_hash):
+    """Wait for a duplicate's original request to finish, then return its stored response"""
+    if record is None:
+        # The original request failed and released the key between the insert and the read
+        record_outcome("conflict")
+        return retry_later_response()
+    if record.request_hash != request_hash:
+        record_outcome("mismatch")
+        return jsonify({"error": MISMATCH_ERROR}), 422
+
+    deadline = time.monotonic() + Config().IDEMPOTENCY_WAIT_TIMEOUT
+    while record is not None and record.response_status is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or is_abandoned(record, datetime.utcnow()):
+            # An abandoned key is taken over by the retry
+            record_outcome("conflict")
+            return retry_later_response()
+
+        with _in_flight_lock:
+            event = _in_flight.get((user_sub, key))
+        if event is not None:
+            event.wait(remaining)
+        else:
+            time.sleep(min(POLL_INTERVAL, remaining))
+        record = load_key(user_sub, key)
+
+    if record is None:
+        record_outcome("conflict")
+        return retry_later_response()
+
+    record_outcome("replayed")
+    response = current_app.response_class(record.response_body, status=record.response_status,
+                                          mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def retry_later_response():
+    response = jsonify({"error": IN_FLIGHT_ERROR})
+    response.headers["Retry-After"] = "1"
+    return response, 409
+
+
+def is_retryable(status_code):
+    """Server errors and 409 conflicts (e.g. stock being reserved) may succeed on retry, so they are not replayed"""
+    return status_code >= 500 or status_code == 409
+
+
+def store_response(record_id, locked_until, response):
+    """Store the response, or release the key if it is retryable. Does nothing if the key was taken over."""
+    if is_retryable(response.status_code):
+        release_key(record_id, locked_until)
+        return
+    db.session.rollback()
+    db.session.execute(store_statement(record_id, locked_until, response.status_code, response.get_data(as_text=True)))
+    db.session.commit()
+
+
+def store_statement(record_id, locked_until, status, body):
+    return (
+        update(IdempotencyKey)
+        .where(IdempotencyKey.id == record_id, IdempotencyKey.locked_until == locked_until)
+        .values(response_status=status, response_body=body, locked_until=None)
+    )
+
+
+def release_key(record_id, locked_until):
+    db.session.rollback()
+    db.session.execute(release_statement(record_id, locked_until))
+    db.session.commit()
+
+
+def release_statement(record_id, locked_until):
+    return delete(IdempotencyKey).where(IdempotencyKey.id == record_id, IdempotencyKey.locked_until == locked_until)
+
+
+def record_outcome(outcome):
+    IDEMPOTENT_REQUESTS.inc(endpoint=request.endpoint or "unmatched", outcome=outcome)
+
+
+def purge_expired_keys():
+    """Delete expired keys in batches. Returns the number of keys deleted."""
+    purged = 0
+    while True:
+        ids = db.session.scalars(
+            select(IdempotencyKey.id).where(IdempotencyKey.expires_at <= datetime.utcnow()).limit(PURGE_BATCH_SIZE)
+        ).all()
+        if not ids:
+            db.session.commit()
+            return purged
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+
+
+def init_app(app):
+    """Register the purge-idempotency-keys CLI command"""
+
+    @app.cli.command("purge-idempotency-keys")
+    def purge_command():
+        """Delete expired idempotency keys."""
+        click.echo(f"Purged {purge_expired_keys()} expired idempotency keys")
+
+
+def start_cleanup(app):
+    """Start the periodic cleanup thread, in each worker process"""
+    interval = Config().IDEMPOTENCY_CLEANUP_INTERVAL
+    if not interval:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    purge_expired_keys()
+            except Exception as e:
+                print(f"Idempotency key cleanup failed: {e}")
+
+    threading.Thread(target=run, name="idempotency-key-cleanup", daemon=True).start()
@@ -0,0 +1,100 @@
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+from metrics import Counter, Histogram
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["blueprint", "endpoint", "method"])
+REQUESTS = Counter("http_requests_total", "Requests handled", ["blueprint", "endpoint", "method", "status"])
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size", ["blueprint", "endpoint"], buckets=SIZE_BUCKETS
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", ["blueprint", "endpoint"], buckets=COUNT_BUCKETS
+)
+REQUEST_SQL_TIME = Histogram(
+    "http_request_sql_duration_seconds", "Total SQL time per request", ["blueprint", "endpoint"]
+)
+REQUEST_OUTBOUND_TIME = Histogram(
+    "http_request_outbound_duration_seconds", "Total AWS/HTTP call time per request", ["blueprint", "endpoint"]
+)
+OUTBOUND_CALLS = Histogram("outbound_call_duration_seconds", "Latency of outbound AWS/HTTP calls", ["target"])
+
+
+def init_app(app):
+    """Record per-route latency, SQL, outbound call and response size metrics, and log slow requests"""
+    app.before_request(start_request)
+    app.after_request(finish_request)
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_statements = []
+    g.outbound_time = 0.0
+
+
+def finish_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+
+    duration = time.perf_counter() - started
+    blueprint = request.blueprint or ""
+    endpoint = request.endpoint or "unmatched"
+
+    REQUEST_LATENCY.observe(duration, blueprint=blueprint, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(blueprint=blueprint, endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_SQL_STATEMENTS.observe(g.sql_count, blueprint=blueprint, endpoint=endpoint)
+    REQUEST_SQL_TIME.observe(g.sql_time, blueprint=blueprint, endpoint=endpoint)
+    REQUEST_OUTBOUND_TIME.observe(g.outbound_time, blueprint=blueprint, endpoint=endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, blueprint=blueprint, endpoint=endpoint)
+
+    threshold = Config().SLOW_REQUEST_LOG_MS
+    if threshold and duration * 1000 >= threshold:
+        statements = "\n".join(f"  {seconds * 1000:.1f} ms: {statement}" for statement, seconds in g.sql_statements)
+        print(
+            f"Slow request {request.method} {request.path} -> {response.status_code} took {duration * 1000:.1f} ms "
+            f"({g.sql_count} SQL statements in {g.sql_time * 1000:.1f} ms, "
+            f"{g.outbound_time * 1000:.1f} ms in outbound calls)\n{statements}"
+        )
+    return response
+
+
+def record_outbound_call(target, seconds):
+    """Record an outbound AWS/HTTP call, attributing its time to the current request if there is one"""
+    OUTBOUND_CALLS.observe(seconds, target=target)
+    if has_request_context() and "outbound_time" in g:
+        g.outbound_time += seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_time += seconds
+        if Config().SLOW_REQUEST_LOG_MS:
+            g.sql_statements.append((statement, seconds))
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(exception_context):
+    # after_cursor_execute does not run for failed statements
+    if exception_context.connection is not None:
+        started = exception_context.connection.info.get("query_started")
+        if started:
+            started.pop()
@@ -0,0 +1,162 @@
+import threading
+import time
+
+from config import Config
+from instrumentation import record_outbound_call
+from metrics import StatsCollector
+
+
+class JWKSKeyStore:
+    """
+    Process-wide cache of Cognito signing keys, indexed by key ID (kid).
+    Keys are parsed once per fetch, refreshed in the background after the TTL
+    and kept (stale) when the JWKS endpoint is unreachable.
+    """
+
+    def __init__(self, url=None, ttl=None, refetch_interval=None, timeout=None):
+        self._url = url
+        self.ttl = ttl if ttl is not None else Config().JWKS_CACHE_TTL
+        self.refetch_interval = refetch_interval if refetch_interval is not None else Config().JWKS_REFETCH_INTERVAL
+        self.timeout = timeout if timeout is not None else Config().JWKS_FETCH_TIMEOUT
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._keys = None  # kid -> RSA public key
+        self._fetched_at = 0.0
+        self._last_forced_fetch = None
+        self._refreshing = False
+
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.throttled_fetches = 0
+
+    @property
+    def url(self):
+        if self._url:
+            return self._url
+        return f"https://cognito-idp.{Config().COGNITO_REGION_NAME}.amazonaws.com/{Config().COGNITO_USER_POOL_ID}/.well-known/jwks.json"
+
+    def get_key(self, kid):
+        """Return the public key for kid, fetching the JWKS only when needed."""
+        key, fetch = self.lookup(kid)
+        if not fetch:
+            if key is None and self._fetch_lock.locked():
+                # Share the result of a fetch already in flight instead of starting another
+                with self._fetch_lock:
+                    pass
+                return self.cached_key(kid)
+            return key
+
+        self.refresh(raise_on_error=not self.has_keys())
+        return self.cached_key(kid)
+
+    def lookup(self, kid):
+        """
+        Return (key, fetch) for kid without doing any I/O, where fetch tells whether the JWKS should be
+        fetched because kid is unknown and the refetch throttle allows it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys = self._keys
+            if keys is not None and kid in keys:
+                self.hits += 1
+                if now - self._fetched_at >= self.ttl:
+                    self._refresh_in_background()
+                return keys[kid], False
+
+            self.misses += 1
+            # Unknown kid: refetch at most once per refetch_interval, even before any keys are loaded,
+            # so an unreachable JWKS endpoint fails requests fast instead of blocking each on a fetch
+            if self._last_forced_fetch is not None and now - self._last_forced_fetch < self.refetch_interval:
+                self.throttled_fetches += 1
+                return None, False
+            self._last_forced_fetch = now
+            return None, True
+
+    def cached_key(self, kid):
+        with self._lock:
+            return self._keys.get(kid) if self._keys else None
+
+    def has_keys(self):
+        with self._lock:
+            return bool(self._keys)
+
+    def refresh(self, raise_on_error=False):
+        """Fetch the JWKS and replace the cached keys. Stale keys are kept on failure."""
+        with self._fetch_lock:
+            try:
+                self.load(fetch_jwks(self.url, self.timeout))
+            except Exception as e:
+                self.record_failure(e)
+                if raise_on_error:
+                    raise
+                return False
+            return True
+
+    def load(self, jwks):
+        """Replace the cached keys with the keys of a fetched JWKS document"""
+        # Loads cryptography, so it is imported on first use rather than at startup
+        from jwt.algorithms import RSAAlgorithm
+
+        keys = {jwk["kid"]: RSAAlgorithm.from_jwk(jwk) for jwk in jwks["keys"]}
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self.fetches += 1
+
+    def record_failure(self, error):
+        with self._lock:
+            self.fetch_failures += 1
+        print(f"Failed to refresh JWKS: {error}")
+
+    def _refresh_in_background(self):
+        # Called with self._lock held
+        if self._refreshing:
+            return
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="jwks-refresh", daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._fetched_at = 0.0
+            self._last_forced_fetch = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._keys) if self._keys else 0,
+                "age_seconds": time.monotonic() - self._fetched_at if self._keys is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "fetch_failures": self.fetch_failures,
+                "throttled_fetches": self.throttled_fetches,
+            }
+
+
+def fetch_jwks(url, timeout=None):
+    """Fetch a JSON Web Key Set (JWKS)"""
+    import requests
+
+    started = time.perf_counter()
+    try:
+        response = requests.get(url, timeout=timeout)
+    finally:
+        record_outbound_call("http:jwks", time.perf_counter() - started)
+    response.raise_for_status()
+    return response.json()
+
+
+jwks_key_store = JWKSKeyStore()
+StatsCollector("jwks_cache", jwks_key_store.stats, "Cognito JWKS key store")
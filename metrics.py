@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+from glob import glob
+
+from config import Config
+
+# Metric types whose values add up across worker processes; gauges are reported per process instead
+CUMULATIVE_TYPES = ("counter", "histogram")
+
+
+class Registry:
+    """Collects metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collect(self):
+        """Every metric family as (name, type, documentation, [(sample name, labels, value)])"""
+        with self._lock:
+            metrics = list(self._metrics)
+        families = []
+        for metric in metrics:
+            families.extend(metric.collect())
+        return families
+
+    def render(self):
+        return render_families(self.collect())
+
+    def reset_counts(self):
+        """Zero the counters and histograms, e.g. those a worker inherited from the master when it was forked"""
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            if getattr(metric, "type", None) in CUMULATIVE_TYPES:
+                metric.reset()
+
+
+REGISTRY = Registry()
+
+
+def render_families(families):
+    lines = []
+    for name, type_, documentation, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {type_}")
+        lines.extend(f"{sample}{format_labels(labels)} {value}" for sample, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.labelnames)
+
+    def collect(self):
+        return [(self.name, self.type, self.documentation, self.samples())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions = {}  # label values tuple -> callable
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """Compute the value by calling function each time the metrics are scraped"""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return [(self.name, key, value) for key, value in values.items() if value is not None]
+
+
+class Histogram(Metric):
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key + (("le", bound),), bucket_count))
+                samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+                samples.append((f"{self.name}_sum", key, total))
+                samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+class StatsCollector:
+    """Exports each numeric value of a component's stats() dict as a gauge named <prefix>_<key>."""
+
+    def __init__(self, prefix, stats, documentation, registry=REGISTRY):
+        self.prefix = prefix
+        self.stats = stats
+        self.documentation = documentation
+        registry.register(self)
+
+    def collect(self):
+        try:
+            stats = self.stats()
+        except Exception:
+            return []
+
+        families = []
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            families.append((name, "gauge", f"{self.documentation}: {key.replace('_', ' ')}", [(name, (), value)]))
+        return families
+
+
+# Multi-process mode: with METRICS_DIR set, each worker process writes its metrics to <METRICS_DIR>/<pid>.json
+# every METRICS_SNAPSHOT_INTERVAL seconds, and /metrics, whichever worker serves it, reports all of them together:
+# counters and histograms summed over every process that wrote them, gauges per live process with a pid label.
+
+def write_snapshot(directory, registry=REGISTRY, pid=None):
+    pid = pid or os.getpid()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{pid}.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(registry.collect(), file)
+    os.replace(f"{path}.tmp", path)  # Readers never see a half-written snapshot
+
+
+def merge_snapshots(directory):
+    """The metric families of every snapshot in directory, combined across processes"""
+    families = {}  # name -> (type, documentation, {(sample name, labels): value})
+    for path in sorted(glob(os.path.join(directory, "*.json"))):
+        pid = os.path.basename(path)[:-len(".json")]
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        live = process_alive(int(pid))
+
+        for name, type_, documentation, samples in snapshot:
+            values = families.setdefault(name, (type_, documentation, {}))[2]
+            for sample, labels, value in samples:
+                labels = tuple(tuple(label) for label in labels)
+                if type_ in CUMULATIVE_TYPES:
+                    # Counts from exited workers still count, so totals never go backwards
+                    values[sample, labels] = values.get((sample, labels), 0) + value
+                elif live:
+                    values[sample, labels + (("pid", pid),)] = value
+
+    return [
+        (name, type_, documentation, [(sample, labels, value) for (sample, labels), value in values.items()])
+        for name, (type_, documentation, values) in families.items()
+    ]
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render_metrics():
+    """This process's metrics, or every worker's when METRICS_DIR is set"""
+    directory = Config().METRICS_DIR
+    if not directory:
+        return REGISTRY.render()
+    write_snapshot(directory)
+    return render_families(merge_snapshots(directory))
+
+
+def clear_snapshots():
+    """Remove the snapshots of a previous run; called by the gunicorn master before it starts the workers"""
+    directory = Config().METRICS_DIR
+    if not directory:
+        return
+    for path in glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+
+
+def start_snapshots():
+    """Start the thread writing this process's snapshot, in each worker process"""
+    config = Config()
+    if not config.METRICS_DIR:
+        return
+
+    def run():
+        while True:
+            try:
+                write_snapshot(config.METRICS_DIR)
+            except Exception as e:
+                print(f"Writing the metrics snapshot failed: {e}")
+            time.sleep(config.METRICS_SNAPSHOT_INTERVAL)
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
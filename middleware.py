@@ -1,11 +1,9 @@
 from functools import wraps
 
-import jwt
-import requests
 from flask import request, jsonify
-from jwt import InvalidTokenError, ExpiredSignatureError
 
-from config import Config
+from jwks_cache import jwks_key_store
+from token_cache import token_cache
 
 
 def cognito_required(func):
@@ -16,14 +14,7 @@ def cognito_required(func):
             return jsonify({"error": "Authorization token is missing"}), 401
 
         try:
-            # Extract the token
-            token = token.split(" ")[1] if " " in token else token
-
-            # Fetch JWKS from Cognito
-            jwks = get_cognito_keys()
-
-            # Decode the token (replace 'your-jwks-url' with Cognito JWKs URL)
-            decoded_access_token = validate_token(token, jwks)
+            decoded_access_token = decode_access_token(token)
 
             # Extract user info
             cognito_sub = decoded_access_token["sub"]
@@ -40,29 +31,40 @@ def cognito_required(func):
     return wrapper
 
 
-def get_cognito_keys():
-    """Fetch Cognito JSON Web Key Sets (JWKS)"""
-    url = f"https://cognito-idp.{Config().COGNITO_REGION_NAME}.amazonaws.com/{Config().COGNITO_USER_POOL_ID}/.well-known/jwks.json"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+def decode_access_token(authorization):
+    """Return the claims of the token in an Authorization header, verifying it only if it is not cached"""
+    token = bearer_token(authorization)
+
+    # Reuse the claims of an already verified token, otherwise verify it
+    decoded_access_token = token_cache.get(token)
+    if decoded_access_token is None:
+        decoded_access_token = validate_token(token)
+        if decoded_access_token:
+            token_cache.put(token, decoded_access_token)
+    return decoded_access_token
+
 
+def bearer_token(authorization):
+    """Extract the token from an Authorization header"""
+    return authorization.split(" ")[1] if " " in authorization else authorization
+
+
+def validate_token(token, key_store=jwks_key_store, audience=None):
+    """Validate a JWT token using the cached JWKS"""
+    # PyJWT loads cryptography, so it is imported on first use rather than at startup
+    import jwt
+    from jwt import InvalidTokenError, ExpiredSignatureError
 
-def validate_token(token, jwks, audience=None):
-    """Validate a JWT token using JWKS"""
     try:
         # Decode token header to get the key ID (kid)
         unverified_header = jwt.get_unverified_header(token)
         kid = unverified_header.get("kid")
 
-        # Find the correct key in JWKS
-        key = next((key for key in jwks['keys'] if key["kid"] == kid), None)
-        if not key:
+        # Look up the parsed public key for this kid
+        public_key = key_store.get_key(kid)
+        if not public_key:
             raise InvalidTokenError("Key not found in JWKS")
 
-        # Construct public key
-        public_key = jwt.algorithms.RSAAlgorithm.from_jwk(key)
-
         # Decode and validate the token
         decoded_token = jwt.decode(
             token,
@@ -3,7 +3,9 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.mysql import INTEGER, DECIMAL
 
-db = SQLAlchemy()
+from db_pool import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 # Product model
@@ -20,6 +22,15 @@ class Product(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Update timestamp
     deleted = db.Column(db.Boolean, default=False)  # Soft delete flag
 
+    # Composite indexes backing the keyset-paginated product listing
+    __table_args__ = (
+        db.Index("ix_product_deleted_id", "deleted", "id"),
+        db.Index("ix_product_deleted_price_id", "deleted", "price", "id"),
+        db.Index("ix_product_deleted_name", "deleted", "name"),
+        # Full-text search over name and description (a plain index on other databases)
+        db.Index("ix_product_fulltext", "name", "description", mysql_prefix="FULLTEXT"),
+    )
+
     def __repr__(self):
         return f"<Product {self.name}>"
 
@@ -34,7 +45,12 @@ class CustomerOrder(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Creation timestamp
 
     # Relationship with OrderItem
-    items = db.relationship("OrderItem", backref="customerorder", lazy=True, cascade="all, delete-orphan")
+    items = db.relationship("OrderItem", backref="customerorder", lazy="selectin", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Keyset-paginated order history of a user, newest first, optionally within a date range
+        db.Index("ix_customerorder_user_created_id", "user_sub", "created_at", "id"),
+    )
 
     def __repr__(self):
         return f"<CustomerOrder {self.id}, User {self.user_sub}>"
@@ -55,5 +71,72 @@ class OrderItem(db.Model):
     # Relationship with Product (optional, for back-references)
     product = db.relationship("Product", backref="orderitem", lazy=True)
 
+    @property
+    def product_name(self):
+        return self.product.name
+
     def __repr__(self):
         return f"<OrderItem Order {self.order_id}, Product {self.product_id}, Quantity {self.quantity}>"
+
+
+# UserOrderSummary model
+class UserOrderSummary(db.Model):
+    __tablename__ = "userordersummary"
+
+    user_sub = db.Column(db.String(255), primary_key=True)  # User identifier
+    order_count = db.Column(db.Integer, nullable=False, default=0)  # Number of orders placed
+    lifetime_total = db.Column(DECIMAL(12, 2), nullable=False, default=0)  # Sum of all order totals
+    last_order_at = db.Column(db.DateTime)  # Creation timestamp of the latest order
+
+    def __repr__(self):
+        return f"<UserOrderSummary {self.user_sub}, Orders {self.order_count}>"
+
+
+# ProductSalesSummary model
+class ProductSalesSummary(db.Model):
+    __tablename__ = "productsalessummary"
+
+    product_id = db.Column(INTEGER(unsigned=True), db.ForeignKey("product.id"), primary_key=True,
+                           autoincrement=False)  # Foreign key to Product
+    units_sold = db.Column(db.Integer, nullable=False, default=0)  # Units sold across all orders
+    revenue = db.Column(DECIMAL(12, 2), nullable=False, default=0)  # Revenue across all orders
+
+    def __repr__(self):
+        return f"<ProductSalesSummary Product {self.product_id}, Units {self.units_sold}>"
+
+
+# IdempotencyKey model
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotencykey"
+
+    id = db.Column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)  # UNSIGNED INT
+    user_sub = db.Column(db.String(255), nullable=False)  # User who sent the key
+    idempotency_key = db.Column(db.String(255), nullable=False)  # Client-supplied Idempotency-Key header
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the method, path and body
+    response_status = db.Column(db.Integer)  # Stored response status, NULL while the request is in flight
+    response_body = db.Column(db.Text)  # Stored response body
+    locked_until = db.Column(db.DateTime)  # End of the in-flight request's lease, after which another may take over
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Creation timestamp
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Time after which the key may be purged
+
+    __table_args__ = (
+        db.UniqueConstraint("user_sub", "idempotency_key", name="uq_idempotencykey_user_key"),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.idempotency_key}, User {self.user_sub}>"
+
+
+# S3DeletionOutbox model
+class S3DeletionOutbox(db.Model):
+    __tablename__ = "s3deletionoutbox"
+
+    id = db.Column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)  # UNSIGNED INT
+    object_key = db.Column(db.String(255), nullable=False)  # S3 object key to delete
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Failed delete attempts so far
+    last_error = db.Column(db.Text)  # Error from the last failed attempt
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Earliest time to retry
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Creation timestamp
+
+    def __repr__(self):
+        return f"<S3DeletionOutbox {self.object_key}, Attempts {self.attempts}>"
@@ -0,0 +1,131 @@
+import click
+from sqlalchemy import delete, exists, func, insert, literal, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import CustomerOrder, OrderItem, ProductSalesSummary, UserOrderSummary, db
+
+
+def upsert_statements(dialect, model, rows, increments, replacements=()):
+    """
+    Build the statements inserting rows into a summary table, adding the increments columns to the existing row
+    (and overwriting the replacements columns) when the primary key already exists.
+    MySQL, SQLite and PostgreSQL use one native upsert; other databases get a portable insert-missing-then-update.
+    """
+    if dialect == "mysql":
+        statement = mysql.insert(model).values(rows)
+        new = statement.inserted
+    elif dialect in ("sqlite", "postgresql"):
+        statement = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(model).values(rows)
+        new = statement.excluded
+    else:
+        return portable_upsert_statements(model, rows, increments, replacements)
+
+    updates = {column: getattr(model, column) + getattr(new, column) for column in increments}
+    updates.update({column: getattr(new, column) for column in replacements})
+
+    if dialect == "mysql":
+        return [statement.on_duplicate_key_update(**updates)]
+    primary_key = [column.name for column in model.__table__.primary_key]
+    return [statement.on_conflict_do_update(index_elements=primary_key, set_=updates)]
+
+
+def portable_upsert_statements(model, rows, increments, replacements=()):
+    """
+    Per row, insert a zeroed row if the key is missing, then apply the increments with an UPDATE.
+    Only needs standard SQL; two first orders for the same key racing on the insert may conflict.
+    """
+    columns = model.__table__.columns
+    primary_key = [column.name for column in model.__table__.primary_key]
+    statements = []
+    for row in rows:
+        matches_key = [columns[column] == row[column] for column in primary_key]
+        seed = {column: 0 if column in increments else value for column, value in row.items()}
+        statements.append(
+            insert(model).from_select(
+                list(seed),
+                select(*(literal(value, columns[column].type) for column, value in seed.items())).where(
+                    ~exists().where(*matches_key)
+                ),
+            )
+        )
+        values = {column: columns[column] + row[column] for column in increments}
+        values.update({column: row[column] for column in replacements})
+        statements.append(update(model).where(*matches_key).values(values))
+    return statements
+
+
+def summary_statements(dialect, user_sub, total, created_at, item_rows):
+    """Return the upserts adding an order to the user and product summaries"""
+    return [
+        *upsert_statements(
+            dialect,
+            UserOrderSummary,
+            [{"user_sub": user_sub, "order_count": 1, "lifetime_total": total, "last_order_at": created_at}],
+            increments=("order_count", "lifetime_total"),
+            replacements=("last_order_at",),
+        ),
+        # Rows are upserted in product id order so concurrent orders lock them consistently
+        *upsert_statements(
+            dialect,
+            ProductSalesSummary,
+            [
+                {"product_id": row["product_id"], "units_sold": row["quantity"], "revenue": row["price"] * row["quantity"]}
+                for row in sorted(item_rows, key=lambda row: row["product_id"])
+            ],
+            increments=("units_sold", "revenue"),
+        ),
+    ]
+
+
+def record_order(user_sub, total, created_at, item_rows):
+    """
+    Add an order to the user and product summaries.
+    Runs in the caller's transaction, so the summaries only change if the order commits.
+    """
+    dialect = db.session.get_bind(mapper=UserOrderSummary.__mapper__).dialect.name
+    for statement in summary_statements(dialect, user_sub, total, created_at, item_rows):
+        db.session.execute(statement)
+
+
+def backfill_summaries():
+    """Rebuild both summary tables from the order history in a single transaction"""
+    db.session.execute(delete(UserOrderSummary))
+    db.session.execute(delete(ProductSalesSummary))
+
+    db.session.execute(
+        insert(UserOrderSummary).from_select(
+            ["user_sub", "order_count", "lifetime_total", "last_order_at"],
+            select(
+                CustomerOrder.user_sub,
+                func.count(CustomerOrder.id),
+                func.sum(CustomerOrder.total),
+                func.max(CustomerOrder.created_at),
+            ).group_by(CustomerOrder.user_sub),
+        )
+    )
+    db.session.execute(
+        insert(ProductSalesSummary).from_select(
+            ["product_id", "units_sold", "revenue"],
+            select(
+                OrderItem.product_id,
+                func.sum(OrderItem.quantity),
+                func.sum(OrderItem.quantity * OrderItem.price),
+            ).group_by(OrderItem.product_id),
+        )
+    )
+    db.session.commit()
+
+    return (
+        db.session.scalar(select(func.count()).select_from(UserOrderSummary)),
+        db.session.scalar(select(func.count()).select_from(ProductSalesSummary)),
+    )
+
+
+def init_app(app):
+    """Register the backfill-summaries CLI command"""
+
+    @app.cli.command("backfill-summaries")
+    def backfill_summaries_command():
+        """Rebuild the order summary tables from existing orders."""
+        users, products = backfill_summaries()
+        click.echo(f"Rebuilt summaries for {users} users and {products} products")
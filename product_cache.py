@@ -0,0 +1,219 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from metrics import StatsCollector
+
+try:
+    import redis
+except ImportError:  # Shared backend is optional
+    redis = None
+
+
+class LocalCacheBackend:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Shared cache backend so every worker and node sees the same entries and invalidations."""
+
+    def __init__(self, url, ttl, prefix="product:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis cache backend")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0  # Evictions are handled by Redis itself
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(f"{self.prefix}{key}", json.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(f"{self.prefix}{key}" for key in keys))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ProductCache:
+    """
+    Read-through cache of serialized product dicts.
+    Concurrent misses for the same product are collapsed into a single load.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._flights = {}  # product_id -> _Flight
+        self._async_flights = {}  # (event loop, product_id) -> asyncio.Future of the load
+        self._generations = {}  # product_id -> invalidation counter
+
+    def get_or_load(self, product_id, loader):
+        """Return the cached product dict, calling loader() at most once per concurrent miss."""
+        value = self.backend.get(product_id)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        with self._lock:
+            flight = self._flights.get(product_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[product_id] = _Flight()
+                generation = self._generations.get(product_id, 0)
+
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            self.loads += 1
+            flight.result = loader()
+            # Skip storing if the product was invalidated while it was loading
+            if flight.result is not None and self._generations.get(product_id, 0) == generation:
+                self.backend.set(product_id, flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(product_id, None)
+            flight.event.set()
+
+    async def get_or_load_async(self, product_id, loader):
+        """Async variant of get_or_load, where loader is a coroutine function. Misses share a load per event loop."""
+        value = self.backend.get(product_id)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        loop = asyncio.get_running_loop()
+        key = (loop, product_id)
+        while key in self._async_flights:
+            flight = self._async_flights[key]
+            # Waiting does not cancel the load if this request is cancelled
+            await asyncio.wait([flight])
+            if not flight.cancelled():
+                return flight.result()
+            # The request that was loading was cancelled: load again
+
+        flight = self._async_flights[key] = loop.create_future()
+        with self._lock:
+            generation = self._generations.get(product_id, 0)
+        try:
+            self.loads += 1
+            result = await loader()
+            # Skip storing if the product was invalidated while it was loading
+            if result is not None and self._generations.get(product_id, 0) == generation:
+                self.backend.set(product_id, result)
+            flight.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # Retrieved here, so an error without waiters is not logged as unhandled
+            raise
+        finally:
+            del self._async_flights[key]
+
+    def prime(self, values):
+        """Store already loaded products (product_id -> value), e.g. when warming the cache at boot"""
+        for product_id, value in values.items():
+            self.backend.set(product_id, value)
+
+    def invalidate(self, *product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._generations[product_id] = self._generations.get(product_id, 0) + 1
+        self.backend.delete(*product_ids)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.backend.evictions,
+        }
+
+
+def create_backend():
+    if Config().PRODUCT_CACHE_BACKEND == "redis":
+        return RedisCacheBackend(Config().REDIS_URL, Config().PRODUCT_CACHE_TTL)
+    return LocalCacheBackend(Config().PRODUCT_CACHE_SIZE, Config().PRODUCT_CACHE_TTL)
+
+
+product_cache = ProductCache(create_backend())
+StatsCollector("product_cache", product_cache.stats, "Product cache")
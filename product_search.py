@@ -0,0 +1,217 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import match
+
+from metrics import StatsCollector
+from models import Product, db
+from serializers import PRODUCT_COLUMNS
+from streaming import STREAM_BATCH_SIZE
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Characters with a meaning in MySQL boolean-mode MATCH ... AGAINST, removed from the terms of a search
+BOOLEAN_MODE_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+MIN_TOKEN_LENGTH = 2
+# Shorter terms only match whole tokens, since their prefixes match most of the vocabulary
+MIN_PREFIX_LENGTH = 3
+
+# Token weights by field, and the share of that weight a prefix match earns
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_MATCH_WEIGHT = 0.5
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if len(token) >= MIN_TOKEN_LENGTH]
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over product names and descriptions, used when the database has no
+    FULLTEXT support (e.g. SQLite). Every query term must match a token exactly or as a prefix.
+    Each process keeps its own index, built on the first search and updated by this process's writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._tokens = []  # Sorted vocabulary, for prefix lookups
+        self._documents = {}  # product_id -> tokens indexed for it
+        self.built = False
+        self.builds = 0
+        self.searches = 0
+
+    def ensure_built(self):
+        """Build the index on first use, once even under concurrent searches"""
+        if self.built:
+            return
+        with self._build_lock:
+            if not self.built:
+                self.build()
+
+    def build(self):
+        """(Re)build the index from every product that is not deleted"""
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.description)
+            .filter_by(deleted=False)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for row in rows:
+                self._add(row.id, row.name, row.description)
+            self._tokens = sorted(self._postings)
+            self.built = True
+            self.builds += 1
+
+    def update(self, product_id, name, description):
+        """Index a new or edited product; a no-op until the index is built"""
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(product_id)
+            for token in self._add(product_id, name, description):
+                if len(self._postings[token]) == 1:
+                    bisect.insort(self._tokens, token)
+
+    def invalidate(self):
+        """Rebuild the index on the next search, after a bulk change to the catalog"""
+        with self._lock:
+            self.built = False
+
+    def remove(self, product_id):
+        with self._lock:
+            if self.built:
+                self._remove(product_id)
+
+    def search(self, query, offset, limit):
+        """Return (product ids ranked by score, total number of matches)"""
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+        with self._lock:
+            self.searches += 1
+            scores = None
+            for term in terms:
+                term_scores = self._match_term(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return [], 0
+
+        # Only the requested page needs ordering, not every match
+        ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked[offset:]], len(scores)
+
+    def _match_term(self, term):
+        # Called with self._lock held
+        scores = defaultdict(float)
+        if term in self._postings:
+            for product_id, weight in self._postings[term].items():
+                scores[product_id] += weight
+        if len(term) < MIN_PREFIX_LENGTH:
+            return scores
+
+        start = bisect.bisect_right(self._tokens, term)
+        for token in itertools.islice(self._tokens, start, None):
+            if not token.startswith(term):
+                break
+            for product_id, weight in self._postings[token].items():
+                scores[product_id] += weight * PREFIX_MATCH_WEIGHT
+        return scores
+
+    def _add(self, product_id, name, description):
+        # Called with self._lock held; returns the tokens indexed for the product
+        weights = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+
+        for token, weight in weights.items():
+            self._postings[token][product_id] = weight
+        self._documents[product_id] = tuple(weights)
+        return weights
+
+    def _remove(self, product_id):
+        # Called with self._lock held
+        for token in self._documents.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._tokens, token)
+                if index < len(self._tokens) and self._tokens[index] == token:
+                    del self._tokens[index]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tokens": len(self._tokens),
+                "products": len(self._documents),
+                "builds": self.builds,
+                "searches": self.searches,
+            }
+
+
+def uses_fulltext():
+    return db.session.get_bind(mapper=Product.__mapper__).dialect.name == "mysql"
+
+
+def search_products(query, offset, limit):
+    """
+    Return up to limit rows of PRODUCT_COLUMNS matching every term of query, best matches first,
+    and whether more results follow.
+    """
+    if uses_fulltext():
+        relevance = match(Product.name, Product.description, against=boolean_mode_query(tokenize(query)))
+        relevance = relevance.in_boolean_mode()
+        rows = db.session.execute(
+            select(*PRODUCT_COLUMNS)
+            .filter_by(deleted=False)
+            .where(relevance)
+            .order_by(relevance.desc(), Product.id)
+            .offset(offset)
+            .limit(limit + 1)
+        ).all()
+        return rows[:limit], len(rows) > limit
+
+    search_index.ensure_built()
+    product_ids, total = search_index.search(query, offset, limit)
+    if not product_ids:
+        return [], False
+
+    rows = db.session.execute(select(*PRODUCT_COLUMNS).where(Product.id.in_(product_ids)).filter_by(deleted=False))
+    by_id = {row.id: row for row in rows}
+    return [by_id[product_id] for product_id in product_ids if product_id in by_id], offset + limit < total
+
+
+def boolean_mode_query(terms):
+    """
+    The AGAINST string of a boolean-mode MATCH requiring every term, each matching as a prefix. Operators are
+    removed from the terms so that user input cannot exclude, reweight or group terms.
+    """
+    terms = (BOOLEAN_MODE_OPERATORS.sub("", term) for term in terms)
+    return " ".join(f"+{term}*" for term in terms if term)
+
+
+def index_product(product):
+    """Update the in-process index after a product is created or edited"""
+    search_index.update(product.id, product.name, product.description)
+
+
+def unindex_product(product_id):
+    search_index.remove(product_id)
+
+
+search_index = InvertedIndex()
+StatsCollector("product_search_index", search_index.stats, "In-process product search index")
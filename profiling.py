@@ -0,0 +1,113 @@
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+from config import Config
+from middleware import decode_access_token
+
+PROFILE_SUFFIX = ".collapsed"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval and aggregates the samples
+    into collapsed stacks ("outer;inner;leaf count"), the input format of flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def init_app(app):
+    """Profile requests flagged with an X-Profile header or __profile query parameter sent by an admin"""
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+
+
+def profiling_requested():
+    if request.headers.get("X-Profile") != "1" and request.args.get("__profile") != "1":
+        return False
+    if random.random() >= Config().PROFILE_SAMPLE_RATE:
+        return False
+
+    # Only admins may profile, since profiles expose code paths and timings
+    authorization = request.headers.get("Authorization")
+    try:
+        claims = decode_access_token(authorization) if authorization else None
+    except Exception:
+        return False
+    return bool(claims) and "admin" in claims.get("cognito:groups", [])
+
+
+def start_profiling():
+    if profiling_requested():
+        g.profiler = SamplingProfiler(threading.get_ident(), Config().PROFILE_INTERVAL_MS / 1000)
+        g.profiler.start()
+
+
+def finish_profiling(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+
+    profiler.stop()
+    endpoint = (request.endpoint or "unmatched").replace(".", "-")
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+    try:
+        save_profile(name, profiler.collapsed())
+        response.headers["X-Profile-Id"] = name
+    except OSError as e:
+        print(f"Failed to save profile: {e}")
+    return response
+
+
+def save_profile(name, content):
+    """Write a profile and drop the oldest ones beyond PROFILE_MAX_FILES"""
+    directory = Config().PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "w") as file:
+        file.write(content)
+
+    for old_name in list_profiles()[Config().PROFILE_MAX_FILES:]:
+        os.remove(os.path.join(directory, old_name))
+
+
+def list_profiles():
+    """Return profile file names, newest first"""
+    directory = Config().PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    # Names start with a timestamp, so they sort chronologically
+    return sorted((name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)), reverse=True)
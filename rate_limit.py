@@ -0,0 +1,206 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+from config import Config
+from metrics import Counter, StatsCollector
+
+try:
+    import redis
+except ImportError:  # Shared backend is optional
+    redis = None
+
+TOO_MANY_REQUESTS = "Too many requests, please retry later"
+
+RATE_LIMIT_DECISIONS = Counter(
+    "rate_limit_decisions_total", "Requests checked by a rate limit, by outcome", ["limit", "outcome"]
+)
+
+
+class LocalRateLimitStore:
+    """
+    In-process token buckets, one LRU-ordered dict per limit.
+    A bucket that has been idle for a whole window is full again, which is the same as having no bucket,
+    so idle buckets are evicted from the front of the dict as new requests arrive.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._buckets = {}  # limit name -> OrderedDict(key -> [tokens, updated_at])
+        self._size = 0
+
+    def take(self, name, key, limit, window):
+        """Take a token from the bucket; returns 0 if allowed, else the seconds until a token is available"""
+        now = time.monotonic()
+        rate = limit / window
+        with self._lock:
+            buckets = self._buckets.setdefault(name, OrderedDict())
+            self._evict_idle(buckets, now, window)
+
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [float(limit), now]
+                self._size += 1
+                self._evict_oldest()
+            else:
+                bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                buckets.move_to_end(key)
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def _evict_idle(self, buckets, now, window):
+        # Called with self._lock held; buckets are ordered by last use, so stop at the first recent one
+        while buckets:
+            key, (_, updated_at) = next(iter(buckets.items()))
+            if now - updated_at < window:
+                return
+            del buckets[key]
+            self._size -= 1
+
+    def _evict_oldest(self):
+        # Called with self._lock held; drop the least recently used buckets once the store is full
+        while self._size > self.max_size:
+            buckets = min(
+                (buckets for buckets in self._buckets.values() if buckets),
+                key=lambda buckets: next(iter(buckets.values()))[1],
+            )
+            buckets.popitem(last=False)
+            self._size -= 1
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    def size(self):
+        return self._size
+
+
+# Token bucket update run atomically in Redis, on the Redis clock so every node agrees on the time
+TAKE_TOKEN_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local rate = limit / window
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or limit
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - updated_at) * rate)
+
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimitStore:
+    """Shared token buckets, so a client's requests are counted across every worker and node."""
+
+    def __init__(self, url, prefix="ratelimit:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis rate limit backend")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0  # Idle buckets expire in Redis itself
+        self._take = self.client.register_script(TAKE_TOKEN_SCRIPT)
+
+    def take(self, name, key, limit, window):
+        return float(self._take(keys=[f"{self.prefix}{name}:{key}"], args=[limit, window]))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+
+def rate_limit(name, limit, window, key):
+    """
+    Allow at most limit requests per window seconds for each value of key() (bursts of up to limit),
+    answering 429 with Retry-After before the view runs. A limit of 0, or a key() of None, disables the check.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            retry_after = check(name, limit, window, key())
+            if retry_after:
+                response = jsonify({"error": TOO_MANY_REQUESTS})
+                response.headers["Retry-After"] = retry_after_header(retry_after)
+                return response, 429
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def check(name, limit, window, value):
+    """Take a token from value's bucket; returns 0 if the request is allowed, else the seconds to wait"""
+    if not Config().RATE_LIMIT_ENABLED or limit <= 0 or value is None:
+        return 0
+
+    try:
+        retry_after = rate_limit_store.take(name, value, limit, window)
+    except Exception as e:
+        # Fail open: an unreachable shared store must not take the endpoint down with it
+        print(f"Rate limit check failed: {e}")
+        RATE_LIMIT_DECISIONS.inc(limit=name, outcome="error")
+        return 0
+
+    RATE_LIMIT_DECISIONS.inc(limit=name, outcome="limited" if retry_after else "allowed")
+    return retry_after
+
+
+def retry_after_header(seconds):
+    return str(math.ceil(seconds))
+
+
+def client_ip():
+    # remote_addr is the client's address once ProxyFix has handled X-Forwarded-For (see TRUSTED_PROXIES)
+    return request.remote_addr
+
+
+def current_user():
+    # Set by cognito_required
+    return getattr(request, "user", None)
+
+
+def login_username():
+    data = request.get_json(silent=True)
+    username = data.get("username") if isinstance(data, dict) else None
+    return username.lower() if isinstance(username, str) and username else None
+
+
+def create_store():
+    if Config().RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore(Config().REDIS_URL)
+    return LocalRateLimitStore(Config().RATE_LIMIT_STORE_SIZE)
+
+
+def stats():
+    return {"size": rate_limit_store.size(), "evictions": rate_limit_store.evictions}
+
+
+rate_limit_store = create_store()
+StatsCollector("rate_limit_store", stats, "Rate limit buckets")
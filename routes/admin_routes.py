@@ -0,0 +1,40 @@
+import os
+
+from flask import Blueprint, jsonify, send_from_directory
+from werkzeug.utils import secure_filename
+
+from config import Config
+from middleware import admin_required, cognito_required
+from profiling import list_profiles
+
+admin_bp = Blueprint("admin", __name__)
+
+
+@admin_bp.route("/profiles", methods=["GET"])
+@cognito_required
+@admin_required
+def get_profiles():
+    try:
+        directory = Config().PROFILE_DIR
+        return jsonify([
+            {
+                "name": name,
+                "size": os.path.getsize(os.path.join(directory, name)),
+            }
+            for name in list_profiles()
+        ]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/profiles/<name>", methods=["GET"])
+@cognito_required
+@admin_required
+def get_profile(name):
+    if name not in list_profiles():
+        return jsonify({"error": "Profile not found"}), 404
+
+    # Collapsed stacks; render with e.g. flamegraph.pl or speedscope
+    return send_from_directory(
+        os.path.abspath(Config().PROFILE_DIR), secure_filename(name), mimetype="text/plain", as_attachment=True
+    )
@@ -0,0 +1,45 @@
+from quart import Blueprint, jsonify, request
+
+from async_clients import get_client
+from async_middleware import client_ip, login_username, rate_limit
+from config import Config
+from routes.auth_routes import calculate_secret_hash
+
+async_auth_bp = Blueprint("auth", __name__)
+
+
+@async_auth_bp.route("/login", methods=["POST"])
+@rate_limit("login_ip", Config().LOGIN_IP_RATE_LIMIT, Config().LOGIN_IP_RATE_LIMIT_WINDOW, client_ip)
+@rate_limit("login_username", Config().LOGIN_USERNAME_RATE_LIMIT, Config().LOGIN_USERNAME_RATE_LIMIT_WINDOW, login_username)
+async def login():
+    data = await request.get_json()
+    username = data.get("username")
+    password = data.get("password")
+
+    if not username or not password:
+        return jsonify({"error": "Username and password are required"}), 400
+
+    try:
+        # Calculate SECRET_HASH if necessary
+        secret_hash = calculate_secret_hash(Config().COGNITO_CLIENT_ID, Config().COGNITO_CLIENT_SECRET, username)
+
+        # Call Cognito's InitiateAuth without holding a thread while it runs
+        cognito_client = await get_client("cognito-idp", region_name=Config().COGNITO_REGION_NAME)
+        response = await cognito_client.initiate_auth(
+            ClientId=Config().COGNITO_CLIENT_ID,
+            AuthFlow="USER_PASSWORD_AUTH",
+            AuthParameters={
+                "USERNAME": username,
+                "PASSWORD": password,
+                "SECRET_HASH": secret_hash,  # Include only if the app client has a secret
+            },
+        )
+
+        # Check if AuthenticationResult is in the response
+        if "AuthenticationResult" in response:
+            return jsonify({"token": response["AuthenticationResult"]}), 200
+        else:
+            return jsonify({"error": "Authentication failed. Check your credentials."}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
@@ -0,0 +1,224 @@
+from datetime import datetime
+
+from quart import Blueprint, jsonify, make_response, request
+from sqlalchemy import insert, select
+
+from async_db import async_db
+from async_idempotency import idempotent
+from async_middleware import cognito_required, current_user, rate_limit
+from config import Config
+from http_cache import is_not_modified, make_etag, set_cache_headers
+from models import CustomerOrder, OrderItem, Product
+from order_summary import summary_statements
+from product_cache import product_cache
+from routes.order_routes import (
+    encode_cursor, is_unfiltered, merge_order_items, order_history, order_history_params, order_items_query,
+    serialize_order_rows, stock_reservation,
+)
+from serializers import (
+    ORDER_COLUMNS, USER_SUMMARY_COLUMNS, OrderLine, serialize_order_header, serialize_order_item, serialize_user_summary,
+)
+
+async_order_bp = Blueprint("orders", __name__)
+
+
+@async_order_bp.route("/", methods=["POST"])
+@cognito_required
+@rate_limit("create_order", Config().ORDER_RATE_LIMIT, Config().ORDER_RATE_LIMIT_WINDOW, current_user)
+@idempotent
+async def create_order():
+    try:
+        # Extract data from the request
+        data = await request.get_json()
+        user_sub = request.user
+        items = data.get("items")  # List of items, each with product_id and quantity
+
+        if not user_sub:
+            return jsonify({"error": "User identifier (user_sub) is required"}), 400
+
+        if not items or not isinstance(items, list):
+            return jsonify({"error": "Order must include a list of items"}), 400
+
+        # Merge duplicate product_ids into a single line per product
+        quantities, invalid_item = merge_order_items(items)
+        if invalid_item is not None:
+            return jsonify({"error": f"Invalid item details: {invalid_item}"}), 400
+
+        # The session rolls back on every early return or error
+        async with async_db.session() as session:
+            # Fetch all ordered products in a single query
+            products, error = await load_order_products(session, quantities)
+            if error:
+                return error
+
+            total_price = 0
+            order_item_rows = []
+            response_items = []
+
+            # Reserve stock in id order so concurrent checkouts lock rows consistently
+            for product_id in sorted(quantities):
+                product = products[product_id]
+                quantity = quantities[product_id]
+
+                if product.deleted:
+                    return jsonify({"error": f"Product '{product.name}' is no longer available"}), 400
+
+                if product.stock < quantity or not await reserve_stock(session, product, quantity):
+                    return jsonify({"error": f"Insufficient stock for product '{product.name}'"}), 400
+
+                total_price += product.price * quantity
+                order_item_rows.append({
+                    "product_id": product.id,
+                    "quantity": quantity,
+                    "price": product.price,
+                })
+                response_items.append(serialize_order_item(OrderLine(product.id, product.name, quantity, product.price)))
+
+            # Create the CustomerOrder and flush it to get its ID
+            created_at = datetime.utcnow()
+            customer_order = CustomerOrder(user_sub=user_sub, total=total_price, created_at=created_at)
+            session.add(customer_order)
+            await session.flush()
+            order_id = customer_order.id
+
+            # Insert all order items in one executemany
+            for row in order_item_rows:
+                row["order_id"] = order_id
+            await session.execute(insert(OrderItem), order_item_rows)
+
+            # Add the order to the user and product summaries in the same transaction
+            dialect = session.bind.dialect.name
+            for statement in summary_statements(dialect, user_sub, total_price, created_at, order_item_rows):
+                await session.execute(statement)
+
+            await session.commit()
+
+        # Drop cached products whose stock changed
+        product_cache.invalidate(*quantities)
+
+        response = {
+            "message": "Order created successfully",
+            "order": {
+                "id": order_id,
+                "user_sub": user_sub,
+                "total": float(total_price),
+                "created_at": created_at.isoformat(),
+                "items": response_items,
+            },
+        }
+        return jsonify(response), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@async_order_bp.route("/", methods=["GET"])
+@cognito_required
+async def get_orders():
+    try:
+        params = order_history_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        user_sub = request.user
+
+        async with async_db.session(replica=True) as session:
+            orders = (await session.execute(
+                order_history(select(*ORDER_COLUMNS), user_sub, params).limit(params.limit + 1)
+            )).all()
+            if not orders and is_unfiltered(params):
+                return jsonify({"message": "No orders found for this user"}), 404
+
+            next_cursor = encode_cursor(orders[params.limit - 1]) if len(orders) > params.limit else None
+            orders = orders[:params.limit]
+            if params.include_items:
+                serialized = serialize_order_rows(orders, await session.execute(order_items_query(orders)))
+            else:
+                serialized = [serialize_order_header(order) for order in orders]
+
+        response = jsonify({"user_sub": user_sub, "orders": serialized})
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@async_order_bp.route("/summary", methods=["GET"])
+@cognito_required
+async def get_order_summary():
+    try:
+        user_sub = request.user
+
+        async with async_db.session(replica=True) as session:
+            summary = (await session.execute(select(*USER_SUMMARY_COLUMNS).filter_by(user_sub=user_sub))).first()
+        if not summary:
+            return jsonify({"user_sub": user_sub, "order_count": 0, "lifetime_total": 0.0, "last_order_at": None}), 200
+
+        return jsonify({"user_sub": user_sub, **serialize_user_summary(summary)}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@async_order_bp.route("/<int:order_id>", methods=["GET"])
+@cognito_required
+async def get_order(order_id):
+    try:
+        # Orders are immutable once created, so a cached copy only needs the order to still exist
+        cache_control = f"private, max-age={Config().ORDER_MAX_AGE}, immutable"
+
+        async with async_db.session(replica=True) as session:
+            order = (await session.execute(select(*ORDER_COLUMNS).filter_by(id=order_id))).first()
+            if not order:
+                return jsonify({"message": "Order not found"}), 404
+
+            etag = make_etag(order.id, order.created_at)
+            if is_not_modified(etag, order.created_at, request):
+                response = await make_response("", 304)
+                return set_cache_headers(response, etag, order.created_at, cache_control)
+
+            item_rows = await session.execute(order_items_query([order]))
+
+        response = serialize_order_rows([order], item_rows, include_user=True)[0]
+        return set_cache_headers(jsonify(response), etag, order.created_at, cache_control), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def load_order_products(session, quantities):
+    """
+    Fetch every ordered product in one IN query, locking the rows in skip_locked mode.
+    Returns (products by id, None) or (None, error response).
+    """
+    query = select(Product).where(Product.id.in_(quantities))
+    if Config().ORDER_STOCK_LOCKING == "skip_locked":
+        query = query.with_for_update(skip_locked=True)
+    products = {product.id: product for product in (await session.scalars(query)).all()}
+
+    for product_id in quantities:
+        if product_id in products:
+            continue
+        # A row skipped because another checkout holds its lock still exists
+        if Config().ORDER_STOCK_LOCKING == "skip_locked" and await session.scalar(
+            select(Product.id).where(Product.id == product_id)
+        ):
+            return None, (jsonify({"error": f"Product with ID {product_id} is being ordered, please retry"}), 409)
+        return None, (jsonify({"error": f"Product with ID {product_id} not found"}), 404)
+    return products, None
+
+
+async def reserve_stock(session, product, quantity):
+    """Decrement stock for a product, returning False if there is not enough left"""
+    if Config().ORDER_STOCK_LOCKING == "skip_locked":
+        # The row is already locked by this transaction
+        product.stock -= quantity
+        return True
+
+    result = await session.execute(
+        stock_reservation(product.id, quantity), execution_options={"synchronize_session": False}
+    )
+    return result.rowcount == 1
@@ -0,0 +1,260 @@
+from datetime import datetime, timezone
+
+from quart import Blueprint, jsonify, make_response, request
+from sqlalchemy import select
+
+from async_db import async_db
+from async_middleware import admin_required, cognito_required
+from async_s3 import spawn, upload_image_to_s3
+from config import Config
+from http_cache import is_not_modified, page_validators, set_cache_headers
+from models import Product, S3DeletionOutbox
+from product_cache import product_cache
+from product_search import index_product, unindex_product
+from routes.product_routes import image_restore, product_cache_entry
+from s3_outbox import image_object_keys, s3_deletion_worker
+from s3_utils import InvalidImageError
+from serializers import PRODUCT_COLUMNS, serialize_product
+
+async_product_bp = Blueprint("products", __name__)
+
+
+@async_product_bp.route("/", methods=["GET"])
+async def get_products():
+    try:
+        args = request.args
+        limit = min(args.get("limit", Config().PRODUCTS_PAGE_SIZE, type=int), Config().PRODUCTS_MAX_PAGE_SIZE)
+        cursor = args.get("cursor", type=int)
+        min_price = args.get("min_price", type=float)
+        max_price = args.get("max_price", type=float)
+        in_stock = args.get("in_stock", "false").lower() == "true"
+        name_prefix = args.get("name_prefix")
+
+        if limit <= 0:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+
+        # Query only products that are not flagged as deleted, one page at a time ordered by id
+        query = select(*PRODUCT_COLUMNS, Product.updated_at).filter_by(deleted=False)
+        if cursor is not None:
+            query = query.where(Product.id > cursor)
+        if min_price is not None:
+            query = query.where(Product.price >= min_price)
+        if max_price is not None:
+            query = query.where(Product.price <= max_price)
+        if in_stock:
+            query = query.where(Product.stock > 0)
+        if name_prefix:
+            query = query.where(Product.name.startswith(name_prefix, autoescape=True))
+
+        # Fetch one extra row to know whether another page exists
+        async with async_db.session(replica=True) as session:
+            products = (await session.execute(query.order_by(Product.id).limit(limit + 1))).all()
+
+        etag, last_modified = page_validators(request.query_string.decode(), products)
+        cache_control = f"public, max-age={Config().PRODUCTS_MAX_AGE}"
+        # Only the ETag revalidates a page: a row leaving it does not move the Last-Modified of the rest
+        if is_not_modified(etag, req=request):
+            return await not_modified_response(etag, last_modified, cache_control)
+
+        next_cursor = products[limit - 1].id if len(products) > limit else None
+        response = jsonify([serialize_product(product) for product in products[:limit]])
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = str(next_cursor)
+        return set_cache_headers(response, etag, last_modified, cache_control), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@async_product_bp.route("/<int:product_id>", methods=["GET"])
+async def get_product(product_id):
+    try:
+        # Serve the product from the cache, querying it by ID on a miss
+        cached = await product_cache.get_or_load_async(product_id, lambda: load_product(product_id))
+
+        # If product not found, return 404
+        if not cached:
+            return jsonify({"error": "Product not found"}), 404
+
+        etag = cached["etag"]
+        last_modified = datetime.fromtimestamp(cached["last_modified"], timezone.utc) if cached["last_modified"] else None
+        cache_control = f"public, max-age={Config().PRODUCT_MAX_AGE}"
+        if is_not_modified(etag, last_modified, request):
+            return await not_modified_response(etag, last_modified, cache_control)
+
+        return set_cache_headers(jsonify(cached["product"]), etag, last_modified, cache_control), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def load_product(product_id):
+    """Query a product by ID and build its cache entry. Returns None if the product does not exist."""
+    # Cache fills read the primary, so replica lag cannot re-cache a product that was just invalidated
+    async with async_db.session() as session:
+        product = (await session.execute(
+            select(*PRODUCT_COLUMNS, Product.deleted, Product.updated_at).where(Product.id == product_id)
+        )).first()
+    return product_cache_entry(product) if product else None
+
+
+async def not_modified_response(etag, last_modified=None, cache_control=None):
+    response = await make_response("", 304)
+    return set_cache_headers(response, etag, last_modified, cache_control)
+
+
+@async_product_bp.route("/", methods=["POST"])
+@cognito_required
+@admin_required
+async def create_product():
+    files = await request.files
+    if "file" not in files:
+        return jsonify({"error": "No image file provided"}), 400
+    file = files["file"]
+
+    upload = None
+    try:
+        # Start uploading the file to S3; its URL is known right away
+        upload = await upload_image_to_s3(file)
+
+        # Create a new product
+        data = await request.form
+        product = Product(
+            name=data["name"],
+            description=data["description"],
+            price=float(data["price"]),
+            stock=int(data["stock"]),
+            image_url=upload.url
+        )
+        async with async_db.session() as session:
+            session.add(product)
+            await session.commit()
+        product_cache.invalidate(product.id)
+        index_product(product)
+        watch_image_upload(upload, product.id, None)
+
+        # Build detailed response
+        response = {
+            "message": "Product created successfully",
+            "product": serialize_product(product),
+        }
+        return jsonify(response), 201
+    except InvalidImageError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        # Remove the uploaded image, as no product references it
+        if upload:
+            upload.discard()
+        return jsonify({"error": str(e)}), 500
+
+
+@async_product_bp.route("/<int:product_id>", methods=["PUT"])
+@cognito_required
+@admin_required
+async def edit_product(product_id):
+    new_upload = None
+    try:
+        async with async_db.session() as session:
+            product = await session.get(Product, product_id)
+            if not product:
+                return jsonify({"error": "Product not found"}), 404
+
+            # Parse request data
+            data = await request.form
+            if not data:
+                return jsonify({"error": "Invalid input data"}), 400
+
+            # Update fields if provided
+            if "name" in data:
+                product.name = data["name"]
+            if "description" in data:
+                product.description = data["description"]
+            if "price" in data:
+                product.price = data["price"]
+            if "stock" in data:
+                product.stock = data["stock"]
+
+            # Handle file upload for product image
+            previous_image_url = product.image_url
+            file = (await request.files).get("file")
+            if file:
+                # Start uploading the new image; the old one is queued for deletion once the upload succeeds
+                new_upload = await upload_image_to_s3(file)
+
+                # Update product image URL
+                product.image_url = new_upload.url
+
+            # Commit database changes only after successful operations, then reload the stored values
+            await session.commit()
+            await session.refresh(product)
+
+        product_cache.invalidate(product_id)
+        index_product(product)
+        s3_deletion_worker.notify()
+        if new_upload:
+            watch_image_upload(new_upload, product_id, previous_image_url)
+
+        return jsonify({
+            "message": "Product updated successfully",
+            "product": serialize_product(product),
+        }), 200
+
+    except InvalidImageError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        # If the new image was uploaded but the operation failed, clean it up once the upload finishes
+        if new_upload:
+            new_upload.discard()
+
+        return jsonify({"error": str(e)}), 500
+
+
+def watch_image_upload(upload, product_id, previous_image_url):
+    """Async variant of product_routes.watch_image_upload"""
+
+    def finished(task):
+        failed = task.cancelled() or task.exception() is not None
+        if failed or previous_image_url:
+            spawn(settle_image_upload(upload, product_id, previous_image_url, failed))
+
+    upload.task.add_done_callback(finished)
+
+
+async def settle_image_upload(upload, product_id, previous_image_url, failed):
+    try:
+        async with async_db.session() as session:
+            keys = []
+            if failed:
+                restored = (await session.execute(image_restore(product_id, upload.url, previous_image_url))).rowcount
+                keys += image_object_keys(upload.key)
+            if previous_image_url and not (failed and restored):
+                # Replaced by this upload, or by a later edit while it was running
+                keys += image_object_keys(previous_image_url.split("/")[-1])
+            session.add_all(S3DeletionOutbox(object_key=key) for key in keys)
+            await session.commit()
+    except Exception as e:
+        print(f"Failed to settle the image upload of product {product_id}: {e}")
+        return
+    if failed:
+        product_cache.invalidate(product_id)
+    s3_deletion_worker.notify()
+
+
+@async_product_bp.route("/<int:product_id>", methods=["DELETE"])
+@cognito_required
+@admin_required
+async def delete_product(product_id):
+    try:
+        async with async_db.session() as session:
+            # Fetch the product to delete
+            product = await session.get(Product, product_id)
+            if not product:
+                return jsonify({"error": "Product not found"}), 404
+
+            # Mark the product as deleted
+            product.deleted = True
+            await session.commit()
+        product_cache.invalidate(product_id)
+        unindex_product(product_id)
+
+        return jsonify({"message": "Product flagged as deleted successfully"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -2,17 +2,18 @@ import base64
 import hashlib
 import hmac
 
-import boto3
 from flask import Blueprint, request, jsonify
 
+from aws_clients import get_client
 from config import Config
+from rate_limit import client_ip, login_username, rate_limit
 
 auth_bp = Blueprint("auth", __name__)
 
-cognito_client = boto3.client("cognito-idp", region_name=Config().COGNITO_REGION_NAME)
-
 
 @auth_bp.route("/login", methods=["POST"])
+@rate_limit("login_ip", Config().LOGIN_IP_RATE_LIMIT, Config().LOGIN_IP_RATE_LIMIT_WINDOW, client_ip)
+@rate_limit("login_username", Config().LOGIN_USERNAME_RATE_LIMIT, Config().LOGIN_USERNAME_RATE_LIMIT_WINDOW, login_username)
 def login():
     data = request.json
     username = data.get("username")
@@ -26,6 +27,7 @@ def login():
         secret_hash = calculate_secret_hash(Config().COGNITO_CLIENT_ID, Config().COGNITO_CLIENT_SECRET, username)
 
         # Call Cognito's InitiateAuth
+        cognito_client = get_client("cognito-idp", region_name=Config().COGNITO_REGION_NAME)
         response = cognito_client.initiate_auth(
             ClientId=Config().COGNITO_CLIENT_ID,
             AuthFlow="USER_PASSWORD_AUTH",
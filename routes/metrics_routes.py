@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from metrics import render_metrics
+from middleware import admin_required, cognito_required
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+@cognito_required
+@admin_required
+def get_metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -1,16 +1,34 @@
-from datetime import datetime
+import base64
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import and_, insert, or_, select, update
 
+from config import Config
+from db_pool import read_replica
+from http_cache import is_not_modified, make_etag, not_modified_response, set_cache_headers
+from idempotency import idempotent
 from middleware import cognito_required
 from models import CustomerOrder, OrderItem, Product
 from models import db
+from order_summary import record_order
+from product_cache import product_cache
+from rate_limit import current_user, rate_limit
+from serializers import (
+    ORDER_COLUMNS, ORDER_ITEM_COLUMNS, USER_SUMMARY_COLUMNS, OrderLine, serialize_order, serialize_order_header,
+    serialize_order_item, serialize_user_summary,
+)
+from streaming import STREAM_BATCH_SIZE, streamed_response, wants_stream
 
 order_bp = Blueprint("orders", __name__)
 
 
 @order_bp.route("/", methods=["POST"])
 @cognito_required
+@rate_limit("create_order", Config().ORDER_RATE_LIMIT, Config().ORDER_RATE_LIMIT_WINDOW, current_user)
+@idempotent
 def create_order():
     try:
         # Extract data from the request
@@ -24,74 +42,81 @@ def create_order():
         if not items or not isinstance(items, list):
             return jsonify({"error": "Order must include a list of items"}), 400
 
-        # Initialize total price for the order
-        total_price = 0
-        order_items = []
+        # Merge duplicate product_ids into a single line per product
+        quantities, invalid_item = merge_order_items(items)
+        if invalid_item is not None:
+            return jsonify({"error": f"Invalid item details: {invalid_item}"}), 400
 
-        for item in items:
-            product_id = item.get("product_id")
-            quantity = item.get("quantity", 1)
+        # Fetch all ordered products in a single query
+        products, error = load_order_products(quantities)
+        if error:
+            return error
 
-            if not product_id or quantity <= 0:
-                return jsonify({"error": f"Invalid item details: {item}"}), 400
+        # Initialize total price for the order
+        total_price = 0
+        order_item_rows = []
+        response_items = []
 
-            # Fetch the product from the database
-            product = Product.query.get(product_id)
-            if not product:
-                return jsonify({"error": f"Product with ID {product_id} not found"}), 404
+        # Reserve stock in id order so concurrent checkouts lock rows consistently
+        for product_id in sorted(quantities):
+            product = products[product_id]
+            quantity = quantities[product_id]
 
             # Check if the product is marked as deleted
             if product.deleted:
+                db.session.rollback()
                 return jsonify({"error": f"Product '{product.name}' is no longer available"}), 400
 
-            if product.stock < quantity:
+            if product.stock < quantity or not reserve_stock(product, quantity):
+                db.session.rollback()
                 return jsonify({"error": f"Insufficient stock for product '{product.name}'"}), 400
 
-            # Calculate the price for this item and reduce product stock
+            # Calculate the price for this item
             item_price = product.price * quantity
             total_price += item_price
-            product.stock -= quantity  # Reduce stock
 
-            # Create an OrderItem object
-            order_item = OrderItem(
-                product_id=product.id,
-                quantity=quantity,
-                price=product.price
-            )
-            order_items.append(order_item)
+            # Collect the OrderItem row for a single bulk insert
+            order_item_rows.append({
+                "product_id": product.id,
+                "quantity": quantity,
+                "price": product.price,
+            })
+            response_items.append(serialize_order_item(OrderLine(product.id, product.name, quantity, product.price)))
 
-        # Create the CustomerOrder object
+        # Create the CustomerOrder object and flush it to get its ID
+        created_at = datetime.utcnow()
         customer_order = CustomerOrder(
             user_sub=user_sub,
             total=total_price,
-            created_at=datetime.utcnow()
+            created_at=created_at
         )
+        db.session.add(customer_order)
+        db.session.flush()
+        order_id = customer_order.id
 
-        # Add order items to the order
-        customer_order.items = order_items  # Assuming a relationship is defined in the model
+        # Insert all order items in one executemany
+        for row in order_item_rows:
+            row["order_id"] = order_id
+        db.session.execute(insert(OrderItem), order_item_rows)
+
+        # Add the order to the user and product summaries in the same transaction
+        record_order(user_sub, total_price, created_at, order_item_rows)
 
         # Save the order and associated items to the database
-        db.session.add(customer_order)
         db.session.commit()
 
-        # Build the response
+        # Drop cached products whose stock changed
+        product_cache.invalidate(*quantities)
+
+        # Build the response from the values already in hand, without querying again
         response = {
             "message": "Order created successfully",
             "order": {
-                "id": customer_order.id,
-                "user_sub": customer_order.user_sub,
-                "total": float(customer_order.total),
-                "created_at": customer_order.created_at.isoformat(),
-                "items": [
-                    {
-                        "product_id": item.product_id,
-                        "product_name": Product.query.get(item.product_id).name,
-                        "quantity": item.quantity,
-                        "price": float(item.price),
-                        "subtotal": float(item.quantity * item.price),
-                    }
-                    for item in order_items
-                ],
+                "id": order_id,
+                "user_sub": user_sub,
+                "total": float(total_price),
+                "created_at": created_at.isoformat(),
+                "items": response_items,
             },
         }
         return jsonify(response), 201
@@ -103,39 +128,186 @@ def create_order():
 
 @order_bp.route("/", methods=["GET"])
 @cognito_required
+@read_replica
 def get_orders():
+    try:
+        params = order_history_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         user_sub = request.user
 
-        # Query all orders for the given user
-        orders = CustomerOrder.query.filter_by(user_sub=user_sub).all()
+        # Stream large histories order by order instead of building the whole response in memory
+        if wants_stream():
+            query = order_history(CustomerOrder.query.with_entities(*ORDER_COLUMNS), user_sub, params)
+            if is_unfiltered(params) and not db.session.query(query.exists()).scalar():
+                return jsonify({"message": "No orders found for this user"}), 404
+            if "limit" in request.args:
+                query = query.limit(params.limit)
 
-        if not orders:
+            # Execute now so the server-side cursor is opened on the right database; rows are fetched lazily
+            orders, serialize = iter(query.yield_per(STREAM_BATCH_SIZE)), serialize_order_header
+            if params.include_items:
+                # Already serialized, with the items of each batch of orders
+                orders, serialize = stream_order_items(orders, db.session.get_bind()), lambda order: order
+            prefix = f'{{"user_sub": {current_app.json.dumps(user_sub)}, "orders": ['
+            return streamed_response(orders, serialize, prefix=prefix, suffix="]}")
+
+        # Query one page of the user's orders as plain rows, with one extra row to know whether another page exists
+        orders = db.session.execute(
+            order_history(select(*ORDER_COLUMNS), user_sub, params).limit(params.limit + 1)
+        ).all()
+
+        if not orders and is_unfiltered(params):
             return jsonify({"message": "No orders found for this user"}), 404
 
+        next_cursor = encode_cursor(orders[params.limit - 1]) if len(orders) > params.limit else None
+        orders = orders[:params.limit]
+
         # Build the response with order details
-        response = {
+        response = jsonify({
             "user_sub": user_sub,
-            "orders": [
-                {
-                    "order_id": order.id,
-                    "total": float(order.total),
-                    "created_at": order.created_at.isoformat(),
-                    "items": [
-                        {
-                            "product_id": item.product_id,
-                            "product_name": Product.query.get(item.product_id).name,
-                            "quantity": item.quantity,
-                            "price": float(item.price),
-                            "subtotal": float(item.quantity * item.price),
-                        }
-                        for item in order.items
-                    ],
-                }
-                for order in orders
+            "orders": serialize_orders(orders) if params.include_items else [
+                serialize_order_header(order) for order in orders
             ],
-        }
-        return jsonify(response), 200
+        })
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+OrderHistoryParams = namedtuple("OrderHistoryParams", ["limit", "cursor", "start", "end", "include_items"])
+
+
+def order_history_params(args):
+    """
+    Parse the query parameters of GET /orders/:
+    limit, cursor (from X-Next-Cursor), from (inclusive) and to (exclusive) as ISO dates or datetimes in UTC,
+    where a date-only to includes that whole day, and items=false to list order headers only.
+    Raises ValueError for an invalid parameter.
+    """
+    limit = min(args.get("limit", Config().ORDERS_PAGE_SIZE, type=int), Config().ORDERS_MAX_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    start = parse_timestamp(args["from"], "from") if args.get("from") else None
+    end = parse_timestamp(args["to"], "to") if args.get("to") else None
+    if end is not None and is_date(args["to"]):
+        end += timedelta(days=1)
+    include_items = args.get("items", "true").lower() == "true"
+    return OrderHistoryParams(limit, cursor, start, end, include_items)
+
+
+def is_unfiltered(params):
+    """Whether the whole history is requested, so that an empty result means the user has no orders (404)"""
+    return params.cursor is None and params.start is None and params.end is None
+
+
+def is_date(value):
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_timestamp(value, name):
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime") from None
+    # created_at is stored as naive UTC
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def encode_cursor(order):
+    """Opaque cursor pointing after an order: its (created_at, id) position in the history"""
+    position = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, order_id = position.split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise ValueError("cursor is invalid") from None
+
+
+def order_history(query, user_sub, params):
+    """
+    Filter a select() or query of orders to the user's orders in the requested date range, after the cursor,
+    newest first. Matches the (user_sub, created_at, id) index, so each page is a short index range scan.
+    """
+    query = query.filter(CustomerOrder.user_sub == user_sub)
+    if params.start is not None:
+        query = query.filter(CustomerOrder.created_at >= params.start)
+    if params.end is not None:
+        query = query.filter(CustomerOrder.created_at < params.end)
+    if params.cursor is not None:
+        created_at, order_id = params.cursor
+        query = query.filter(or_(
+            CustomerOrder.created_at < created_at,
+            and_(CustomerOrder.created_at == created_at, CustomerOrder.id < order_id),
+        ))
+    return query.order_by(CustomerOrder.created_at.desc(), CustomerOrder.id.desc())
+
+
+def stream_order_items(orders, bind):
+    """
+    Serialize streamed rows of ORDER_COLUMNS with their items, fetching the items of each batch of
+    STREAM_BATCH_SIZE orders in one query. The items are read on a separate connection of bind, since
+    on MySQL a connection cannot run another query while its server-side cursor is still open.
+    """
+    with bind.connect() as connection:
+        while batch := list(islice(orders, STREAM_BATCH_SIZE)):
+            yield from serialize_order_rows(batch, connection.execute(order_items_query(batch)))
+
+
+def serialize_orders(orders, include_user=False):
+    """Serialize rows of ORDER_COLUMNS, fetching the items of every order in one query"""
+    return serialize_order_rows(orders, db.session.execute(order_items_query(orders)), include_user)
+
+
+def order_items_query(orders):
+    """Select the items of the given orders as rows of ORDER_ITEM_COLUMNS"""
+    return (
+        select(*ORDER_ITEM_COLUMNS)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id.in_([order.id for order in orders]))
+        .order_by(OrderItem.id)
+    )
+
+
+def serialize_order_rows(orders, item_rows, include_user=False):
+    items = defaultdict(list)
+    for item in item_rows:
+        items[item.order_id].append(serialize_order_item(item))
+
+    return [serialize_order(order, items[order.id], include_user=include_user) for order in orders]
+
+
+@order_bp.route("/summary", methods=["GET"])
+@cognito_required
+@read_replica
+def get_order_summary():
+    try:
+        user_sub = request.user
+
+        # Read the precomputed summary row instead of aggregating the order history
+        summary = db.session.execute(select(*USER_SUMMARY_COLUMNS).filter_by(user_sub=user_sub)).first()
+        if not summary:
+            return jsonify({"user_sub": user_sub, "order_count": 0, "lifetime_total": 0.0, "last_order_at": None}), 200
+
+        return jsonify({"user_sub": user_sub, **serialize_user_summary(summary)}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -143,32 +315,103 @@ def get_orders():
 
 @order_bp.route("/<int:order_id>", methods=["GET"])
 @cognito_required
+@read_replica
 def get_order(order_id):
     try:
+        # Orders are immutable once created, so a cached copy only needs the order to still exist
+        cache_control = f"private, max-age={Config().ORDER_MAX_AGE}, immutable"
+        if request.if_none_match or request.if_modified_since:
+            created_at = db.session.query(CustomerOrder.created_at).filter_by(id=order_id).scalar()
+            if created_at:
+                etag = make_etag(order_id, created_at)
+                if is_not_modified(etag, created_at):
+                    return not_modified_response(etag, created_at, cache_control)
+
         # Query the specific order by its ID
-        order = CustomerOrder.query.get(order_id)
+        order = db.session.execute(select(*ORDER_COLUMNS).filter_by(id=order_id)).first()
 
         if not order:
             return jsonify({"message": "Order not found"}), 404
 
         # Build the order response
-        response = {
-            "order_id": order.id,
-            "user_sub": order.user_sub,
-            "total": float(order.total),
-            "created_at": order.created_at.isoformat(),
-            "items": [
-                {
-                    "product_id": item.product_id,
-                    "product_name": Product.query.get(item.product_id).name,
-                    "quantity": item.quantity,
-                    "price": float(item.price),
-                    "subtotal": float(item.quantity * item.price),
-                }
-                for item in order.items
-            ],
-        }
-        return jsonify(response), 200
+        response = serialize_orders([order], include_user=True)[0]
+        etag = make_etag(order.id, order.created_at)
+        return set_cache_headers(jsonify(response), etag, order.created_at, cache_control), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+def merge_order_items(items):
+    """
+    Sum the quantities of each product_id, read as integers (e.g. "3" or 3).
+    Returns (quantities, None) or (None, the first invalid item).
+    """
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict):
+            return None, item
+        product_id = as_int(item.get("product_id"))
+        quantity = as_int(item.get("quantity", 1))
+
+        if product_id is None or quantity is None or product_id <= 0 or quantity <= 0:
+            return None, item
+
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities, None
+
+
+def as_int(value):
+    """Return an integer, or a string or float holding one, as an int; anything else as None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, (int, str)):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
+
+
+def load_order_products(quantities):
+    """
+    Fetch every ordered product in one IN query.
+    In skip_locked mode the rows are locked with SELECT ... FOR UPDATE SKIP LOCKED.
+    Returns (products by id, None) or (None, error response).
+    """
+    query = Product.query.filter(Product.id.in_(quantities))
+    if Config().ORDER_STOCK_LOCKING == "skip_locked":
+        query = query.with_for_update(skip_locked=True)
+    products = {product.id: product for product in query.all()}
+
+    for product_id in quantities:
+        if product_id in products:
+            continue
+        db.session.rollback()
+        # A row skipped because another checkout holds its lock still exists
+        if Config().ORDER_STOCK_LOCKING == "skip_locked" and db.session.get(Product, product_id):
+            return None, (jsonify({"error": f"Product with ID {product_id} is being ordered, please retry"}), 409)
+        return None, (jsonify({"error": f"Product with ID {product_id} not found"}), 404)
+    return products, None
+
+
+def reserve_stock(product, quantity):
+    """Decrement stock for a product, returning False if there is not enough left"""
+    if Config().ORDER_STOCK_LOCKING == "skip_locked":
+        # The row is already locked by this transaction
+        product.stock -= quantity
+        return True
+
+    result = db.session.execute(stock_reservation(product.id, quantity), execution_options={"synchronize_session": False})
+    return result.rowcount == 1
+
+
+def stock_reservation(product_id, quantity):
+    """Single conditional UPDATE, so concurrent checkouts can never oversell"""
+    return (
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity, Product.deleted.is_(False))
+        .values(stock=Product.stock - quantity)
+    )
@@ -1,57 +1,225 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime, timezone
 
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import select, update
+
+from catalog_io import ImportFormatError, csv_response, export_rows, import_products, read_csv, read_ndjson
+from compression import cached_response
+from config import Config
+from db_pool import primary_database, read_replica
+from http_cache import as_utc, is_not_modified, make_etag, not_modified_response, page_validators, set_cache_headers
 from middleware import admin_required, cognito_required
-from models import Product, db
-from s3_utils import upload_file_to_s3, delete_file_from_s3
+from models import Product, ProductSalesSummary, db
+from product_cache import product_cache
+from product_search import index_product, search_products, tokenize, unindex_product
+from s3_outbox import enqueue_image_deletion, s3_deletion_worker
+from s3_utils import InvalidImageError, upload_image_to_s3
+from serializers import (
+    PRODUCT_COLUMNS, PRODUCT_STATS_COLUMNS, serialize_product, serialize_product_export, serialize_product_stats,
+)
+from streaming import NDJSON_MIMETYPE, STREAM_BATCH_SIZE, streamed_response, wants_ndjson, wants_stream
 
 product_bp = Blueprint("products", __name__)
 
 
 @product_bp.route("/", methods=["GET"])
+@read_replica
 def get_products():
     try:
-        # Query only products that are not flagged as deleted
-        products = Product.query.filter_by(deleted=False).all()
-        return jsonify([
-            {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": float(product.price),
-                "stock": product.stock,
-                "image_url": product.image_url
-            }
-            for product in products
-        ]), 200
+        args = request.args
+        limit = min(args.get("limit", Config().PRODUCTS_PAGE_SIZE, type=int), Config().PRODUCTS_MAX_PAGE_SIZE)
+        cursor = args.get("cursor", type=int)
+        min_price = args.get("min_price", type=float)
+        max_price = args.get("max_price", type=float)
+        in_stock = args.get("in_stock", "false").lower() == "true"
+        name_prefix = args.get("name_prefix")
+
+        if limit <= 0:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+
+        # Query only products that are not flagged as deleted, one page at a time ordered by id
+        query = Product.query.filter_by(deleted=False)
+        if cursor is not None:
+            query = query.filter(Product.id > cursor)
+        if min_price is not None:
+            query = query.filter(Product.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Product.price <= max_price)
+        if in_stock:
+            query = query.filter(Product.stock > 0)
+        if name_prefix:
+            query = query.filter(Product.name.startswith(name_prefix, autoescape=True))
+
+        # Streamed responses keep memory flat, so they are not capped to a page
+        if wants_stream():
+            query = query.order_by(Product.id).with_entities(*PRODUCT_COLUMNS)
+            if "limit" in args:
+                query = query.limit(limit)
+            # Execute now so the server-side cursor is opened on the right database; rows are fetched lazily
+            rows = iter(query.yield_per(STREAM_BATCH_SIZE))
+            return streamed_response(rows, serialize_product)
+
+        # Fetch one extra row to know whether another page exists
+        page = query.order_by(Product.id).limit(limit + 1)
+        cache_control = f"public, max-age={Config().PRODUCTS_MAX_AGE}"
+
+        # Plain rows of the listed columns; no ORM objects are built for a read-only listing
+        products = page.with_entities(*PRODUCT_COLUMNS, Product.updated_at).all()
+        etag, last_modified = page_validators(request.query_string.decode(), products)
+        # Only the ETag revalidates a page: a row leaving it does not move the Last-Modified of the rest
+        if is_not_modified(etag):
+            return not_modified_response(etag, last_modified, cache_control)
+
+        next_cursor = products[limit - 1].id if len(products) > limit else None
+        products = products[:limit]
+
+        def render():
+            response = jsonify([serialize_product(product) for product in products])
+            if next_cursor is not None:
+                response.headers["X-Next-Cursor"] = str(next_cursor)
+            return response
+
+        # Repeat requests for an unchanged page reuse the serialized and compressed body
+        response = cached_response(etag, render)
+        return set_cache_headers(response, etag, last_modified, cache_control), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@product_bp.route("/search", methods=["GET"])
+@read_replica
+def search_catalog():
+    try:
+        query = request.args.get("q", "")
+        limit = min(request.args.get("limit", Config().PRODUCTS_PAGE_SIZE, type=int), Config().PRODUCTS_MAX_PAGE_SIZE)
+        page = request.args.get("page", 1, type=int)
+
+        if not tokenize(query):
+            return jsonify({"error": "q must contain at least one search term"}), 400
+        if limit <= 0 or page <= 0:
+            return jsonify({"error": "limit and page must be positive integers"}), 400
+
+        # Rank matches by relevance, one page at a time
+        products, has_more = search_products(query, (page - 1) * limit, limit)
+
+        response = jsonify([serialize_product(product) for product in products])
+        if has_more:
+            response.headers["X-Next-Page"] = str(page + 1)
+        return response, 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@product_bp.route("/stats", methods=["GET"])
+@cognito_required
+@admin_required
+@read_replica
+def get_product_stats():
+    try:
+        limit = min(request.args.get("limit", Config().PRODUCTS_PAGE_SIZE, type=int), Config().PRODUCTS_MAX_PAGE_SIZE)
+        sort = request.args.get("sort", "revenue")
+        if limit <= 0:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        if sort not in ("revenue", "units_sold"):
+            return jsonify({"error": "sort must be 'revenue' or 'units_sold'"}), 400
+
+        # Top sellers straight from the sales summary, in a single query
+        rows = db.session.execute(
+            select(*PRODUCT_STATS_COLUMNS)
+            .join(Product, Product.id == ProductSalesSummary.product_id)
+            .order_by(getattr(ProductSalesSummary, sort).desc(), ProductSalesSummary.product_id)
+            .limit(limit)
+        )
+        return jsonify({"products": [serialize_product_stats(row) for row in rows]}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@product_bp.route("/import", methods=["POST"])
+@cognito_required
+@admin_required
+def import_catalog():
+    """
+    Create or update products from a CSV (text/csv) or NDJSON (application/x-ndjson) request body,
+    read and written in batches as it streams in. Rows with an id update that product.
+    """
+    try:
+        ndjson = request.args.get("format") == "ndjson" or request.mimetype == NDJSON_MIMETYPE
+        rows = read_ndjson(request.stream) if ndjson else read_csv(request.stream)
+        report = import_products(rows)
+        return jsonify(report), 400 if "error" in report else 200
+    except ImportFormatError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@product_bp.route("/export", methods=["GET"])
+@cognito_required
+@admin_required
+@read_replica
+def export_catalog():
+    """Stream every product as CSV (default) or NDJSON (?format=ndjson), in the import's format"""
+    try:
+        # Execute now so the server-side cursor is opened on the right database; rows are fetched lazily
+        rows = export_rows(Config().PRODUCT_IMPORT_BATCH_SIZE)
+        if wants_ndjson():
+            return streamed_response(rows, serialize_product_export)
+        return csv_response(rows, "products.csv")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @product_bp.route("/<int:product_id>", methods=["GET"])
+@read_replica
 def get_product(product_id):
     try:
-        # Query the product by ID
-        product = Product.query.get(product_id)
+        # Serve the product from the cache, querying it by ID on a miss
+        cached = product_cache.get_or_load(product_id, lambda: load_product(product_id))
 
         # If product not found, return 404
-        if not product:
+        if not cached:
             return jsonify({"error": "Product not found"}), 404
 
-        # Build the response
-        response = {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price": float(product.price),
-            "stock": product.stock,
-            "image_url": product.image_url,
-            "deleted": product.deleted,
-        }
-        return jsonify(response), 200
+        etag = cached["etag"]
+        last_modified = datetime.fromtimestamp(cached["last_modified"], timezone.utc) if cached["last_modified"] else None
+        cache_control = f"public, max-age={Config().PRODUCT_MAX_AGE}"
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified, cache_control)
+
+        response = cached_response(etag, lambda: jsonify(cached["product"]))
+        return set_cache_headers(response, etag, last_modified, cache_control), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def load_product(product_id):
+    """
+    Query a product by ID and build its cache entry: the response plus its validators.
+    Returns None if the product does not exist.
+    """
+    # Cache fills read the primary, so replica lag cannot re-cache a product that was just invalidated
+    with primary_database():
+        product = db.session.execute(
+            select(*PRODUCT_COLUMNS, Product.deleted, Product.updated_at).where(Product.id == product_id)
+        ).first()
+    return product_cache_entry(product) if product else None
+
+
+def product_cache_entry(product):
+    """
+    Build the cache entry of a row of PRODUCT_COLUMNS plus deleted and updated_at.
+    The ETag hashes the whole row: writes within the same second share an updated_at but not an ETag.
+    """
+    updated_at = as_utc(product.updated_at) if product.updated_at else None
+    return {
+        "product": serialize_product(product, include_deleted=True),
+        "etag": make_etag(*product),
+        "last_modified": updated_at.timestamp() if updated_at else None,
+    }
+
+
 @product_bp.route("/", methods=["POST"])
 @cognito_required
 @admin_required
@@ -60,9 +228,10 @@ def create_product():
         return jsonify({"error": "No image file provided"}), 400
     file = request.files["file"]
 
+    upload = None
     try:
-        # Upload the file to S3 and get the URL
-        image_url = upload_file_to_s3(file)
+        # Start uploading the file to S3; its URL is known right away
+        upload = upload_image_to_s3(file)
 
         # Create a new product
         data = request.form
@@ -71,25 +240,29 @@ def create_product():
             description=data["description"],
             price=float(data["price"]),
             stock=int(data["stock"]),
-            image_url=image_url
+            image_url=upload.url
         )
         db.session.add(product)
         db.session.commit()
+        product_cache.invalidate(product.id)
+        index_product(product)
+        watch_image_upload(upload, product.id, None)
 
         # Build detailed response
         response = {
             "message": "Product created successfully",
-            "product": {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": float(product.price),
-                "stock": product.stock,
-                "image_url": product.image_url,
-            }
+            "product": serialize_product(product),
         }
         return jsonify(response), 201
+    except InvalidImageError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
+
+        # Remove the uploaded image, as no product references it
+        if upload:
+            upload.discard()
         return jsonify({"error": str(e)}), 500
 
 
@@ -97,6 +270,7 @@ def create_product():
 @cognito_required
 @admin_required
 def edit_product(product_id):
+    new_upload = None
     try:
         # Start a database transaction
         product = Product.query.get(product_id)
@@ -119,52 +293,85 @@ def edit_product(product_id):
             product.stock = data["stock"]
 
         # Handle file upload for product image
-        new_image_url = None
+        previous_image_url = product.image_url
         if "file" in request.files:
             file = request.files["file"]
             if file:
-                # Step 1: Upload the new image
-                new_image_url = upload_file_to_s3(file)
-
-                # Step 2: Delete the old image if the new one was uploaded successfully
-                if product.image_url:
-                    old_file_key = product.image_url.split("/")[-1]
-                    delete_file_from_s3(old_file_key)
+                # Start uploading the new image; the old one is queued for deletion once the upload succeeds
+                new_upload = upload_image_to_s3(file)
 
                 # Update product image URL
-                product.image_url = new_image_url
+                product.image_url = new_upload.url
 
         # Commit database changes only after successful operations
         db.session.commit()
+        product_cache.invalidate(product_id)
+        index_product(product)
+        s3_deletion_worker.notify()
+        if new_upload:
+            watch_image_upload(new_upload, product_id, previous_image_url)
 
         return jsonify({
             "message": "Product updated successfully",
-            "product": {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": float(product.price),
-                "stock": product.stock,
-                "image_url": product.image_url
-            }
+            "product": serialize_product(product),
         }), 200
 
+    except InvalidImageError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         # Roll back database changes if an error occurs
         db.session.rollback()
 
-        # If the new image was uploaded but the operation failed, clean it up
-        if new_image_url:
-            new_file_key = new_image_url.split("/")[-1]
-            try:
-                delete_file_from_s3(new_file_key)
-            except Exception as cleanup_error:
-                # Log the cleanup error if needed
-                print(f"Failed to clean up new image: {cleanup_error}")
+        # If the new image was uploaded but the operation failed, clean it up once the upload finishes
+        if new_upload:
+            new_upload.discard()
 
         return jsonify({"error": str(e)}), 500
 
 
+def watch_image_upload(upload, product_id, previous_image_url):
+    """
+    Settle the product's image once its upload finishes, in a transaction of its own. Call once the new image_url has
+    committed. On success the previous image is queued for deletion. On failure the product points back at its
+    previous image (None for a new product) and the partly uploaded objects are queued instead.
+    """
+    app = current_app._get_current_object()
+
+    def finished(future):
+        failed = future.cancelled() or future.exception() is not None
+        if not failed and not previous_image_url:
+            return
+        with app.app_context():
+            try:
+                if failed:
+                    restored = db.session.execute(image_restore(product_id, upload.url, previous_image_url)).rowcount
+                    enqueue_image_deletion(upload.url)
+                if previous_image_url and not (failed and restored):
+                    # Replaced by this upload, or by a later edit while it was running
+                    enqueue_image_deletion(previous_image_url)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to settle the image upload of product {product_id}: {e}")
+                return
+        if failed:
+            product_cache.invalidate(product_id)
+        s3_deletion_worker.notify()
+
+    upload.future.add_done_callback(finished)
+
+
+def image_restore(product_id, image_url, previous_image_url):
+    """Set the product's image back to previous_image_url, unless a later edit has replaced image_url already"""
+    return (
+        update(Product)
+        .where(Product.id == product_id, Product.image_url == image_url)
+        .values(image_url=previous_image_url)
+        .execution_options(synchronize_session=False)
+    )
+
+
 @product_bp.route("/<int:product_id>", methods=["DELETE"])
 @cognito_required
 @admin_required
@@ -178,6 +385,8 @@ def delete_product(product_id):
         # Mark the product as deleted
         product.deleted = True
         db.session.commit()
+        product_cache.invalidate(product_id)
+        unindex_product(product_id)
 
         return jsonify({"message": "Product flagged as deleted successfully"}), 200
     except Exception as e:
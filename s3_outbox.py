@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import or_, select
+
+from config import Config
+from metrics import StatsCollector
+from models import Product, S3DeletionOutbox, db
+from s3_utils import IMAGE_VARIANTS, get_s3_client, is_uploaded_image, s3_url, variant_key
+
+# delete_objects accepts at most 1000 keys per call
+MAX_BATCH_SIZE = 1000
+
+
+def image_object_keys(file_key):
+    """Return the S3 keys of a product image and its variants, if it has any"""
+    if not is_uploaded_image(file_key):
+        return [file_key]
+    return [file_key, *(variant_key(file_key, variant) for variant in IMAGE_VARIANTS)]
+
+
+def referenced_keys(keys):
+    """
+    Return the keys among keys that still belong to a product's image, e.g. a key shared by several
+    imported products, or one a product was pointed at again after its deletion was queued.
+    """
+    # Variant keys drop the image's extension, so match products on the key without it, then check exactly
+    stems = {os.path.splitext(key.split("/")[-1])[0] for key in keys}
+    image_urls = db.session.execute(
+        select(Product.image_url).where(or_(*(Product.image_url.like(f"{s3_url(stem)}%") for stem in stems)))
+    ).scalars()
+    referenced = set()
+    for image_url in image_urls:
+        referenced.update(image_object_keys(image_url.split("/")[-1]))
+    return referenced & set(keys)
+
+
+def is_upload_object(key):
+    """Whether key is an uploaded image or one of its variants"""
+    folder, _, name = key.rpartition("/")
+    return (not folder or folder in IMAGE_VARIANTS) and is_uploaded_image(name)
+
+
+def enqueue_image_deletion(image_url):
+    """
+    Record a product image (and its variants) for deletion.
+    The rows are added to the current session, so they only exist if the caller's transaction commits.
+    """
+    file_key = image_url.split("/")[-1]
+    for key in image_object_keys(file_key):
+        db.session.add(S3DeletionOutbox(object_key=key))
+
+
+def enqueue_discarded_upload(app, image_url):
+    """Queue an uploaded image that no product references for deletion, in a transaction of its own"""
+    with app.app_context():
+        try:
+            enqueue_image_deletion(image_url)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to queue the discarded image {image_url} for deletion: {e}")
+            return
+    s3_deletion_worker.notify()
+
+
+class S3DeletionWorker:
+    """
+    Background worker that drains the S3 deletion outbox with batched delete_objects calls,
+    retrying failed keys with exponential backoff. Orphaned objects are found by the sweep-s3-orphans command.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.bucket_name = Config().S3_BUCKET_NAME
+        self.poll_interval = Config().S3_DELETION_POLL_INTERVAL
+        self.max_attempts = Config().S3_DELETION_MAX_ATTEMPTS
+        self.orphan_min_age = Config().S3_ORPHAN_MIN_AGE
+
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.deleted = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.last_batch_seconds = 0.0
+
+    def init_app(self, app):
+        """Keep the app for the worker thread and register the sweep-s3-orphans CLI command"""
+        self.app = app
+
+        @app.cli.command("sweep-s3-orphans")
+        def sweep_command():
+            """Queue uploaded images that no product references for deletion."""
+            click.echo(f"Queued {self.sweep_orphans()} orphaned S3 objects for deletion")
+
+    def start(self):
+        """Start the worker thread if it is enabled. Threads do not survive a fork, so call this in each worker."""
+        if not Config().S3_DELETION_WORKER or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name="s3-deletion-worker", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wake the worker up after a transaction that enqueued deletions has committed"""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    # Keep draining while full batches are coming back
+                    while self.process_batch() == MAX_BATCH_SIZE:
+                        pass
+            except Exception as e:
+                print(f"S3 deletion worker failed: {e}")
+
+    def process_batch(self):
+        """Delete up to MAX_BATCH_SIZE due keys in one delete_objects call. Returns the number of rows handled."""
+        now = datetime.utcnow()
+        entries = (
+            S3DeletionOutbox.query
+            .filter(S3DeletionOutbox.next_attempt_at <= now, S3DeletionOutbox.attempts < self.max_attempts)
+            .order_by(S3DeletionOutbox.id)
+            .limit(MAX_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not entries:
+            db.session.commit()
+            return 0
+
+        started = time.perf_counter()
+        keys = {entry.object_key for entry in entries}
+        # Objects a product still shows are kept, and their entries dropped
+        in_use = referenced_keys(keys)
+        keys -= in_use
+
+        errors = {}
+        try:
+            if keys:
+                response = get_s3_client().delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+                )
+                errors = {error["Key"]: error.get("Message", error.get("Code")) for error in response.get("Errors", [])}
+        except Exception as e:
+            errors = {key: str(e) for key in keys}
+
+        for entry in entries:
+            if entry.object_key in errors:
+                # Back off exponentially: 2, 4, 8, ... seconds, capped at one hour
+                entry.attempts += 1
+                entry.last_error = errors[entry.object_key]
+                entry.next_attempt_at = now + timedelta(seconds=min(2 ** entry.attempts, 3600))
+                self.failed += 1
+            else:
+                db.session.delete(entry)
+                if entry.object_key in in_use:
+                    self.skipped += 1
+                else:
+                    self.deleted += 1
+        db.session.commit()
+
+        self.batches += 1
+        self.last_batch_seconds = time.perf_counter() - started
+        return len(entries)
+
+    def sweep_orphans(self):
+        """
+        Enqueue uploaded images and variants that no product image references. Other objects in the bucket,
+        including images named by a catalog import, are never touched. Lists the whole bucket, so it runs as
+        a command (e.g. from a daily cron job on one host) rather than in every worker.
+        Returns the number of keys enqueued.
+        """
+        referenced = set()
+        for (image_url,) in db.session.query(Product.image_url).filter(Product.image_url.isnot(None)):
+            referenced.update(image_object_keys(image_url.split("/")[-1]))
+        referenced.update(key for (key,) in db.session.query(S3DeletionOutbox.object_key))
+
+        # Skip recent objects, which may belong to uploads whose product is not committed yet
+        cutoff = datetime.utcnow() - timedelta(seconds=self.orphan_min_age)
+        orphans = []
+        for page in get_s3_client().get_paginator("list_objects_v2").paginate(Bucket=self.bucket_name):
+            for obj in page.get("Contents", []):
+                key, modified = obj["Key"], obj["LastModified"].replace(tzinfo=None)
+                if is_upload_object(key) and key not in referenced and modified < cutoff:
+                    orphans.append(key)
+
+        db.session.add_all(S3DeletionOutbox(object_key=key) for key in orphans)
+        db.session.commit()
+        return len(orphans)
+
+    def stats(self):
+        return {
+            "queue_depth": S3DeletionOutbox.query.filter(S3DeletionOutbox.attempts < self.max_attempts).count(),
+            "dead_letters": S3DeletionOutbox.query.filter(S3DeletionOutbox.attempts >= self.max_attempts).count(),
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "last_batch_seconds": self.last_batch_seconds,
+        }
+
+
+s3_deletion_worker = S3DeletionWorker()
+StatsCollector("s3_deletion", s3_deletion_worker.stats, "S3 deletion outbox")
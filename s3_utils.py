@@ -1,17 +1,32 @@
+import functools
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
 import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-import boto3
-from botocore.exceptions import NoCredentialsError
+from flask import current_app
 from werkzeug.utils import secure_filename
 
+from aws_clients import get_client
 from config import Config
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=Config().AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=Config().AWS_SECRET_ACCESS_KEY,
-    region_name=Config().S3_REGION_NAME,
-)
+# Resized variants stored next to the original as <variant>/<name>.jpg
+IMAGE_VARIANTS = {
+    "thumbnail": (200, 200),
+    "medium": (800, 800),
+}
+
+# Uploaded images are stored as <uuid4 hex>_<file name>; only these get resized variants
+UPLOADED_IMAGE_KEY = re.compile(r"[0-9a-f]{32}_[^/]+")
+
+upload_executor = ThreadPoolExecutor(max_workers=Config().S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+upload_slots = threading.BoundedSemaphore(Config().S3_UPLOAD_QUEUE_SIZE)
+_image_executor = None
+_image_executor_lock = threading.Lock()
 
 
 def upload_file_to_s3(file, bucket_name=Config().S3_BUCKET_NAME):
@@ -19,6 +34,8 @@ def upload_file_to_s3(file, bucket_name=Config().S3_BUCKET_NAME):
     Uploads a file to an S3 bucket and returns the file's URL.
     Ensures unique filenames by appending a UUID.
     """
+    from botocore.exceptions import NoCredentialsError
+
     try:
         # Secure the original filename
         original_filename = secure_filename(file.filename)
@@ -26,23 +43,202 @@ def upload_file_to_s3(file, bucket_name=Config().S3_BUCKET_NAME):
         unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
 
         # Upload the file to S3
-        s3_client.upload_fileobj(
+        get_s3_client().upload_fileobj(
             file,
             bucket_name,
             unique_filename,
             ExtraArgs={"ContentType": file.content_type},  # Remove ACL
+            Config=transfer_config(),
         )
 
         # Return the S3 URL of the uploaded file
-        s3_url = f"https://{bucket_name}.s3.{Config().S3_REGION_NAME}.amazonaws.com/{unique_filename}"
-        return s3_url
+        return s3_url(unique_filename, bucket_name)
     except NoCredentialsError:
         raise Exception("AWS credentials not available")
 
 
+class InvalidImageError(ValueError):
+    """The uploaded file is not an image that variants can be generated from"""
+
+
+class ImageUpload:
+    """A product image upload running in the background"""
+
+    def __init__(self, key, url, future):
+        self.key = key
+        self.url = url
+        self.future = future
+
+    def discard(self):
+        """
+        Queue the uploaded objects for deletion once the upload has finished (or right away if it already has).
+        Call inside an app context.
+        """
+        from s3_outbox import enqueue_discarded_upload  # s3_outbox imports this module
+
+        app = current_app._get_current_object()
+        self.future.add_done_callback(lambda _: enqueue_discarded_upload(app, self.url))
+
+
+def upload_image_to_s3(file, bucket_name=Config().S3_BUCKET_NAME):
+    """
+    Starts uploading a product image and its resized variants, and returns an ImageUpload.
+    The URL is known up front so the product can be saved without waiting for S3.
+    """
+    original_filename = secure_filename(file.filename)
+    unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
+
+    # The request's file is closed when the request ends, so spool it to disk in chunks
+    fd, path = tempfile.mkstemp(prefix="upload-")
+    with os.fdopen(fd, "wb") as spool:
+        file.save(spool)
+
+    # Reject files the resizer cannot read before any product points at them
+    try:
+        verify_image(path)
+    except InvalidImageError:
+        os.remove(path)
+        raise
+
+    if not Config().S3_ASYNC_UPLOADS:
+        process_image_upload(path, unique_filename, file.content_type, bucket_name)
+        future = Future()
+        future.set_result(None)
+        return ImageUpload(unique_filename, s3_url(unique_filename, bucket_name), future)
+
+    # Wait for a free slot so queued uploads (and their temp files) stay bounded
+    upload_slots.acquire()
+    try:
+        future = upload_executor.submit(process_image_upload, path, unique_filename, file.content_type, bucket_name)
+    except Exception:
+        upload_slots.release()
+        os.remove(path)
+        raise
+    future.add_done_callback(lambda _: upload_slots.release())
+    future.add_done_callback(log_upload_failure)
+    return ImageUpload(unique_filename, s3_url(unique_filename, bucket_name), future)
+
+
+def process_image_upload(path, key, content_type, bucket_name):
+    """Upload the original image, then generate and upload its variants. Runs on the upload pool."""
+    variant_paths = {}
+    try:
+        get_s3_client().upload_file(path, bucket_name, key, ExtraArgs={"ContentType": content_type}, Config=transfer_config())
+
+        try:
+            variant_paths = get_image_executor().submit(resize_image, path, IMAGE_VARIANTS).result()
+        except BrokenProcessPool:
+            reset_image_executor()
+            raise
+        for variant, variant_path in variant_paths.items():
+            get_s3_client().upload_file(
+                variant_path,
+                bucket_name,
+                variant_key(key, variant),
+                ExtraArgs={"ContentType": "image/jpeg"},
+                Config=transfer_config(),
+            )
+    finally:
+        for temp_path in [path, *variant_paths.values()]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def verify_image(path):
+    """Raise InvalidImageError unless the file is an image Pillow can decode. Only reads the headers."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        raise InvalidImageError("The uploaded file is not a supported image") from None
+
+
+def resize_image(path, variants):
+    """Write a resized, recompressed JPEG per variant and return their paths. Runs in a worker process."""
+    from PIL import Image
+
+    variant_paths = {}
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        for variant, size in variants.items():
+            resized = image.copy()
+            resized.thumbnail(size)
+            variant_paths[variant] = f"{path}.{variant}.jpg"
+            resized.save(variant_paths[variant], "JPEG", quality=80, optimize=True, progressive=True)
+    return variant_paths
+
+
+@functools.cache
+def transfer_config():
+    """Multipart uploads in 8 MB parts, streamed from the file object"""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024)
+
+
+def get_image_executor():
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            # Spawn rather than fork, as the upload threads may hold locks at fork time
+            _image_executor = ProcessPoolExecutor(
+                max_workers=Config().IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _image_executor
+
+
+def reset_image_executor():
+    """Drop a broken worker pool so the next upload starts a fresh one"""
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is not None:
+            _image_executor.shutdown(wait=False, cancel_futures=True)
+            _image_executor = None
+
+
+def log_upload_failure(future):
+    if not future.cancelled() and future.exception():
+        print(f"Failed to upload image: {future.exception()}")
+
+
+def get_s3_client():
+    return get_client(
+        "s3",
+        region_name=Config().S3_REGION_NAME,
+        aws_access_key_id=Config().AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=Config().AWS_SECRET_ACCESS_KEY,
+    )
+
+
+def s3_url(key, bucket_name=Config().S3_BUCKET_NAME):
+    return f"https://{bucket_name}.s3.{Config().S3_REGION_NAME}.amazonaws.com/{key}"
+
+
+def variant_key(key, variant):
+    return f"{variant}/{os.path.splitext(key)[0]}.jpg"
+
+
+def is_uploaded_image(key):
+    """Whether key is an image uploaded through the API, as opposed to an object named by a catalog import"""
+    return UPLOADED_IMAGE_KEY.fullmatch(key) is not None
+
+
+def image_variant_urls(image_url):
+    """Return the URLs of the resized variants of a product image, or None if it has no variants"""
+    if not image_url:
+        return None
+    base_url, key = image_url.rsplit("/", 1)
+    if not is_uploaded_image(key):
+        return None
+    return {variant: f"{base_url}/{variant_key(key, variant)}" for variant in IMAGE_VARIANTS}
+
+
 def delete_file_from_s3(file_key, bucket_name=Config().S3_BUCKET_NAME):
     try:
-        s3_client.delete_object(Bucket=bucket_name, Key=file_key)
+        get_s3_client().delete_object(Bucket=bucket_name, Key=file_key)
         return True
     except Exception as e:
         raise Exception(f"Failed to delete file: {str(e)}")
+
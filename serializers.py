@@ -0,0 +1,149 @@
+from collections import namedtuple
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+
+from models import CustomerOrder, OrderItem, Product, ProductSalesSummary, UserOrderSummary
+from s3_utils import image_variant_urls
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+
+def compile_serializer(fields):
+    """
+    Build a function mapping a row to a dict from (output name, attribute, converter) fields.
+    The attributes are read with a single precompiled attrgetter, so the same serializer works
+    for ORM objects and Core rows.
+    """
+    names = tuple(name for name, _, _ in fields)
+    getter = attrgetter(*(attribute for _, attribute, _ in fields))
+    converters = tuple(converter for _, _, converter in fields)
+
+    def serialize(row):
+        return {
+            name: converter(value) if converter is not None and value is not None else value
+            for name, value, converter in zip(names, getter(row), converters)
+        }
+
+    return serialize
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+# Columns selected by read-only product paths, matching the fields below
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.description, Product.price, Product.stock, Product.image_url)
+
+_product_fields = compile_serializer([
+    ("id", "id", None),
+    ("name", "name", None),
+    ("description", "description", None),
+    ("price", "price", float),
+    ("stock", "stock", None),
+    ("image_url", "image_url", None),
+])
+
+
+def serialize_product(product, include_deleted=False):
+    """Serialize a Product or a row of PRODUCT_COLUMNS (plus deleted when include_deleted is set)"""
+    data = _product_fields(product)
+    data["image_variants"] = image_variant_urls(product.image_url)
+    if include_deleted:
+        data["deleted"] = product.deleted
+    return data
+
+
+# The catalog export writes the same fields the import reads
+serialize_product_export = _product_fields
+
+
+# Columns selected by read-only order paths
+ORDER_COLUMNS = (CustomerOrder.id, CustomerOrder.user_sub, CustomerOrder.total, CustomerOrder.created_at)
+ORDER_ITEM_COLUMNS = (
+    OrderItem.order_id, OrderItem.product_id, Product.name.label("product_name"), OrderItem.quantity, OrderItem.price
+)
+
+# Order line built in memory while placing an order, serialized like an OrderItem
+OrderLine = namedtuple("OrderLine", ["product_id", "product_name", "quantity", "price"])
+
+_order_item_fields = compile_serializer([
+    ("product_id", "product_id", None),
+    ("product_name", "product_name", None),
+    ("quantity", "quantity", None),
+    ("price", "price", float),
+])
+
+
+def serialize_order_item(item):
+    """Serialize an OrderItem, an OrderLine or a row of ORDER_ITEM_COLUMNS"""
+    data = _order_item_fields(item)
+    data["subtotal"] = float(item.quantity * item.price)
+    return data
+
+
+_order_fields = compile_serializer([
+    ("order_id", "id", None),
+    ("total", "total", float),
+    ("created_at", "created_at", isoformat),
+])
+
+
+# Order headers without their items, for list views
+serialize_order_header = _order_fields
+
+
+def serialize_order(order, items, include_user=False):
+    """Serialize an order header with its already serialized items"""
+    data = _order_fields(order)
+    if include_user:
+        data["user_sub"] = order.user_sub
+    data["items"] = items
+    return data
+
+
+# Columns selected for the order and sales summaries
+USER_SUMMARY_COLUMNS = (UserOrderSummary.order_count, UserOrderSummary.lifetime_total, UserOrderSummary.last_order_at)
+PRODUCT_STATS_COLUMNS = (
+    ProductSalesSummary.product_id, Product.name.label("product_name"), ProductSalesSummary.units_sold,
+    ProductSalesSummary.revenue,
+)
+
+serialize_user_summary = compile_serializer([
+    ("order_count", "order_count", None),
+    ("lifetime_total", "lifetime_total", float),
+    ("last_order_at", "last_order_at", isoformat),
+])
+
+serialize_product_stats = compile_serializer([
+    ("product_id", "product_id", None),
+    ("product_name", "product_name", None),
+    ("units_sold", "units_sold", None),
+    ("revenue", "revenue", float),
+])
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, keeping the default provider's sorted keys and type handling."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(f"{self.dumps(obj)}\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Use orjson for request and response bodies when it is installed"""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,40 @@
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Rows fetched per round trip while streaming
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson():
+    return request.args.get("format") == "ndjson" or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def wants_stream():
+    """Whether the client asked for a streamed response (?stream=true or NDJSON)"""
+    return request.args.get("stream", "false").lower() == "true" or wants_ndjson()
+
+
+def streamed_response(rows, serialize, prefix="[", suffix="]"):
+    """
+    Stream rows as a JSON array (wrapped in prefix/suffix) or as NDJSON, one chunk per row.
+    rows should be a lazily fetched result so memory stays flat regardless of row count.
+    """
+    dumps = current_app.json.dumps
+
+    if wants_ndjson():
+        def generate():
+            for row in rows:
+                yield dumps(serialize(row)) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+    def generate():
+        yield prefix
+        separator = ""
+        for row in rows:
+            yield separator + dumps(serialize(row))
+            separator = ","
+        yield suffix
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
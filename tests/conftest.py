@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Config reads the environment at import time, so the test settings are set before any app module is imported
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="ecommerce-tests-"), "test.db")
+os.environ.update({
+    "SQLALCHEMY_DATABASE_URI": f"sqlite:///{DATABASE_PATH}",
+    "COGNITO_REGION_NAME": "us-east-1",
+    "S3_REGION_NAME": "us-east-1",
+    "S3_BUCKET_NAME": "test-bucket",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "WARMUP_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "S3_DELETION_WORKER": "false",
+})
+
+import jwt  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from jwt.algorithms import RSAAlgorithm  # noqa: E402
+
+
+class StubJWKSServer:
+    """Local HTTP server standing in for the Cognito JWKS endpoint, signing tokens with its own RSA keys."""
+
+    def __init__(self):
+        self.keys = {}
+        self.requests = 0
+        self.fail = False
+        self.delay = 0
+        self.add_key("key-1")
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.delay)
+                if server.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = json.dumps({"keys": [server.public_jwk(kid) for kid in server.keys]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/.well-known/jwks.json"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def add_key(self, kid):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def public_jwk(self, kid):
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.keys[kid].public_key()))
+        return {**jwk, "kid": kid, "alg": "RS256", "use": "sig"}
+
+    def token(self, sub="user-1", groups=(), kid="key-1", expires_in=3600):
+        claims = {"sub": sub, "username": sub, "cognito:groups": list(groups), "exp": int(time.time()) + expires_in}
+        return jwt.encode(claims, self.keys[kid], algorithm="RS256", headers={"kid": kid})
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture(scope="session")
+def jwks_server():
+    server = StubJWKSServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def app(jwks_server):
+    from app import create_app
+    from compression import response_cache
+    from jwks_cache import jwks_key_store
+    from models import db
+    from product_cache import product_cache
+    from product_search import search_index
+    from token_cache import token_cache
+
+    # Verify tokens against the stub server
+    jwks_key_store._url = jwks_server.url
+    jwks_key_store.clear()
+    token_cache.clear()
+    product_cache.clear()
+    response_cache.clear()
+    search_index.invalidate()
+    jwks_server.fail = False
+    jwks_server.delay = 0
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(jwks_server):
+    def headers(sub="user-1", admin=False):
+        token = jwks_server.token(sub=sub, groups=["admin"] if admin else [])
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Record the SQL statements run inside a block:
+        with count_queries() as statements: ...
+    """
+    from sqlalchemy import event
+
+    from models import db
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    return counter
+
+
+@pytest.fixture
+def s3(app):
+    """In-memory S3 (moto) with the product bucket created"""
+    from moto import mock_aws
+
+    import aws_clients
+    from config import Config
+
+    with mock_aws():
+        # Clients created outside the mock would talk to real AWS
+        aws_clients._clients.clear()
+        client = aws_clients.get_client("s3", region_name=Config().S3_REGION_NAME)
+        client.create_bucket(Bucket=Config().S3_BUCKET_NAME)
+        yield client
+        aws_clients._clients.clear()
+
+
+def wait_for(condition, timeout=15):
+    """Poll condition() until it returns a truthy value, for work finished by background threads"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = condition()
+        if result or time.monotonic() > deadline:
+            return result
+        time.sleep(0.05)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert
+
+from models import CustomerOrder, Product, db
+
+# The ASGI app needs requirements-async.txt
+for module in ("quart", "aiosqlite", "aiobotocore"):
+    pytest.importorskip(module)
+
+
+@pytest.fixture
+def asgi_app(app):
+    """The ASGI app, sharing the test database with the sync app"""
+    from asgi import app as asgi_app
+
+    with app.app_context():
+        db.session.execute(insert(Product), [{"name": "Widget", "description": "d", "price": 5, "stock": 50}])
+        db.session.commit()
+    return asgi_app
+
+
+def run(asgi_app, requests):
+    """Send (json, headers) order requests in turn; returns (status, json, headers) per response"""
+
+    async def send():
+        responses = []
+        # Runs the startup and shutdown hooks, which open the HTTP clients and close the pooled connections
+        async with asgi_app.test_app() as test_app:
+            client = test_app.test_client()
+            for body, headers in requests:
+                response = await client.post("/orders/", json=body, headers=headers)
+                responses.append((response.status_code, await response.get_json(), response.headers))
+        return responses
+
+    return asyncio.run(send())
+
+
+def test_duplicate_order_is_replayed(app, asgi_app, auth_headers):
+    headers = {**auth_headers(), "Idempotency-Key": "order-1"}
+    body = {"items": [{"product_id": 1, "quantity": 2}]}
+
+    (first_status, first, _), (second_status, second, second_headers) = run(asgi_app, [(body, headers), (body, headers)])
+
+    assert (first_status, second_status) == (201, 201)
+    assert second == first
+    assert second_headers["Idempotent-Replayed"] == "true"
+    with app.app_context():
+        assert CustomerOrder.query.count() == 1
+        assert db.session.get(Product, 1).stock == 48
+
+
+def test_key_reused_for_another_order_is_rejected(app, asgi_app, auth_headers):
+    headers = {**auth_headers(), "Idempotency-Key": "order-1"}
+    first, second = run(asgi_app, [
+        ({"items": [{"product_id": 1, "quantity": 2}]}, headers),
+        ({"items": [{"product_id": 1, "quantity": 3}]}, headers),
+    ])
+
+    assert (first[0], second[0]) == (201, 422)
+    with app.app_context():
+        assert CustomerOrder.query.count() == 1
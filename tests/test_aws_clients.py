@@ -0,0 +1,46 @@
+import pytest
+
+import aws_clients
+from config import Config
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """aws_clients with a fresh session, dropped after the test: moto only mocks sessions created after its import"""
+    monkeypatch.setattr(aws_clients, "_pid", None)
+    monkeypatch.setattr(aws_clients, "_session", None)
+    monkeypatch.setattr(aws_clients, "_clients", {})
+    return aws_clients
+
+
+def test_clients_use_the_configured_pool_and_retries(clients, monkeypatch):
+    monkeypatch.setattr(Config, "AWS_MAX_POOL_CONNECTIONS", 7)
+    monkeypatch.setattr(Config, "AWS_RETRY_MODE", "standard")
+    monkeypatch.setattr(Config, "AWS_MAX_ATTEMPTS", 3)
+
+    client = clients.get_client("s3", region_name="us-east-1")
+
+    assert client.meta.config.max_pool_connections == 7
+    assert client._endpoint.http_session._max_pool_connections == 7
+    assert client.meta.config.tcp_keepalive is True
+    # AWS_MAX_ATTEMPTS counts the first attempt too
+    assert client.meta.config.retries == {"mode": "standard", "total_max_attempts": 3}
+
+
+def test_clients_are_reused(clients):
+    client = clients.get_client("s3", region_name="us-east-1")
+
+    assert clients.get_client("s3", region_name="us-east-1") is client
+    assert clients.get_client("s3", region_name="eu-west-1") is not client
+    assert clients.get_client("cognito-idp", region_name="us-east-1") is not client
+
+
+def test_clients_are_rebuilt_after_a_fork(clients, monkeypatch):
+    client = clients.get_client("s3", region_name="us-east-1")
+
+    # As in a worker forked after the master created the client
+    monkeypatch.setattr(clients, "_pid", -1)
+    forked = clients.get_client("s3", region_name="us-east-1")
+
+    assert forked is not client
+    assert clients.get_client("s3", region_name="us-east-1") is forked
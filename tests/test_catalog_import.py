@@ -0,0 +1,105 @@
+import pytest
+
+from models import Product, S3DeletionOutbox, db
+from s3_utils import s3_url
+
+UPLOADED_KEY = "0123456789abcdef0123456789abcdef_lamp.png"
+
+
+def import_csv(client, auth_headers, body):
+    return client.post("/products/import", data=body, content_type="text/csv", headers=auth_headers(admin=True))
+
+
+def test_blank_cells_leave_an_existing_product_unchanged(app, client, auth_headers):
+    with app.app_context():
+        db.session.add(Product(name="Lamp", description="Desk lamp", price=20, stock=3, image_url=s3_url("lamp.png")))
+        db.session.commit()
+
+    response = import_csv(client, auth_headers, "id,name,description,price,stock,image_url,image_key\n1,Floor lamp,,,,,\n")
+
+    assert response.get_json()["updated"] == 1
+    with app.app_context():
+        product = db.session.get(Product, 1)
+        assert (product.name, product.description, product.price, product.stock) == ("Floor lamp", "Desk lamp", 20, 3)
+        assert product.image_url == s3_url("lamp.png")
+        assert S3DeletionOutbox.query.count() == 0
+
+
+def test_blank_cells_of_a_new_product_are_null(app, client, auth_headers):
+    response = import_csv(client, auth_headers, "name,description,price,stock,image_key\nLamp,,20,3,\n")
+
+    assert response.get_json()["inserted"] == 1
+    with app.app_context():
+        product = db.session.get(Product, 1)
+        assert (product.description, product.image_url) == (None, None)
+
+
+def test_ndjson_null_clears_a_column(app, client, auth_headers):
+    with app.app_context():
+        db.session.add(Product(name="Lamp", description="Desk lamp", price=20, stock=3))
+        db.session.commit()
+
+    response = client.post("/products/import?format=ndjson", data='{"id": 1, "description": null}\n',
+                           headers=auth_headers(admin=True))
+
+    assert response.get_json()["updated"] == 1
+    with app.app_context():
+        assert db.session.get(Product, 1).description is None
+
+
+@pytest.mark.parametrize("rows", [2, 40])
+def test_a_batch_takes_a_fixed_number_of_statements(app, client, auth_headers, count_queries, rows):
+    with app.app_context():
+        db.session.add_all(Product(name=f"Product {i}", price=1, stock=1) for i in range(rows))
+        db.session.commit()
+    body = "id,name,price,stock\n" + "".join(
+        f"{i + 1},Renamed {i},2,3\n" if i % 2 else f",New {i},2,3\n" for i in range(rows)
+    )
+
+    with count_queries() as statements:
+        response = import_csv(client, auth_headers, body)
+
+    assert response.get_json()["inserted"] + response.get_json()["updated"] == rows
+    # Select the batch's existing products, insert the new ones, update the rest
+    assert len([statement for statement in statements if "product" in statement.lower()]) == 3
+
+
+def test_an_image_another_product_shows_is_not_deleted(app, client, auth_headers):
+    with app.app_context():
+        db.session.add_all([
+            Product(name="Lamp", price=20, stock=3, image_url=s3_url(UPLOADED_KEY)),
+            Product(name="Floor lamp", price=30, stock=3, image_url=s3_url(UPLOADED_KEY)),
+        ])
+        db.session.commit()
+
+    import_csv(client, auth_headers, "id,image_key\n1,desk.png\n")
+    with app.app_context():
+        assert S3DeletionOutbox.query.count() == 0
+
+    import_csv(client, auth_headers, "id,image_key\n2,floor.png\n")
+    with app.app_context():
+        assert {entry.object_key for entry in S3DeletionOutbox.query} == {
+            UPLOADED_KEY, f"thumbnail/{UPLOADED_KEY[:-4]}.jpg", f"medium/{UPLOADED_KEY[:-4]}.jpg",
+        }
+
+
+def test_an_image_moved_to_a_product_in_the_same_batch_is_not_deleted(app, client, auth_headers):
+    with app.app_context():
+        db.session.add(Product(name="Lamp", price=20, stock=3, image_url=s3_url(UPLOADED_KEY)))
+        db.session.commit()
+
+    response = import_csv(
+        client, auth_headers, f"id,name,price,stock,image_key\n1,,,,desk.png\n,Floor lamp,30,3,{UPLOADED_KEY}\n"
+    )
+
+    assert response.get_json()["inserted"] == 1
+    with app.app_context():
+        assert S3DeletionOutbox.query.count() == 0
+
+
+def test_only_uploaded_images_have_variants(app, client, auth_headers):
+    import_csv(client, auth_headers, f"name,price,stock,image_key\nLamp,20,3,lamp.png\nDesk,30,3,{UPLOADED_KEY}\n")
+
+    imported, uploaded = (client.get(f"/products/{product_id}").get_json() for product_id in (1, 2))
+    assert imported["image_variants"] is None
+    assert uploaded["image_variants"]["thumbnail"] == s3_url(f"thumbnail/{UPLOADED_KEY[:-4]}.jpg")
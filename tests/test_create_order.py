@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+from sqlalchemy import insert
+
+from models import CustomerOrder, OrderItem, Product, db
+
+
+@pytest.fixture
+def product(app):
+    with app.app_context():
+        db.session.execute(insert(Product), [{"name": "Widget", "description": "d", "price": 5, "stock": 50}])
+        db.session.commit()
+    return 1
+
+
+def stock(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id).stock
+
+
+def test_duplicate_lines_are_merged(app, client, auth_headers, product):
+    items = [{"product_id": product, "quantity": 2}, {"product_id": product, "quantity": 3}]
+    response = client.post("/orders/", json={"items": items}, headers=auth_headers())
+
+    assert response.status_code == 201
+    assert [(item["product_id"], item["quantity"]) for item in response.get_json()["order"]["items"]] == [(1, 5)]
+    assert stock(app, product) == 45
+
+
+def test_numeric_strings_are_accepted(app, client, auth_headers, product):
+    items = [{"product_id": "1", "quantity": "2"}]
+    response = client.post("/orders/", json={"items": items}, headers=auth_headers())
+
+    assert response.status_code == 201
+    assert stock(app, product) == 48
+
+
+@pytest.mark.parametrize("item", [
+    {"product_id": [1], "quantity": 1},
+    {"product_id": {"id": 1}, "quantity": 1},
+    {"product_id": "one", "quantity": 1},
+    {"product_id": 1, "quantity": "two"},
+    {"product_id": 1, "quantity": 1.5},
+    {"product_id": 1, "quantity": 0},
+    {"product_id": True, "quantity": 1},
+    {"quantity": 1},
+    "1",
+])
+def test_invalid_items_are_rejected(app, client, auth_headers, product, item):
+    response = client.post("/orders/", json={"items": [item]}, headers=auth_headers())
+
+    assert response.status_code == 400
+    assert stock(app, product) == 50
+
+
+def test_concurrent_orders_never_oversell(app, auth_headers, product):
+    """Checkouts racing for the last units must sell exactly the stock, never more"""
+    threads, attempts, quantity = 10, 4, 3
+    statuses = []
+    start = threading.Barrier(threads)
+
+    def checkout():
+        client = app.test_client()
+        headers = auth_headers()
+        start.wait()
+        for _ in range(attempts):
+            response = client.post("/orders/", json={"items": [{"product_id": product, "quantity": quantity}]},
+                                   headers=headers)
+            statuses.append(response.status_code)
+
+    workers = [threading.Thread(target=checkout) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # 120 units were requested for 50 in stock: 16 orders of 3 fit, leaving 2
+    assert sorted(set(statuses)) == [201, 400]
+    assert statuses.count(201) == 50 // quantity
+    assert stock(app, product) == 50 % quantity
+    with app.app_context():
+        assert CustomerOrder.query.count() == 50 // quantity
+        assert db.session.query(db.func.sum(OrderItem.quantity)).scalar() == 50 - 50 % quantity
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import jsonify
+
+from idempotency import idempotent
+from middleware import cognito_required
+from models import IdempotencyKey, db
+
+
+@pytest.fixture
+def view(app):
+    """An idempotent POST /test/charge answering with the next queued status, counting its runs"""
+    calls = {"runs": 0, "statuses": []}
+
+    @cognito_required
+    @idempotent
+    def charge():
+        calls["runs"] += 1
+        status = calls["statuses"].pop(0) if calls["statuses"] else 201
+        return jsonify({"run": calls["runs"]}), status
+
+    app.add_url_rule("/test/charge", "charge", charge, methods=["POST"])
+    return calls
+
+
+def charge(client, auth_headers, key="key-1"):
+    return client.post("/test/charge", json={"amount": 5}, headers={**auth_headers(), "Idempotency-Key": key})
+
+
+def test_duplicate_is_replayed(client, auth_headers, view):
+    first = charge(client, auth_headers)
+    second = charge(client, auth_headers)
+
+    assert (first.status_code, second.status_code) == (201, 201)
+    assert second.get_json() == first.get_json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert view["runs"] == 1
+
+
+@pytest.mark.parametrize("status", [409, 503])
+def test_retryable_response_releases_the_key(app, client, auth_headers, view, status):
+    view["statuses"].append(status)
+
+    assert charge(client, auth_headers).status_code == status
+    retried = charge(client, auth_headers)
+
+    assert retried.status_code == 201
+    assert "Idempotent-Replayed" not in retried.headers
+    assert view["runs"] == 2
+
+
+def test_abandoned_key_is_taken_over(app, client, auth_headers, view):
+    charge(client, auth_headers, key="seed")
+    with app.app_context():
+        seed = IdempotencyKey.query.filter_by(idempotency_key="seed").one()
+        # A worker died while holding key-1: no response, and its lease ran out a second ago
+        db.session.add(IdempotencyKey(
+            user_sub=seed.user_sub,
+            idempotency_key="key-1",
+            request_hash=seed.request_hash,
+            locked_until=datetime.utcnow().replace(microsecond=0) - timedelta(seconds=1),
+            expires_at=datetime.utcnow() + timedelta(days=1),
+        ))
+        db.session.commit()
+
+    retried = charge(client, auth_headers)
+
+    assert retried.status_code == 201
+    assert view["runs"] == 2
+    with app.app_context():
+        record = IdempotencyKey.query.filter_by(idempotency_key="key-1").one()
+        assert (record.response_status, record.locked_until) == (201, None)
+
+
+def test_key_in_flight_within_its_lease_is_not_taken_over(app, client, auth_headers, view, monkeypatch):
+    charge(client, auth_headers, key="seed")
+    with app.app_context():
+        seed = IdempotencyKey.query.filter_by(idempotency_key="seed").one()
+        db.session.add(IdempotencyKey(
+            user_sub=seed.user_sub,
+            idempotency_key="key-1",
+            request_hash=seed.request_hash,
+            locked_until=datetime.utcnow() + timedelta(minutes=1),
+            expires_at=datetime.utcnow() + timedelta(days=1),
+        ))
+        db.session.commit()
+    monkeypatch.setattr("config.Config.IDEMPOTENCY_WAIT_TIMEOUT", 0)
+
+    assert charge(client, auth_headers).status_code == 409
+    assert view["runs"] == 1
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from jwks_cache import JWKSKeyStore
+from middleware import validate_token
+
+
+@pytest.fixture
+def key_store(jwks_server):
+    jwks_server.fail = False
+    jwks_server.delay = 0
+    jwks_server.keys = {kid: key for kid, key in jwks_server.keys.items() if kid == "key-1"}
+    return JWKSKeyStore(url=jwks_server.url, ttl=3600, refetch_interval=0.2, timeout=1)
+
+
+def test_keys_are_fetched_once(jwks_server, key_store):
+    requests = jwks_server.requests
+    for _ in range(20):
+        assert validate_token(jwks_server.token(), key_store)["sub"] == "user-1"
+    assert jwks_server.requests == requests + 1
+    assert key_store.stats()["hits"] == 19
+
+
+def test_rotated_key_is_fetched(jwks_server, key_store):
+    validate_token(jwks_server.token(), key_store)
+    jwks_server.add_key("key-2")
+    time.sleep(key_store.refetch_interval)
+
+    assert validate_token(jwks_server.token(kid="key-2"), key_store)["sub"] == "user-1"
+    assert key_store.stats()["fetches"] == 2
+
+
+def test_unknown_key_refetch_is_throttled(jwks_server, key_store):
+    validate_token(jwks_server.token(), key_store)
+    jwks_server.add_key("key-3")
+    token = jwks_server.token(kid="key-3")
+    jwks_server.keys.pop("key-3")
+    time.sleep(key_store.refetch_interval)
+    requests = jwks_server.requests
+
+    for _ in range(5):
+        with pytest.raises(Exception, match="Key not found"):
+            validate_token(token, key_store)
+    assert jwks_server.requests == requests + 1
+    assert key_store.stats()["throttled_fetches"] == 4
+
+
+def test_stale_keys_are_kept_when_refresh_fails(jwks_server, key_store):
+    validate_token(jwks_server.token(), key_store)
+    jwks_server.fail = True
+
+    assert key_store.refresh() is False
+    assert validate_token(jwks_server.token(), key_store)["sub"] == "user-1"
+    assert key_store.stats()["fetch_failures"] == 1
+
+
+def test_unreachable_endpoint_fails_fast_at_cold_start(jwks_server, key_store):
+    jwks_server.fail = True
+    token = jwks_server.token()
+    requests = jwks_server.requests
+
+    # The fetch error is reported as a failed validation
+    assert validate_token(token, key_store) is None
+
+    # Within the refetch interval no request waits on another fetch
+    started = time.perf_counter()
+    for _ in range(10):
+        with pytest.raises(Exception, match="Key not found"):
+            validate_token(token, key_store)
+    assert time.perf_counter() - started < 0.5
+    assert jwks_server.requests == requests + 1
+
+
+def test_concurrent_cold_start_shares_one_fetch(jwks_server, key_store):
+    jwks_server.delay = 0.3
+    token = jwks_server.token()
+    requests = jwks_server.requests
+    results = []
+
+    def validate():
+        try:
+            results.append(validate_token(token, key_store)["sub"])
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=validate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["user-1"] * 8
+    assert jwks_server.requests == requests + 1
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+from config import Config
+from metrics import Counter, Gauge, Histogram, Registry, merge_snapshots, render_families, write_snapshot
+
+
+def test_metrics_need_an_admin(client, auth_headers):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth_headers()).status_code == 403
+
+    response = client.get("/metrics", headers=auth_headers(admin=True))
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.get_data(as_text=True)
+
+
+def test_snapshots_of_every_worker_are_merged(tmp_path):
+    registry = Registry()
+    requests = Counter("requests_total", "Requests", ["route"], registry=registry)
+    in_flight = Gauge("in_flight", "Requests in flight", registry=registry)
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1), registry=registry)
+
+    # This worker and the master (standing in for another live worker) each served requests
+    requests.inc(route="/products")
+    in_flight.set(2)
+    latency.observe(0.05)
+    write_snapshot(tmp_path, registry, pid=os.getpid())
+    requests.inc(2, route="/products")
+    in_flight.set(5)
+    latency.observe(0.5)
+    write_snapshot(tmp_path, registry, pid=os.getppid())
+
+    # A worker that has since exited
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    write_snapshot(tmp_path, registry, pid=dead.pid)
+
+    text = render_families(merge_snapshots(tmp_path))
+    # The exited worker's counts still add up, its gauge is dropped
+    assert 'requests_total{route="/products"} 7' in text
+    assert 'latency_seconds_bucket{le="0.1"} 3' in text
+    assert 'latency_seconds_bucket{le="1"} 5' in text
+    assert "latency_seconds_count 5" in text
+    assert f'in_flight{{pid="{os.getpid()}"}} 2' in text
+    assert f'in_flight{{pid="{os.getppid()}"}} 5' in text
+    assert f'pid="{dead.pid}"' not in text
+
+
+def test_metrics_report_every_worker(client, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_DIR", str(tmp_path))
+    registry = Registry()
+    Counter("http_requests_total", "Requests", ["endpoint"], registry=registry).inc(3, endpoint="other_worker")
+    write_snapshot(tmp_path, registry, pid=os.getppid())
+
+    text = client.get("/metrics", headers=auth_headers(admin=True)).get_data(as_text=True)
+
+    assert 'http_requests_total{endpoint="other_worker"} 3' in text
+    assert text.count("# TYPE http_requests_total counter") == 1
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
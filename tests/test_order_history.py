@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from models import CustomerOrder, OrderItem, Product, db
+
+
+@pytest.fixture
+def orders(app):
+    """Orders at noon on Jan 30, Jan 31 and Feb 1 2024"""
+    with app.app_context():
+        for day in (datetime(2024, 1, 30, 12), datetime(2024, 1, 31, 12), datetime(2024, 2, 1, 12)):
+            db.session.add(CustomerOrder(user_sub="user-1", total=5, created_at=day))
+        db.session.commit()
+
+
+def order_dates(response):
+    return [order["created_at"][:10] for order in json.loads(response.get_data())["orders"]]
+
+
+@pytest.mark.parametrize("query_string, dates", [
+    ("to=2024-01-31", ["2024-01-31", "2024-01-30"]),
+    ("to=2024-01-31T00:00:00", ["2024-01-30"]),
+    ("from=2024-01-31&to=2024-01-31", ["2024-01-31"]),
+    ("from=2024-01-31T12:00:00", ["2024-02-01", "2024-01-31"]),
+])
+def test_date_range(client, auth_headers, orders, query_string, dates):
+    response = client.get(f"/orders/?{query_string}", headers=auth_headers())
+
+    assert response.status_code == 200
+    assert order_dates(response) == dates
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_empty_range_is_an_empty_list(client, auth_headers, orders, stream):
+    response = client.get(f"/orders/?from=2025-01-01&stream={stream}", headers=auth_headers())
+
+    assert response.status_code == 200
+    assert json.loads(response.get_data())["orders"] == []
+
+
+def test_user_without_orders_is_not_found(client, auth_headers, orders):
+    assert client.get("/orders/", headers=auth_headers("user-2")).status_code == 404
+
+
+@pytest.mark.parametrize("query_string", ["stream=true", "format=ndjson"])
+def test_streamed_items_match_the_page(app, client, auth_headers, monkeypatch, query_string):
+    """Items are loaded per batch of streamed orders, on a separate connection from the order cursor"""
+    with app.app_context():
+        db.session.add_all([Product(name=f"Product {i}", price=i, stock=10) for i in (1, 2)])
+        for day in range(1, 6):
+            order = CustomerOrder(user_sub="user-1", total=3, created_at=datetime(2024, 1, day))
+            order.items = [OrderItem(product_id=1, quantity=1, price=1), OrderItem(product_id=2, quantity=1, price=2)]
+            db.session.add(order)
+        db.session.commit()
+    monkeypatch.setattr("routes.order_routes.STREAM_BATCH_SIZE", 2)
+
+    page = client.get("/orders/?limit=10", headers=auth_headers()).get_json()["orders"]
+    body = client.get(f"/orders/?limit=10&{query_string}", headers=auth_headers()).get_data(as_text=True)
+    streamed = json.loads(body)["orders"] if query_string == "stream=true" else [
+        json.loads(line) for line in body.splitlines()
+    ]
+
+    assert streamed == page
+    assert [len(order["items"]) for order in streamed] == [2] * 5
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from models import CustomerOrder, OrderItem, Product, db
+
+
+def add_orders(app, user_sub, orders, items_per_order):
+    """Insert orders of items_per_order distinct products each; returns the order ids"""
+    with app.app_context():
+        db.session.execute(insert(Product), [
+            {"name": f"Product {i}", "description": "d", "price": 2, "stock": 1000} for i in range(items_per_order)
+        ])
+        product_ids = [product.id for product in Product.query.order_by(Product.id.desc()).limit(items_per_order)]
+
+        order_ids = []
+        created_at = datetime(2024, 1, 1)
+        for i in range(orders):
+            order = CustomerOrder(user_sub=user_sub, total=2 * items_per_order, created_at=created_at + timedelta(hours=i))
+            db.session.add(order)
+            db.session.flush()
+            order_ids.append(order.id)
+            db.session.execute(insert(OrderItem), [
+                {"order_id": order.id, "product_id": product_id, "quantity": 1, "price": 2} for product_id in product_ids
+            ])
+        db.session.commit()
+        return order_ids
+
+
+def selects(statements):
+    return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+
+@pytest.mark.parametrize("query_string", ["", "?items=false", "?stream=true", "?format=ndjson"])
+def test_order_history_query_count_is_constant(app, client, auth_headers, count_queries, query_string):
+    add_orders(app, "small", orders=1, items_per_order=1)
+    add_orders(app, "large", orders=30, items_per_order=10)
+
+    counts = []
+    for user_sub in ("small", "large"):
+        with count_queries() as statements:
+            response = client.get(f"/orders/{query_string}", headers=auth_headers(user_sub))
+            response.get_data()
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_order_query_count_is_constant(app, client, auth_headers, count_queries):
+    small = add_orders(app, "user-1", orders=1, items_per_order=1)[0]
+    large = add_orders(app, "user-1", orders=1, items_per_order=25)[0]
+
+    counts = []
+    for order_id in (small, large):
+        with count_queries() as statements:
+            response = client.get(f"/orders/{order_id}", headers=auth_headers())
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_create_order_selects_products_once(app, client, auth_headers, count_queries):
+    with app.app_context():
+        db.session.execute(insert(Product), [
+            {"name": f"Product {i}", "description": "d", "price": 2, "stock": 100} for i in range(20)
+        ])
+        db.session.commit()
+
+    counts = []
+    for product_ids in ([1], range(1, 21)):
+        items = [{"product_id": product_id, "quantity": 1} for product_id in product_ids]
+        with count_queries() as statements:
+            response = client.post("/orders/", json={"items": items}, headers=auth_headers())
+        assert response.status_code == 201
+        # Stock is reserved with one conditional UPDATE per product, but products are read once
+        counts.append(len(selects(statements)))
+    assert counts[0] == counts[1]
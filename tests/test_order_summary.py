@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from models import Product, ProductSalesSummary, UserOrderSummary, db
+from order_summary import summary_statements
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "oracle"])
+def test_summaries_accumulate_orders(app, dialect):
+    """Other dialects fall back to portable statements, which run on SQLite too"""
+    orders = [
+        (datetime(2024, 1, 1), [{"product_id": 1, "quantity": 2, "price": 5}]),
+        (datetime(2024, 1, 2), [{"product_id": 1, "quantity": 1, "price": 5}, {"product_id": 2, "quantity": 4, "price": 3}]),
+    ]
+    with app.app_context():
+        db.session.execute(insert(Product), [{"name": f"Product {i}", "description": "d", "price": 1, "stock": 1} for i in (1, 2)])
+        for created_at, item_rows in orders:
+            total = sum(row["quantity"] * row["price"] for row in item_rows)
+            for statement in summary_statements(dialect, "user-1", total, created_at, item_rows):
+                db.session.execute(statement)
+        db.session.commit()
+
+        user = db.session.get(UserOrderSummary, "user-1")
+        assert (user.order_count, user.lifetime_total, user.last_order_at) == (2, 27, datetime(2024, 1, 2))
+        assert [(row.product_id, row.units_sold, row.revenue) for row in ProductSalesSummary.query.order_by("product_id")] == [
+            (1, 3, 15),
+            (2, 4, 12),
+        ]
@@ -0,0 +1,174 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from models import Product, db
+from product_cache import LocalCacheBackend, ProductCache, product_cache
+
+
+@pytest.fixture
+def product(app):
+    with app.app_context():
+        db.session.execute(insert(Product), [
+            {"name": "Lamp", "description": "d" * 2000, "price": 20, "stock": 5, "updated_at": datetime(2024, 1, 1)}
+        ])
+        db.session.commit()
+    return 1
+
+
+def product_json(response):
+    body = response.get_data()
+    if response.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def set_stock(app, product_id, stock):
+    """Change the stock as an order would, keeping updated_at as a write in the same second does"""
+    with app.app_context():
+        Product.query.filter_by(id=product_id).update({"stock": stock, "updated_at": datetime(2024, 1, 1)})
+        db.session.commit()
+    product_cache.invalidate(product_id)
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_updates_within_one_second_are_served(app, client, product, encoding):
+    previous = client.get(f"/products/{product}", headers={"Accept-Encoding": encoding})
+    for stock in (4, 3):
+        set_stock(app, product, stock)
+        response = client.get(f"/products/{product}",
+                              headers={"Accept-Encoding": encoding, "If-None-Match": previous.headers["ETag"]})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != previous.headers["ETag"]
+        assert product_json(response)["stock"] == stock
+        previous = response
+
+
+@pytest.fixture
+def cache():
+    return ProductCache(LocalCacheBackend(max_size=100, ttl=60))
+
+
+def slow_loader(loads, value, delay=0.2):
+    def load():
+        loads.append(value)
+        time.sleep(delay)
+        return value
+
+    return load
+
+
+def test_concurrent_misses_share_one_load(cache):
+    loads, results = [], []
+    start = threading.Barrier(8)
+
+    def get():
+        start.wait()
+        results.append(cache.get_or_load(1, slow_loader(loads, {"id": 1})))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert results == [{"id": 1}] * 8
+    assert cache.get_or_load(1, slow_loader(loads, {"id": 2})) == {"id": 1}
+
+
+def test_load_error_reaches_every_waiter_and_is_not_cached(cache):
+    errors = []
+
+    def failing():
+        time.sleep(0.2)
+        raise RuntimeError("database is down")
+
+    def get():
+        try:
+            cache.get_or_load(1, failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 4
+    assert cache.get_or_load(1, lambda: {"id": 1}) == {"id": 1}
+
+
+def test_product_invalidated_while_loading_is_not_stored(cache):
+    def load():
+        cache.invalidate(1)
+        return {"stock": 5}
+
+    assert cache.get_or_load(1, load) == {"stock": 5}
+    assert cache.get_or_load(1, lambda: {"stock": 4}) == {"stock": 4}
+
+
+def test_entries_expire_after_the_ttl(cache, monkeypatch):
+    cache.get_or_load(1, lambda: {"stock": 5})
+    now = time.monotonic()
+    monkeypatch.setattr("product_cache.time.monotonic", lambda: now + 61)
+
+    assert cache.get_or_load(1, lambda: {"stock": 4}) == {"stock": 4}
+
+
+def test_concurrent_async_misses_share_one_load(cache):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.1)
+        return {"id": 1}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load_async(1, load) for _ in range(8)))
+
+    assert asyncio.run(main()) == [{"id": 1}] * 8
+    assert len(loads) == 1
+
+
+def test_cancelled_async_load_is_retried_by_a_waiter(cache):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.1)
+        return {"id": 1}
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_load_async(1, load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_load_async(1, load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == {"id": 1}
+    assert len(loads) == 2
+
+
+def test_writes_invalidate_the_cached_product(app, client, auth_headers, product):
+    def get():
+        return client.get(f"/products/{product}").get_json()
+
+    assert get()["stock"] == 5
+
+    client.put(f"/products/{product}", data={"name": "Desk lamp", "stock": "7"}, headers=auth_headers(admin=True))
+    assert (get()["name"], get()["stock"]) == ("Desk lamp", 7)
+
+    client.post("/orders/", json={"items": [{"product_id": product, "quantity": 2}]}, headers=auth_headers())
+    assert get()["stock"] == 5
+
+    client.delete(f"/products/{product}", headers=auth_headers(admin=True))
+    assert get()["deleted"] is True
@@ -0,0 +1,154 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+import s3_utils
+from config import Config
+from conftest import wait_for
+from models import Product, S3DeletionOutbox, db
+from s3_outbox import S3DeletionWorker
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 900), "orange").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def product_form(data=None, **fields):
+    form = {"name": "Lamp", "description": "Desk lamp", "price": "20", "stock": "3", **fields}
+    if data is not None:
+        form["file"] = (io.BytesIO(data), "lamp.png")
+    return form
+
+
+def object_keys(s3):
+    return {item["Key"] for item in s3.list_objects_v2(Bucket=Config().S3_BUCKET_NAME).get("Contents", [])}
+
+
+def image_keys(image_url):
+    key = image_url.rsplit("/", 1)[1]
+    return {key, *(s3_utils.variant_key(key, variant) for variant in s3_utils.IMAGE_VARIANTS)}
+
+
+def image_url(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id).image_url
+
+
+def queued_keys(app):
+    with app.app_context():
+        return {row.object_key for row in S3DeletionOutbox.query}
+
+
+@pytest.fixture
+def failing_uploads(monkeypatch):
+    def fail(path, key, content_type, bucket_name):
+        raise RuntimeError("S3 is unavailable")
+
+    monkeypatch.setattr(s3_utils, "process_image_upload", fail)
+
+
+def test_image_and_variants_are_uploaded(client, auth_headers, s3):
+    response = client.post("/products/", data=product_form(png()), headers=auth_headers(admin=True))
+    assert response.status_code == 201
+
+    product = response.get_json()["product"]
+    assert wait_for(lambda: image_keys(product["image_url"]) <= object_keys(s3))
+    assert set(product["image_variants"]) == set(s3_utils.IMAGE_VARIANTS)
+
+
+def test_non_image_is_rejected(app, client, auth_headers, s3):
+    response = client.post("/products/", data=product_form(b"not an image"), headers=auth_headers(admin=True))
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert Product.query.count() == 0
+    assert object_keys(s3) == set()
+
+
+def test_failed_upload_clears_new_product_image(app, client, auth_headers, s3, failing_uploads):
+    response = client.post("/products/", data=product_form(png()), headers=auth_headers(admin=True))
+    assert response.status_code == 201
+    product = response.get_json()["product"]
+
+    assert wait_for(lambda: image_url(app, product["id"]) is None)
+    assert product["image_url"].rsplit("/", 1)[1] in wait_for(lambda: queued_keys(app))
+    assert client.get(f"/products/{product['id']}").get_json()["image_variants"] is None
+
+
+def test_failed_replacement_restores_previous_image(app, client, auth_headers, s3, monkeypatch):
+    created = client.post("/products/", data=product_form(png()), headers=auth_headers(admin=True)).get_json()
+    product_id, original_url = created["product"]["id"], created["product"]["image_url"]
+    assert wait_for(lambda: image_keys(original_url) <= object_keys(s3))
+
+    monkeypatch.setattr(s3_utils, "process_image_upload", lambda *args: 1 / 0)
+    edited = client.put(f"/products/{product_id}", data={"name": "Lamp", "file": (io.BytesIO(png()), "new.png")},
+                        headers=auth_headers(admin=True))
+    assert edited.status_code == 200
+    assert edited.get_json()["product"]["image_url"] != original_url
+
+    assert wait_for(lambda: image_url(app, product_id) == original_url)
+    assert client.get(f"/products/{product_id}").get_json()["image_url"] == original_url
+    # Only the failed upload is queued; the image still in use is kept
+    assert wait_for(lambda: queued_keys(app) == image_keys(edited.get_json()["product"]["image_url"]))
+
+
+def test_previous_image_is_queued_once_replacement_is_uploaded(app, client, auth_headers, s3, monkeypatch):
+    created = client.post("/products/", data=product_form(png()), headers=auth_headers(admin=True)).get_json()
+    product_id, original_url = created["product"]["id"], created["product"]["image_url"]
+    assert wait_for(lambda: image_keys(original_url) <= object_keys(s3))
+
+    release = threading.Event()
+    upload = s3_utils.process_image_upload
+
+    def held_upload(*args):
+        release.wait(10)
+        upload(*args)
+
+    monkeypatch.setattr(s3_utils, "process_image_upload", held_upload)
+    edited = client.put(f"/products/{product_id}", data={"name": "Lamp", "file": (io.BytesIO(png()), "new.png")},
+                        headers=auth_headers(admin=True))
+    assert edited.status_code == 200
+
+    # While the new image is uploading, the old one is still the fallback
+    assert queued_keys(app) == set()
+    release.set()
+    assert wait_for(lambda: queued_keys(app) == image_keys(original_url))
+    assert image_url(app, product_id) == edited.get_json()["product"]["image_url"]
+
+
+def test_image_of_a_failed_create_is_queued_for_deletion(app, client, auth_headers, s3):
+    response = client.post("/products/", data=product_form(png(), price="free"), headers=auth_headers(admin=True))
+    assert response.status_code == 500
+
+    # Queued for the deletion worker rather than deleted by the request
+    queued = wait_for(lambda: queued_keys(app))
+    assert len(queued) == 1 + len(s3_utils.IMAGE_VARIANTS)
+    assert wait_for(lambda: queued <= object_keys(s3))
+    with app.app_context():
+        assert Product.query.count() == 0
+        S3DeletionWorker().process_batch()
+    assert object_keys(s3) == set()
+
+
+def test_async_discarded_upload_is_queued_for_deletion(app):
+    for module in ("quart", "aiosqlite", "aiobotocore"):
+        pytest.importorskip(module)
+    import async_s3
+    from asgi import app as asgi_app
+
+    key = "0123456789abcdef0123456789abcdef_lamp.png"
+
+    async def discard():
+        async with asgi_app.test_app():
+            upload = async_s3.AsyncImageUpload(key, s3_utils.s3_url(key), async_s3.spawn(asyncio.sleep(0)))
+            upload.discard()
+            await upload.task
+            await asyncio.gather(*async_s3._tasks)
+
+    asyncio.run(discard())
+    assert queued_keys(app) == image_keys(s3_utils.s3_url(key))
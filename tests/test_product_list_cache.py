@@ -0,0 +1,105 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from models import Product, db
+
+
+@pytest.fixture
+def products(app):
+    """
+    Products 1-4 sharing one updated_at, so only the page's membership tells pages apart.
+    Their descriptions make a page large enough to be compressed.
+    """
+    updated_at = datetime(2024, 1, 1)
+    with app.app_context():
+        db.session.execute(insert(Product), [
+            {"name": f"Product {i}", "description": "d" * 1000, "price": 10 * i, "stock": 5, "updated_at": updated_at}
+            for i in range(1, 5)
+        ])
+        db.session.commit()
+
+
+def update_product(app, product_id, **values):
+    with app.app_context():
+        Product.query.filter_by(id=product_id).update(values)
+        db.session.commit()
+
+
+def listed_ids(response):
+    body = response.get_data()
+    if response.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return [product["id"] for product in json.loads(body)]
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+@pytest.mark.parametrize("query_string, change", [
+    ("?limit=2", {"deleted": True}),
+    ("?limit=2&in_stock=true", {"stock": 0}),
+    ("?limit=2&max_price=35", {"price": 50}),
+])
+def test_row_leaving_the_page_changes_the_etag(app, client, products, query_string, change, encoding):
+    headers = {"Accept-Encoding": encoding}
+    first = client.get(f"/products/{query_string}", headers=headers)
+    assert listed_ids(first) == [1, 2]
+
+    update_product(app, 2, **change)
+
+    # Neither a 304 nor the cached body of the old page
+    for _ in range(2):
+        revalidated = client.get(f"/products/{query_string}", headers={**headers, "If-None-Match": first.headers["ETag"]})
+        assert revalidated.status_code == 200
+        assert listed_ids(revalidated) == [1, 3]
+        assert revalidated.headers["ETag"] != first.headers["ETag"]
+
+
+def test_unchanged_page_is_not_modified(client, products):
+    first = client.get("/products/?limit=2")
+    revalidated = client.get("/products/?limit=2", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_compressed_representation_has_a_weak_etag(client, products):
+    identity = client.get("/products/?limit=2", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/products/?limit=2", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in identity.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == f"W/{identity.headers['ETag']}"
+
+    # Either validator revalidates either representation
+    for etag in (identity.headers["ETag"], compressed.headers["ETag"]):
+        for encoding in ("identity", "gzip"):
+            revalidated = client.get("/products/?limit=2", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+            assert revalidated.status_code == 304
+            assert revalidated.headers["ETag"] == etag
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_updates_within_one_second_change_the_page(app, client, products, encoding):
+    """updated_at has one-second precision, so two writes in the same second leave it unchanged"""
+    headers = {"Accept-Encoding": encoding}
+    first = client.get("/products/?limit=2", headers=headers)
+
+    for stock in (4, 3):
+        update_product(app, 1, stock=stock, updated_at=datetime(2024, 1, 1))
+        response = client.get("/products/?limit=2", headers={**headers, "If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 200
+        body = response.get_data()
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        assert json.loads(body)[0]["stock"] == stock
+        first = response
+
+
+def test_if_modified_since_does_not_revalidate_a_page(app, client, products):
+    first = client.get("/products/?limit=2")
+    update_product(app, 2, deleted=True)
+
+    revalidated = client.get("/products/?limit=2", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert revalidated.status_code == 200
+    assert listed_ids(revalidated) == [1, 3]
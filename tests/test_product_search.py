@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy.dialects import mysql
+
+import product_search
+from conftest import wait_for
+from models import Product, db
+from product_search import boolean_mode_query, search_index, search_products, tokenize
+from test_product_images import image_keys, object_keys, png, product_form
+
+
+@pytest.fixture
+def catalog(app):
+    with app.app_context():
+        products = [
+            Product(name="Lamp", description="Brass reading light", price=20, stock=3),
+            Product(name="Desk", description="Desk with a built-in lamp", price=90, stock=2),
+            Product(name="Lampshade", description="Linen", price=15, stock=8),
+            Product(name="Chair", description="Oak", price=40, stock=5),
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        return {product.name: product.id for product in products}
+
+
+def search(client, query, **params):
+    response = client.get("/products/search", query_string={"q": query, **params})
+    assert response.status_code == 200
+    return [product["name"] for product in response.get_json()], response.headers.get("X-Next-Page")
+
+
+def test_tokenize():
+    assert tokenize("Oak DESK-lamp, 2 x 60W (LED)!") == ["oak", "desk", "lamp", "60w", "led"]
+    assert tokenize(None) == []
+
+
+def test_name_matches_rank_above_prefix_and_description_matches(client, catalog):
+    assert search(client, "lamp") == (["Lamp", "Lampshade", "Desk"], None)
+    # Every term is required
+    assert search(client, "lamp desk") == (["Desk"], None)
+    # Terms shorter than MIN_PREFIX_LENGTH only match whole tokens
+    assert search(client, "la") == ([], None)
+    assert client.get("/products/search", query_string={"q": "!!"}).status_code == 400
+
+
+def test_results_are_paged_in_rank_order(client, catalog):
+    assert search(client, "lamp", limit=2) == (["Lamp", "Lampshade"], "2")
+    assert search(client, "lamp", limit=2, page=2) == (["Desk"], None)
+
+
+def test_writes_update_the_index_in_place(client, auth_headers, s3):
+    headers = auth_headers(admin=True)
+    assert search(client, "walnut") == ([], None)  # Builds the index
+    builds = search_index.builds
+
+    product = client.post(
+        "/products/", data=product_form(png(), name="Walnut bookshelf"), headers=headers
+    ).get_json()["product"]
+    assert wait_for(lambda: image_keys(product["image_url"]) <= object_keys(s3))
+    assert search(client, "walnut") == (["Walnut bookshelf"], None)
+
+    client.put(f"/products/{product['id']}", data={"name": "Cherry bookshelf"}, headers=headers)
+    assert search(client, "walnut") == ([], None)
+    assert search(client, "cherry") == (["Cherry bookshelf"], None)
+
+    client.delete(f"/products/{product['id']}", headers=headers)
+    assert search(client, "bookshelf") == ([], None)
+    assert search_index.builds == builds
+
+
+def test_boolean_mode_operators_are_removed_from_terms():
+    assert boolean_mode_query(tokenize('+lamp -desk "oak" (red)~ <blue> >x* @2')) == "+lamp* +desk* +oak* +red* +blue*"
+    assert boolean_mode_query(["la+mp", '"oak"', "-", "~(red)*", "a>b<c@d"]) == "+lamp* +oak* +red* +abcd*"
+
+
+def test_fulltext_search_sends_the_escaped_terms(app, monkeypatch):
+    statements = []
+
+    class Result:
+        def all(self):
+            return []
+
+    def execute(statement):
+        statements.append(statement)
+        return Result()
+
+    monkeypatch.setattr(product_search, "uses_fulltext", lambda: True)
+    with app.app_context():
+        monkeypatch.setattr(db.session, "execute", execute)
+        assert search_products('lamp -"desk"*', 0, 10) == ([], False)
+
+    compiled = statements[0].compile(dialect=mysql.dialect())
+    assert "MATCH (product.name, product.description) AGAINST (%s IN BOOLEAN MODE)" in str(compiled)
+    assert "+lamp* +desk*" in compiled.params.values()
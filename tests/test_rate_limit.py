@@ -0,0 +1,102 @@
+import pytest
+
+import rate_limit
+from config import Config
+from rate_limit import TOO_MANY_REQUESTS, LocalRateLimitStore, rate_limit_store
+from routes import auth_routes
+
+USERNAME_LIMIT = Config().LOGIN_USERNAME_RATE_LIMIT
+IP_LIMIT = Config().LOGIN_IP_RATE_LIMIT
+
+
+class StubCognito:
+    def initiate_auth(self, **kwargs):
+        return {"AuthenticationResult": {"AccessToken": "access", "IdToken": "id", "ExpiresIn": 3600}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The app with the rate limits on (conftest turns them off) behind one trusted proxy, and Cognito stubbed"""
+    from app import create_app
+
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(Config, "TRUSTED_PROXIES", 1)
+    monkeypatch.setattr(auth_routes, "get_client", lambda *args, **kwargs: StubCognito())
+    rate_limit_store.clear()
+    yield create_app()
+    rate_limit_store.clear()
+
+
+def login(client, username, forwarded_for="203.0.113.5"):
+    return client.post(
+        "/auth/login", json={"username": username, "password": "secret"}, headers={"X-Forwarded-For": forwarded_for}
+    )
+
+
+def test_bucket_refills_at_limit_per_window(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    store = LocalRateLimitStore(max_size=10)
+
+    # A burst of up to limit, then one token every window / limit seconds
+    assert [store.take("login", "alice", 2, 10) for _ in range(3)] == [0, 0, 5]
+    clock.now += 2.5
+    assert store.take("login", "alice", 2, 10) == 2.5
+    clock.now += 2.5
+    assert store.take("login", "alice", 2, 10) == 0
+    assert store.take("login", "alice", 2, 10) == 5
+
+    # Buckets never refill past the limit
+    assert store.take("login", "carol", 2, 10) == 0
+    clock.now += 9
+    assert [store.take("login", "carol", 2, 10) for _ in range(3)] == [0, 0, 5]
+    # Each key and each limit has its own bucket
+    assert store.take("login", "bob", 2, 10) == 0
+    assert store.take("orders", "alice", 2, 10) == 0
+
+
+def test_login_is_limited_per_username(client):
+    for i in range(USERNAME_LIMIT):
+        assert login(client, "alice", forwarded_for=f"198.51.100.{i}").status_code == 200
+
+    response = login(client, "Alice", forwarded_for="198.51.100.200")
+    assert response.status_code == 429
+    assert response.get_json() == {"error": TOO_MANY_REQUESTS}
+    assert response.headers["Retry-After"] == str(Config().LOGIN_USERNAME_RATE_LIMIT_WINDOW // USERNAME_LIMIT)
+    assert login(client, "bob").status_code == 200
+
+
+def test_login_is_limited_per_ip(client):
+    for i in range(IP_LIMIT):
+        assert login(client, f"user-{i}").status_code == 200
+
+    response = login(client, "someone-else")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert login(client, "someone-else", forwarded_for="203.0.113.6").status_code == 200
+
+
+def test_only_the_trusted_proxy_entry_of_x_forwarded_for_counts(client):
+    # Addresses the client puts in front of the proxy's entry do not give it a fresh bucket
+    for i in range(IP_LIMIT):
+        assert login(client, f"user-{i}", forwarded_for=f"10.0.0.{i}, 203.0.113.5").status_code == 200
+    assert login(client, "someone-else", forwarded_for="10.0.0.99, 203.0.113.5").status_code == 429
+
+
+def test_x_forwarded_for_is_ignored_without_trusted_proxies(app, monkeypatch):
+    from app import create_app
+
+    monkeypatch.setattr(Config, "TRUSTED_PROXIES", 0)
+    client = create_app().test_client()
+
+    for i in range(IP_LIMIT):
+        assert login(client, f"user-{i}", forwarded_for=f"10.0.0.{i}").status_code == 200
+    assert login(client, "someone-else", forwarded_for="10.0.0.99").status_code == 429
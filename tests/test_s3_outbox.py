@@ -0,0 +1,57 @@
+from config import Config
+from models import Product, S3DeletionOutbox, db
+from s3_outbox import S3DeletionWorker, enqueue_image_deletion, image_object_keys, s3_deletion_worker
+from s3_utils import s3_url
+
+SHOWN = "0123456789abcdef0123456789abcdef_lamp.png"
+REPLACED = "fedcba9876543210fedcba9876543210_desk.png"
+
+
+def put_objects(s3, *keys):
+    for key in keys:
+        s3.put_object(Bucket=Config().S3_BUCKET_NAME, Key=key, Body=b"image")
+
+
+def object_keys(s3):
+    return {item["Key"] for item in s3.list_objects_v2(Bucket=Config().S3_BUCKET_NAME).get("Contents", [])}
+
+
+def test_keys_a_product_still_shows_are_not_deleted(app, s3):
+    put_objects(s3, *image_object_keys(SHOWN), *image_object_keys(REPLACED))
+    with app.app_context():
+        # e.g. an imported product was pointed at the image after its deletion was queued
+        db.session.add(Product(name="Lamp", price=20, stock=3, image_url=s3_url(SHOWN)))
+        enqueue_image_deletion(s3_url(SHOWN))
+        enqueue_image_deletion(s3_url(REPLACED))
+        db.session.commit()
+
+        worker = S3DeletionWorker()
+        assert worker.process_batch() == 6
+        assert S3DeletionOutbox.query.count() == 0
+
+    assert object_keys(s3) == set(image_object_keys(SHOWN))
+    assert (worker.deleted, worker.skipped, worker.failed) == (3, 3, 0)
+
+
+def test_sweep_only_queues_unreferenced_uploads(app, s3, monkeypatch):
+    orphan = "00000000000000000000000000000000_old.png"
+    put_objects(
+        s3, *image_object_keys(SHOWN), *image_object_keys(orphan),
+        "imported.png", "thumbnail/imported.jpg", "exports/0123456789abcdef0123456789abcdef_products.csv",
+    )
+    with app.app_context():
+        db.session.add(Product(name="Lamp", price=20, stock=3, image_url=s3_url(SHOWN)))
+        db.session.commit()
+    monkeypatch.setattr(s3_deletion_worker, "orphan_min_age", 0)
+
+    result = app.test_cli_runner().invoke(args=["sweep-s3-orphans"])
+
+    assert "Queued 3 orphaned S3 objects" in result.output
+    with app.app_context():
+        assert {entry.object_key for entry in S3DeletionOutbox.query} == set(image_object_keys(orphan))
+
+
+def test_sweep_skips_recent_objects(app, s3):
+    put_objects(s3, *image_object_keys(REPLACED))
+    with app.app_context():
+        assert S3DeletionWorker().sweep_orphans() == 0
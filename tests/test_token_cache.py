@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+import middleware
+from token_cache import VerifiedTokenCache, token_cache
+
+
+def claims(sub="user-1", expires_in=3600):
+    return {"sub": sub, "exp": time.time() + expires_in}
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    """Count the RS256 verifications done by cognito_required"""
+    calls = []
+    validate = middleware.validate_token
+
+    def counted(token, *args, **kwargs):
+        calls.append(token)
+        return validate(token, *args, **kwargs)
+
+    monkeypatch.setattr(middleware, "validate_token", counted)
+    return calls
+
+
+def test_repeat_token_is_verified_once(client, auth_headers, verifications):
+    headers = auth_headers()
+    hits = token_cache.stats()["hits"]
+    for _ in range(5):
+        assert client.get("/orders/summary", headers=headers).status_code != 401
+    assert len(verifications) == 1
+    assert token_cache.stats()["hits"] == hits + 4
+
+
+def test_disabled_cache_verifies_every_request(client, auth_headers, verifications, monkeypatch):
+    monkeypatch.setattr(token_cache, "enabled", False)
+    headers = auth_headers()
+    for _ in range(3):
+        assert client.get("/orders/summary", headers=headers).status_code != 401
+    assert len(verifications) == 3
+    assert token_cache.stats()["size"] == 0
+
+
+def test_invalid_token_is_not_cached(client, auth_headers, verifications):
+    headers = {"Authorization": auth_headers()["Authorization"][:-4] + "abcd"}
+    for _ in range(2):
+        assert client.get("/orders/summary", headers=headers).status_code == 401
+    assert len(verifications) == 2
+    assert token_cache.stats()["size"] == 0
+
+
+def test_entry_expires_at_the_token_exp(monkeypatch):
+    cache = VerifiedTokenCache(max_size=10, enabled=True)
+    cache.put("token", claims(expires_in=60))
+    assert cache.get("token") is not None
+
+    now = time.time()
+    monkeypatch.setattr("token_cache.time.time", lambda: now + 61)
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_claims_without_exp_are_not_cached():
+    cache = VerifiedTokenCache(max_size=10, enabled=True)
+    cache.put("token", {"sub": "user-1"})
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = VerifiedTokenCache(max_size=2, enabled=True)
+    cache.put("a", claims())
+    cache.put("b", claims())
+    cache.get("a")
+    cache.put("c", claims())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_revoke_drops_one_token():
+    cache = VerifiedTokenCache(max_size=10, enabled=True)
+    cache.put("a", claims())
+    cache.put("b", claims())
+
+    assert cache.revoke("a") is True
+    assert cache.revoke("a") is False
+    assert cache.get("a") is None and cache.get("b") is not None
+
+
+def test_revoke_user_drops_all_of_their_tokens():
+    cache = VerifiedTokenCache(max_size=10, enabled=True)
+    cache.put("a", claims("user-1"))
+    cache.put("b", claims("user-1"))
+    cache.put("c", claims("user-2"))
+
+    assert cache.revoke_user("user-1") == 2
+    assert [cache.get(token) is not None for token in ("a", "b", "c")] == [False, False, True]
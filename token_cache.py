@@ -0,0 +1,94 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from metrics import StatsCollector
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already verified access tokens.
+    Entries are keyed by a SHA-256 of the token and expire at the token's exp claim.
+    """
+
+    def __init__(self, max_size=None, enabled=None):
+        self.max_size = max_size if max_size is not None else Config().TOKEN_CACHE_SIZE
+        self.enabled = enabled if enabled is not None else Config().TOKEN_CACHE_ENABLED
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token hash -> (exp, claims)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def token_key(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token):
+        """Return the cached claims for token, or None if not cached or expired."""
+        if not self.enabled:
+            return None
+
+        key = self.token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            exp, claims = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        if not self.enabled or "exp" not in claims:
+            return
+
+        key = self.token_key(token)
+        with self._lock:
+            self._entries[key] = (claims["exp"], claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revoke(self, token):
+        """Drop a single token so it is verified again on its next use."""
+        with self._lock:
+            return self._entries.pop(self.token_key(token), None) is not None
+
+    def revoke_user(self, sub):
+        """Drop every cached token belonging to a user."""
+        with self._lock:
+            keys = [key for key, (_, claims) in self._entries.items() if claims.get("sub") == sub]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+token_cache = VerifiedTokenCache()
+StatsCollector("token_cache", token_cache.stats, "Verified access token cache")
@@ -0,0 +1,80 @@
+import time
+
+from sqlalchemy import select
+from sqlalchemy.pool import QueuePool
+
+from aws_clients import get_client
+from config import Config
+from jwks_cache import jwks_key_store
+from metrics import Gauge
+from models import Product, ProductSalesSummary, db
+from product_cache import product_cache
+from routes.product_routes import product_cache_entry
+from s3_utils import get_s3_client
+from serializers import PRODUCT_COLUMNS
+
+WARMUP_DURATION = Gauge("warmup_duration_seconds", "Time spent warming up at boot", ["step"])
+
+
+def warm_shared(app):
+    """
+    Fill the process-wide caches. With a preloaded app this runs once, before the workers fork,
+    so every worker starts with the Cognito signing keys, the top-selling products and the AWS SDK loaded.
+    """
+    if not Config().WARMUP_ENABLED:
+        return
+    with app.app_context():
+        run_step("jwks", jwks_key_store.refresh)
+        run_step("products", warm_products)
+        # Imports boto3 and loads the service models; the clients themselves are rebuilt after a fork
+        run_step("aws_sdk", warm_aws_clients)
+
+        # Close the connections opened above, so no worker inherits them
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def warm_worker(app):
+    """Open this process's database connections and AWS clients. Runs in each worker after forking."""
+    if not Config().WARMUP_ENABLED:
+        return
+    with app.app_context():
+        run_step("db_pools", warm_pools)
+        run_step("aws_clients", warm_aws_clients)
+
+
+def warm_products():
+    """Load the top sellers into the product cache with a single query"""
+    rows = db.session.execute(
+        select(*PRODUCT_COLUMNS, Product.deleted, Product.updated_at)
+        .join(ProductSalesSummary, ProductSalesSummary.product_id == Product.id)
+        .filter(Product.deleted.is_(False))
+        .order_by(ProductSalesSummary.units_sold.desc())
+        .limit(Config().WARMUP_PRODUCTS)
+    )
+    product_cache.prime({row.id: product_cache_entry(row) for row in rows})
+
+
+def warm_pools():
+    """Fill each engine's pool up to its size, so the first requests do not pay for connecting"""
+    for engine in db.engines.values():
+        size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+        connections = [engine.connect() for _ in range(size)]
+        for connection in connections:
+            connection.close()
+
+
+def warm_aws_clients():
+    get_s3_client()
+    get_client("cognito-idp", region_name=Config().COGNITO_REGION_NAME)
+
+
+def run_step(step, function):
+    # A failed step only costs the first requests some latency, so it must not stop the server from starting
+    started = time.perf_counter()
+    try:
+        function()
+    except Exception as e:
+        print(f"Warm-up step {step} failed: {e}")
+    finally:
+        WARMUP_DURATION.set(time.perf_counter() - started, step=step)
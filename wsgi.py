@@ -0,0 +1,7 @@
+from app import create_app
+from warmup import warm_shared
+
+# Production entry point, e.g. `gunicorn -c gunicorn.conf.py`. With preload_app the app is built and its
+# shared caches warmed once in the master; each worker then runs app.start_worker after forking.
+app = create_app()
+warm_shared(app)